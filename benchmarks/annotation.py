@@ -0,0 +1,156 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Benchmark the annotation rendering on synthetic control layouts: the baseline, which pastes the RGBA label of each
+control onto the frame, the current rendering, which blits the labels drawn in the mode of the frame onto one copy,
+and the compositing of all the labels in one full-size RGBA overlay layer, for reference.
+It runs headless, without a desktop.
+
+Usage:
+    python -m benchmarks.annotation
+    python -m benchmarks.annotation --controls 300 1000 --width 3840 --height 2160
+"""
+
+import argparse
+import random
+import time
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ufo.utils import annotation
+
+COLORS = ["#FFF68F", "#7FFFD4", "#FFD700", "#FFA500", "#87CEFA"]
+
+
+def synthetic_layout(
+    size: int, image_size: Tuple[int, int], seed: int = 0
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    Build a synthetic control layout: rows of small toolbar buttons on top, and larger panes and list items below,
+    which overlap each other as the nested controls of a real window do.
+    :param size: The number of controls.
+    :param image_size: The size of the window, (width, height).
+    :param seed: The random seed.
+    :return: The rectangles of the controls in shape (size, 4), and the colors of their labels.
+    """
+    rng = random.Random(seed)
+    width, height = image_size
+    rects = []
+
+    for i in range(size):
+        if i % 2 == 0:
+            # Toolbar buttons, packed in rows.
+            column, row = divmod(i // 2, 4)
+            left = (column * 40) % (width - 40)
+            top = row * 36 + ((column * 40) // (width - 40)) * 150
+            rects.append((left, top, left + 36, top + 32))
+        else:
+            left = rng.randrange(0, width - 200)
+            top = rng.randrange(150, height - 60)
+            rects.append(
+                (left, top, left + rng.randint(60, 400), top + rng.randint(20, 200))
+            )
+
+    colors = [rng.choice(COLORS) for _ in range(size)]
+    return np.asarray(rects, dtype=np.int64), colors
+
+
+def per_control_render(
+    image: Image.Image, rects: np.ndarray, label_images: List[Image.Image]
+) -> Image.Image:
+    """
+    The baseline rendering, which pastes each label at the top-left corner of its control on a copy of the frame.
+    :param image: The frame.
+    :param rects: The rectangles of the controls.
+    :param label_images: The images of the labels.
+    :return: The annotated image.
+    """
+    annotated = image.copy()
+    for rect, label_image in zip(rects.tolist(), label_images):
+        annotated.paste(label_image, (rect[0], rect[1]))
+    return annotated
+
+
+def overlay_render(
+    image: Image.Image, positions: np.ndarray, label_images: Sequence[Image.Image]
+) -> Image.Image:
+    """
+    Render the labels into one RGBA overlay layer of the size of the frame, and alpha-composite it onto the frame once.
+    :param image: The frame.
+    :param positions: The positions of the labels.
+    :param label_images: The RGBA images of the labels.
+    :return: The annotated image.
+    """
+    overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    for (x, y), label_image in zip(positions.tolist(), label_images):
+        overlay.paste(label_image, (x, y))
+    return Image.alpha_composite(image.convert("RGBA"), overlay).convert(image.mode)
+
+
+def timeit(func, repeat: int) -> float:
+    """
+    Time the function and return the best wall time.
+    :param func: The function to time.
+    :param repeat: The number of repetitions.
+    :return: The best wall time (s).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--controls", type=int, nargs="+", default=[300])
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    image_size = (args.width, args.height)
+    frame = Image.new("RGB", image_size, "#F3F3F3")
+
+    print(
+        f"{'controls':>8} {'baseline (s)':>13} {'current (s)':>12} {'speedup':>8} {'overlay (s)':>12}"
+    )
+    for size in args.controls:
+        rects, colors = synthetic_layout(size, image_size)
+        rgba_labels = [
+            annotation.get_label_image(str(i + 1), button_color=color, mode="RGBA")
+            for i, color in enumerate(colors)
+        ]
+        labels = [
+            annotation.get_label_image(str(i + 1), button_color=color, mode=frame.mode)
+            for i, color in enumerate(colors)
+        ]
+        positions = rects[:, :2]
+
+        # The current rendering draws the same pixels as the baseline.
+        assert per_control_render(frame, rects, rgba_labels).tobytes() == (
+            annotation.render_labels(frame, positions, labels).tobytes()
+        )
+
+        baseline_time = timeit(
+            lambda: per_control_render(frame, rects, rgba_labels), args.repeat
+        )
+        current_time = timeit(
+            lambda: annotation.render_labels(frame, positions, labels), args.repeat
+        )
+        overlay_time = timeit(
+            lambda: overlay_render(frame, positions, rgba_labels), args.repeat
+        )
+
+        print(
+            f"{size:>8} {baseline_time:>13.4f} {current_time:>12.4f} "
+            f"{baseline_time / current_time:>7.2f}x {overlay_time:>12.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
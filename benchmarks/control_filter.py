@@ -0,0 +1,179 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Benchmark the per-control scoring of the SemanticControlFilter against the batched scoring.
+
+Usage:
+    python -m benchmarks.control_filter
+    python -m benchmarks.control_filter --model sentence-transformers/all-MiniLM-L6-v2
+"""
+
+import argparse
+import hashlib
+import random
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+
+from ufo.automator.ui_control.control_filter import SemanticControlFilter
+
+
+class SyntheticEncoder:
+    """
+    An offline stand-in of the SentenceTransformer model. Each encode call pays a fixed overhead plus a per-item cost,
+    which mimics the cost structure of a forward pass without downloading a model.
+    """
+
+    def __init__(
+        self, dim: int = 384, call_overhead: float = 2e-3, item_cost: float = 5e-5
+    ):
+        """
+        :param dim: The dimension of the embeddings.
+        :param call_overhead: The fixed cost (s) of each encode call.
+        :param item_cost: The cost (s) of each encoded item.
+        """
+        self.dim = dim
+        self.call_overhead = call_overhead
+        self.item_cost = item_cost
+
+    def _embed(self, text: str) -> np.ndarray:
+        """
+        Hash the text into a deterministic pseudo-random embedding.
+        :param text: The text to embed.
+        :return: The embedding.
+        """
+        seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def encode(self, content):
+        """
+        Encode a text or a list of texts.
+        :param content: The text or the list of texts.
+        :return: The embedding(s).
+        """
+        items = [content] if isinstance(content, str) else list(content)
+        time.sleep(self.call_overhead + self.item_cost * len(items))
+        embeddings = np.stack([self._embed(item) for item in items])
+        return embeddings[0] if isinstance(content, str) else embeddings
+
+
+def build_filter(model_path: str = None) -> SemanticControlFilter:
+    """
+    Build the filter to benchmark.
+    :param model_path: The SentenceTransformer model path. Use the synthetic encoder if None.
+    :return: The filter.
+    """
+    if model_path:
+        return SemanticControlFilter(model_path)
+
+    control_filter = object.__new__(SemanticControlFilter)
+    control_filter.model = SyntheticEncoder()
+    return control_filter
+
+
+def synthetic_controls(size: int, seed: int = 0) -> Dict[str, SimpleNamespace]:
+    """
+    Build a synthetic control dictionary.
+    :param size: The number of controls.
+    :param seed: The random seed.
+    :return: The control dictionary, mapping the label to a control-like object.
+    """
+    words = [
+        "file", "edit", "view", "insert", "format", "tools", "table", "help",
+        "save", "open", "close", "print", "share", "comment", "review", "design",
+        "layout", "font", "bold", "italic", "underline", "search", "replace", "zoom",
+    ]  # fmt: skip
+    rng = random.Random(seed)
+    return {
+        str(i + 1): SimpleNamespace(
+            element_info=SimpleNamespace(
+                name=" ".join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+            )
+        )
+        for i in range(size)
+    }
+
+
+def per_control_filter(
+    control_filter: SemanticControlFilter, control_dicts: Dict, plans: List[str], top_k: int
+) -> Dict:
+    """
+    The previous filtering strategy, which embeds the plans and one control text per control.
+    :param control_filter: The filter.
+    :param control_dicts: The control dictionary.
+    :param plans: The plans.
+    :param top_k: The number of controls to keep.
+    :return: The filtered control dictionary.
+    """
+    scores = {
+        label: control_filter.control_filter_score(
+            control_item.element_info.name.lower(), plans
+        )
+        for label, control_item in control_dicts.items()
+    }
+    topk_labels = set(sorted(scores, key=scores.get, reverse=True)[:top_k])
+    return {
+        label: control_item
+        for label, control_item in control_dicts.items()
+        if label in topk_labels
+    }
+
+
+def timeit(func, repeat: int) -> float:
+    """
+    Time the function and return the best wall time.
+    :param func: The function to time.
+    :param repeat: The number of repetitions.
+    :return: The best wall time (s).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=None, help="SentenceTransformer model path.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 300, 1000])
+    parser.add_argument("--top_k", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    control_filter = build_filter(args.model)
+    plans = [
+        "Click the Insert tab to open the insert menu.",
+        "Select the Table button to insert a table.",
+        "Type the content into the first cell.",
+    ]
+
+    print(f"{'controls':>8} {'per-control (s)':>16} {'batched (s)':>12} {'speedup':>8} {'overlap':>8}")
+    for size in args.sizes:
+        control_dicts = synthetic_controls(size)
+
+        baseline = per_control_filter(control_filter, control_dicts, plans, args.top_k)
+        batched = control_filter.control_filter(control_dicts, plans, args.top_k)
+        overlap = len(set(baseline) & set(batched)) / max(len(baseline), 1)
+
+        baseline_time = timeit(
+            lambda: per_control_filter(control_filter, control_dicts, plans, args.top_k),
+            args.repeat,
+        )
+        batched_time = timeit(
+            lambda: control_filter.control_filter(control_dicts, plans, args.top_k),
+            args.repeat,
+        )
+
+        print(
+            f"{size:>8} {baseline_time:>16.4f} {batched_time:>12.4f} "
+            f"{baseline_time / batched_time:>7.1f}x {overlap:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
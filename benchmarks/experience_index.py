@@ -0,0 +1,196 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Benchmark the retrieval of the experiences of an application from the app partitions of the experience store against
+the filter over the global index, on synthetic experience stores in which one application dominates. It reports the
+latency and the recall of the top-k experiences of the application, for the queries of the dominant and of the rare
+applications.
+
+The filter path follows the filtered similarity_search of the LangChain FAISS index: it fetches the fetch_k nearest
+experiences of the global index, then applies the Python filter to the metadata of each of them. The vectors are
+searched with a flat L2 FAISS index if faiss is installed, and with NumPy otherwise, so it runs without the
+embedding model.
+
+Usage:
+    python -m benchmarks.experience_index
+    python -m benchmarks.experience_index --experiences 10000 100000 --apps 20 --dim 768
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+DOMINANT_APP = "WINWORD.EXE"
+
+
+def synthetic_store(
+    size: int, apps: int, dim: int, seed: int = 0
+) -> Tuple[np.ndarray, List[dict]]:
+    """
+    Build a synthetic experience store, in which the applications follow a Zipf distribution, so the first one
+    dominates the store.
+    :param size: The number of experiences.
+    :param apps: The number of applications.
+    :param dim: The dimension of the embeddings.
+    :param seed: The random seed.
+    :return: The embeddings in shape (size, dim), and the metadata of the experiences.
+    """
+    rng = np.random.default_rng(seed)
+    app_names = [DOMINANT_APP] + [f"APP{i:02d}.EXE" for i in range(1, apps)]
+
+    weights = 1.0 / np.arange(1, apps + 1) ** 1.5
+    app_ids = rng.choice(apps, size=size, p=weights / weights.sum())
+
+    vectors = rng.standard_normal((size, dim)).astype(np.float32)
+    metadatas = [{"app_list": [app_names[app_id]]} for app_id in app_ids]
+    return vectors, metadatas
+
+
+class FlatIndex:
+    """
+    A flat L2 index, with faiss if it is installed, and with NumPy otherwise.
+    """
+
+    def __init__(self, vectors: np.ndarray) -> None:
+        """
+        Create a new FlatIndex.
+        :param vectors: The vectors, in shape (n, dim).
+        """
+        self.vectors = vectors
+        if faiss is not None:
+            self.index = faiss.IndexFlatL2(vectors.shape[1])
+            self.index.add(vectors)
+        else:
+            self.norms = (vectors**2).sum(axis=1)
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        """
+        Search the nearest vectors of the query.
+        :param query: The query, in shape (dim,).
+        :param k: The number of vectors to search.
+        :return: The rows of the nearest vectors, nearest first.
+        """
+        k = min(k, len(self.vectors))
+        if faiss is not None:
+            _, rows = self.index.search(query[None, :], k)
+            return rows[0]
+
+        distances = self.norms - 2 * self.vectors @ query
+        rows = np.argpartition(distances, k - 1)[:k]
+        return rows[np.argsort(distances[rows])]
+
+
+def filter_retrieve(
+    index: FlatIndex,
+    metadatas: List[dict],
+    query: np.ndarray,
+    app_name: str,
+    k: int,
+    fetch_k: int,
+) -> List[int]:
+    """
+    Retrieve the experiences of the application from the global index with the filter of AppAgent.
+    :param index: The global index.
+    :param metadatas: The metadata of the experiences.
+    :param query: The query.
+    :param app_name: The application.
+    :param k: The number of experiences to retrieve.
+    :param fetch_k: The number of experiences to fetch before the filter.
+    :return: The rows of the retrieved experiences.
+    """
+    filter: Callable[[dict], bool] = lambda x: app_name.lower() in [
+        app.lower() for app in x["app_list"]
+    ]
+    rows = [row for row in index.search(query, fetch_k).tolist() if filter(metadatas[row])]
+    return rows[:k]
+
+
+def partition_retrieve(
+    partitions: Dict[str, Tuple[FlatIndex, np.ndarray]],
+    query: np.ndarray,
+    app_name: str,
+    k: int,
+) -> List[int]:
+    """
+    Retrieve the experiences of the application from its partition.
+    :param partitions: The index and the global rows of each partition.
+    :param query: The query.
+    :param app_name: The application.
+    :param k: The number of experiences to retrieve.
+    :return: The rows of the retrieved experiences.
+    """
+    index, rows = partitions[app_name]
+    return rows[index.search(query, k)].tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--experiences", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--apps", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--fetch-k", type=int, default=20, help="The fetch_k of the filtered search.")
+    args = parser.parse_args()
+
+    print(f"Vector search: {'faiss' if faiss is not None else 'numpy'}.")
+    print(
+        f"{'experiences':>11} {'queries':>9} {'filter (ms)':>12} {'partition (ms)':>15} "
+        f"{'filter recall':>14} {'partition recall':>17}"
+    )
+
+    for size in args.experiences:
+        vectors, metadatas = synthetic_store(size, args.apps, args.dim)
+        index = FlatIndex(vectors)
+
+        app_rows: Dict[str, List[int]] = {}
+        for row, metadata in enumerate(metadatas):
+            app_rows.setdefault(metadata["app_list"][0], []).append(row)
+        partitions = {
+            app_name: (FlatIndex(vectors[rows]), np.asarray(rows))
+            for app_name, rows in app_rows.items()
+        }
+
+        rare_app = min(app_rows, key=lambda app_name: len(app_rows[app_name]))
+        rng = np.random.default_rng(1)
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+        for label, app_name in [("dominant", DOMINANT_APP), ("rare", rare_app)]:
+            timings = {"filter": 0.0, "partition": 0.0}
+            recalls = {"filter": 0.0, "partition": 0.0}
+
+            for query in queries:
+                # The exact top-k experiences of the application.
+                expected = set(partition_retrieve(partitions, query, app_name, args.top_k))
+
+                for name, retrieve in [
+                    (
+                        "filter",
+                        lambda: filter_retrieve(
+                            index, metadatas, query, app_name, args.top_k, args.fetch_k
+                        ),
+                    ),
+                    ("partition", lambda: partition_retrieve(partitions, query, app_name, args.top_k)),
+                ]:
+                    start = time.perf_counter()
+                    rows = retrieve()
+                    timings[name] += time.perf_counter() - start
+                    recalls[name] += len(expected.intersection(rows)) / len(expected)
+
+            print(
+                f"{size:>11} {label:>9} {timings['filter'] / args.queries * 1000:>12.3f} "
+                f"{timings['partition'] / args.queries * 1000:>15.3f} "
+                f"{recalls['filter'] / args.queries:>14.3f} {recalls['partition'] / args.queries:>17.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
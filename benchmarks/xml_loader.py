@@ -0,0 +1,137 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Benchmark the serial parsing of the help documents against the process-pool parsing, and the ElementTree metadata
+parsing against the lxml iterparse fast path, on a synthetic corpus.
+
+Usage:
+    python -m benchmarks.xml_loader
+    python -m benchmarks.xml_loader --documents 2000 --paragraphs 200 --workers 2 4 8
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from learner import xml_loader
+
+
+WORDS = [
+    "insert", "table", "format", "paragraph", "style", "heading", "picture", "chart",
+    "review", "comment", "margin", "layout", "section", "border", "column", "footnote",
+]  # fmt: skip
+
+
+def synthetic_corpus(directory: str, size: int, paragraphs: int = 40, seed: int = 0) -> None:
+    """
+    Write a synthetic corpus of help documents, each with its .meta file, into the directory.
+    :param directory: The directory to write to.
+    :param size: The number of documents.
+    :param paragraphs: The number of paragraphs of each document.
+    :param seed: The random seed.
+    """
+    rng = random.Random(seed)
+
+    def sentence(length: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(length))
+
+    for i in range(size):
+        file = os.path.join(directory, f"document_{i:05d}.xml")
+        body = "".join(
+            f"<para>{sentence(rng.randint(10, 30))}</para>" for _ in range(paragraphs)
+        )
+        with open(file, "w", encoding="utf-8") as f:
+            f.write(f"<document><title>{sentence(4)}</title><body>{body}</body></document>")
+
+        # The title and summary come first, followed by the bulk of the metadata.
+        keywords = "".join(
+            f'<Keyword value="{sentence(2)}"/>' for _ in range(paragraphs * 4)
+        )
+        with open(file + ".meta", "w", encoding="utf-8") as f:
+            f.write(
+                f"<metadata><title>{sentence(4)}</title>"
+                f'<Content-Summary value="{sentence(12)}"/>'
+                f"<Keywords>{keywords}</Keywords></metadata>"
+            )
+
+
+def timeit(func, repeat: int) -> float:
+    """
+    Time the function and return the best wall time.
+    :param func: The function to time.
+    :param repeat: The number of repetitions.
+    :return: The best wall time (s).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--paragraphs", type=int, default=40, help="The size of each document and .meta file.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic_corpus(directory, args.documents, args.paragraphs)
+        loader = xml_loader.XMLLoader(directory)
+        files = list(loader.iter_file_name())
+        meta_files = [file + ".meta" for file in files]
+
+        # Metadata parsing.
+        lxml_etree = xml_loader.lxml_etree
+        xml_loader.lxml_etree = None
+        element_tree_time = timeit(
+            lambda: [loader.get_microsoft_document_metadata(file) for file in meta_files],
+            args.repeat,
+        )
+        element_tree_metadata = [loader.get_microsoft_document_metadata(file) for file in meta_files]
+        xml_loader.lxml_etree = lxml_etree
+
+        print(f"{len(files)} documents.")
+        print(f"{'metadata parser':<20} {'time (s)':>10} {'speedup':>8}")
+        print(f"{'ElementTree':<20} {element_tree_time:>10.4f} {1.0:>7.1f}x")
+
+        if lxml_etree is None:
+            print(f"{'lxml iterparse':<20} {'-':>10} {'-':>8}  (lxml is not installed)")
+        else:
+            iterparse_time = timeit(
+                lambda: [loader.iterparse_microsoft_document_metadata(file) for file in meta_files],
+                args.repeat,
+            )
+            iterparse_metadata = [loader.iterparse_microsoft_document_metadata(file) for file in meta_files]
+            assert iterparse_metadata == element_tree_metadata, "The metadata parsers disagree."
+            print(
+                f"{'lxml iterparse':<20} {iterparse_time:>10.4f} "
+                f"{element_tree_time / iterparse_time:>7.1f}x"
+            )
+
+        # Document parsing.
+        def load(workers: int):
+            return [file for file, _ in loader.iter_documents(files, workers=workers)]
+
+        serial_time = timeit(lambda: load(1), args.repeat)
+
+        print()
+        print(f"{'workers':>8} {'time (s)':>10} {'docs/s':>10} {'speedup':>8}")
+        print(f"{1:>8} {serial_time:>10.4f} {len(files) / serial_time:>10.1f} {1.0:>7.1f}x")
+        for workers in args.workers:
+            assert load(workers) == files, "The process pool changed the document order."
+            pool_time = timeit(lambda: load(workers), args.repeat)
+            print(
+                f"{workers:>8} {pool_time:>10.4f} {len(files) / pool_time:>10.1f} "
+                f"{serial_time / pool_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
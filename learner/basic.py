@@ -24,6 +24,13 @@ class BasicDocumentLoader:
         """
         return utils.find_files_with_extension(self.directory, self.extensions)
 
+    def iter_file_name(self):
+        """
+        Iterate over the documents in the given directory lazily.
+        :return: The generator of the document file names.
+        """
+        return utils.iter_files_with_extension(self.directory, self.extensions)
+
     def construct_document_list(self):
         """
         Load the metadata from the given directory.
@@ -3,65 +3,191 @@
 
 from ufo.utils import get_hugginface_embedding
 from . import xml_loader
-from .utils import load_json_file, save_json_file, print_with_color
+from .utils import (
+    file_content_hash,
+    load_json_file,
+    save_json_file,
+    print_with_color,
+)
 from langchain_community.vectorstores import FAISS
+import hashlib
+import itertools
 import os
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
+RECORDS_PATH = "./learner/records.json"
 
-def create_indexer(app: str, docs: str, format: str, incremental: bool, save_path: str):
+
+def load_app_record(records: dict, app: str):
+    """
+    Get the record of the given application. The legacy records only contain the path of the indexer.
+    :param records: The records loaded from the records file.
+    :param app: The name of the application.
+    :return: The record, in a format of {"path": indexer path, "documents": {file: {"hash": content hash, "id": document id}}}.
+    """
+
+    record = records.get(app)
+    if record is None:
+        return None
+    if isinstance(record, str):
+        return {"path": record, "documents": {}}
+    return record
+
+
+def iter_chunks(iterable, chunk_size: int):
     """
-    Create an indexer for the given application.
+    Split the iterable into chunks lazily.
+    :param iterable: The iterable to split.
+    :param chunk_size: The size of each chunk.
+    :return: The generator of the chunks.
+    """
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def create_indexer(
+    app: str,
+    docs: str,
+    format: str,
+    incremental: bool,
+    save_path: str,
+    chunk_size: int = 64,
+    workers: int = 1,
+):
+    """
+    Create an indexer for the given application. The documents are loaded and embedded in chunks. With incremental updates,
+    the documents whose content hash is recorded in the records file are skipped, the new and changed documents are appended
+    to the previous indexer, and the documents removed from the docs dir are deleted from it.
     :param app: The name of the application to create an indexer for.
     :param docs: The help documents dir for the application.
     :param format: The format of the help documents.
     :param incremental: Whether to enable incremental updates.
     :param save_path: The path to save the indexer to.
-    :return: The created indexer.
+    :param chunk_size: The number of documents embedded at a time.
+    :param workers: The number of processes parsing the documents. The parsed documents are streamed to the embedding in chunks.
+    :return: The path of the created indexer.
     """
 
-    if os.path.exists("./learner/records.json"):
-        records = load_json_file("./learner/records.json")
+    if os.path.exists(RECORDS_PATH):
+        records = load_json_file(RECORDS_PATH)
     else:
         records = {}
 
-    print_with_color("Loading documents from {docs}...".format(docs=docs), "cyan")
-
-    loader = xml_loader.XMLLoader(docs)
-    documents = loader.construct_document()
-
-    print_with_color(
-        "Creating indexer for {num} documents for {app}...".format(
-            num=len(documents), app=app
-        ),
-        "yellow",
-    )
-
     if format == "xml":
         embeddings = get_hugginface_embedding()
     else:
         raise ValueError("Invalid format: " + format)
 
-    db = FAISS.from_documents(documents, embeddings)
+    db = None
+    indexed_documents = {}
 
-    if incremental:
-        if app in records:
-            print_with_color("Merging with previous indexer...", "yellow")
-            prev_db = FAISS.load_local(records[app], embeddings)
-            db.merge_from(prev_db)
+    record = load_app_record(records, app)
+    if incremental and record is not None and not record["documents"]:
+        # The legacy records have no document hashes, so every document would be appended to the previous indexer again.
+        print_with_color(
+            "The record of {app} has no document hashes, rebuilding the indexer from scratch...".format(app=app),
+            "yellow",
+        )
+        record = None
+
+    if incremental and record is not None and os.path.exists(record["path"]):
+        print_with_color("Loading previous indexer from {path}...".format(path=record["path"]), "yellow")
+        # The previous indexer was saved by this tool, so its pickled docstore is trusted.
+        db = FAISS.load_local(record["path"], embeddings, allow_dangerous_deserialization=True)
+        indexed_documents = dict(record["documents"])
+
+    print_with_color("Loading documents from {docs}...".format(docs=docs), "cyan")
+
+    loader = xml_loader.XMLLoader(docs)
+    stale_ids = []
+    pending_ids = {}
+    num_added = 0
+    num_skipped = 0
+
+    def iter_changed_files():
+        """
+        Iterate over the new and changed documents, and record their content hash and document id.
+        :return: The generator of the files to parse.
+        """
+        nonlocal num_skipped
+
+        for file in loader.iter_file_name():
+            content_hash = file_content_hash([file, file + ".meta"])
+            previous = indexed_documents.get(file)
+
+            if previous is not None and previous["hash"] == content_hash:
+                num_skipped += 1
+                continue
+
+            # The document has changed, so its previous version is removed from the indexer.
+            if previous is not None and previous.get("id"):
+                stale_ids.append(previous["id"])
+
+            doc_id = hashlib.sha1("{file}:{hash}".format(file=file, hash=content_hash).encode("utf-8")).hexdigest()
+
+            pending_ids[file] = doc_id
+            indexed_documents[file] = {"hash": content_hash, "id": doc_id}
+            yield file
+
+    parsed_documents = loader.iter_documents(iter_changed_files(), workers=workers)
+
+    for chunk in iter_chunks(parsed_documents, chunk_size):
+        documents = [document for _, document in chunk]
+        ids = [pending_ids.pop(file) for file, _ in chunk]
+
+        if db is None:
+            db = FAISS.from_documents(documents, embeddings, ids=ids)
+        else:
+            db.add_documents(documents, ids=ids)
+
+        num_added += len(documents)
+        print_with_color(
+            "Embedded {num} new or changed documents for {app}...".format(num=num_added, app=app),
+            "yellow",
+        )
+
+    # Remove the documents that no longer exist in the docs dir.
+    for file in list(indexed_documents):
+        if not os.path.exists(file):
+            if indexed_documents[file].get("id"):
+                stale_ids.append(indexed_documents[file]["id"])
+            del indexed_documents[file]
+
+    if db is None:
+        print_with_color("No documents found in {docs} for {app}.".format(docs=docs, app=app), "red")
+        return None
+
+    existing_ids = set(db.index_to_docstore_id.values())
+    stale_ids = [doc_id for doc_id in stale_ids if doc_id in existing_ids]
+    if stale_ids:
+        db.delete(stale_ids)
+
+    if incremental and record is not None and num_added == 0 and not stale_ids:
+        print_with_color(
+            "Indexer for {app} is up to date ({num} documents unchanged). Save in {path}.".format(
+                app=app, num=num_skipped, path=record["path"]
+            ),
+            "green",
+        )
+        return record["path"]
 
     db_file_path = os.path.join(save_path, app)
     db_file_path = os.path.abspath(db_file_path)
     db.save_local(db_file_path)
 
-    records[app] = db_file_path
+    records[app] = {"path": db_file_path, "documents": indexed_documents}
 
-    save_json_file("./learner/records.json", records)
+    save_json_file(RECORDS_PATH, records)
 
     print_with_color(
-        "Indexer for {app} created successfully. Save in {path}.".format(
-            app=app, path=db_file_path
+        "Indexer for {app} created successfully ({added} embedded, {skipped} unchanged, {removed} removed). Save in {path}.".format(
+            app=app, added=num_added, skipped=num_skipped, removed=len(stale_ids), path=db_file_path
         ),
         "green",
     )
@@ -18,6 +18,18 @@ args.add_argument(
 args.add_argument(
     "--incremental", action="store_true", help="Enable incremental update."
 )
+args.add_argument(
+    "--chunk_size",
+    help="The number of documents loaded and embedded at a time.",
+    type=int,
+    default=64,
+)
+args.add_argument(
+    "--workers",
+    help="The number of processes parsing the documents.",
+    type=int,
+    default=1,
+)
 args.add_argument(
     "--save_path",
     help="The format of the help doc.",
@@ -40,6 +52,8 @@ def main():
         parsed_args.format,
         parsed_args.incremental,
         parsed_args.save_path,
+        parsed_args.chunk_size,
+        parsed_args.workers,
     )
 
 
@@ -2,6 +2,7 @@
 # Licensed under the MIT License.
 import os
 import json
+import hashlib
 from colorama import Fore, Style, init
 
 # init colorama
@@ -52,6 +53,41 @@ def find_files_with_extension(directory, extension):
 
 
 
+def iter_files_with_extension(directory, extension):
+    """
+    Iterate over the files with the given extension in the given directory, without listing the whole directory first.
+    :param directory: The directory to search.
+    :param extension: The extension to search for.
+    :return: The generator of the matching files.
+    """
+
+    for root, _, files in os.walk(directory):
+        for file in sorted(files):
+            if file.endswith(extension):
+                yield os.path.realpath(os.path.join(root, file))
+
+
+
+def file_content_hash(paths):
+    """
+    Compute the content hash of the given files together. Missing files are skipped.
+    :param paths: The list of file paths.
+    :return: The hex digest of the content hash.
+    """
+
+    hasher = hashlib.sha256()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        hasher.update(os.path.basename(path).encode("utf-8"))
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                hasher.update(block)
+
+    return hasher.hexdigest()
+
+
+
 def find_files_with_extension_list(directory, extensions):
     """
     Find files with the given extensions in the given directory.
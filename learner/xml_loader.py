@@ -3,10 +3,26 @@
 
 from . import basic
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import UnstructuredXMLLoader
 from langchain.docstore.document import Document
 import xml.etree.ElementTree as ET
 
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+def load_xml_document(file: str):
+    """
+    Load the langchain document of the given file. It is a module-level function so that it can run in a worker process.
+    :param file: The file to load.
+    :return: The langchain document.
+    """
+    return XMLLoader().construct_single_document(file)
+
 
 class XMLLoader(basic.BasicDocumentLoader):
     """
@@ -33,6 +49,9 @@ class XMLLoader(basic.BasicDocumentLoader):
         if not os.path.exists(file):
             return {'title': os.path.basename(file), 'summary': os.path.basename(file)}
 
+        if lxml_etree is not None:
+            return self.iterparse_microsoft_document_metadata(file)
+
         tree = ET.parse(file)
         root = tree.getroot()
 
@@ -52,6 +71,39 @@ class XMLLoader(basic.BasicDocumentLoader):
         return {'title': title, 'summary': summary}
     
 
+    @staticmethod
+    def iterparse_microsoft_document_metadata(file: str):
+        """
+        Get the metadata for the given file with lxml iterparse. Only the title and the content summary elements are
+        reported by the parser, and the parsing stops as soon as both are found.
+        :param file: The file to get the metadata for.
+        :return: The metadata for the given file.
+        """
+
+        metadata = {}
+        fields = {'title': 'title', 'Content-Summary': 'summary'}
+
+        # Only the metadata fields are reported by the parser, so the rest of the tree never reaches Python.
+        for _, element in lxml_etree.iterparse(file, events=("end",), tag=list(fields)):
+            parent = element.getparent()
+
+            # Only the direct children of the root are metadata fields.
+            if parent is None or parent.getparent() is not None:
+                continue
+
+            field = fields[element.tag]
+            if field not in metadata:
+                metadata[field] = element.text if field == 'title' else element.attrib['value']
+
+            if len(metadata) == len(fields):
+                break
+
+        title = metadata.get('title')
+        summary = metadata.get('summary')
+
+        return {'title': title, 'summary': summary}
+
+
     def get_microsoft_document_text(self, file: str):
         """
         Get the text for the given file.
@@ -90,6 +142,54 @@ class XMLLoader(basic.BasicDocumentLoader):
     
 
 
+    def construct_single_document(self, file: str):
+        """
+        Construct a langchain document for the given file.
+        :param file: The file to construct the document for.
+        :return: The langchain document.
+        """
+        text = self.get_microsoft_document_text(file)
+        metadata = self.get_microsoft_document_metadata(file + ".meta")
+        title = metadata["title"]
+        summary = metadata["summary"]
+        page_content = """{title} - {summary}""".format(title=title, summary=summary)
+
+        metadata = {
+            'title': title,
+            'summary': summary,
+            'text':text
+        }
+        return Document(page_content=page_content, metadata=metadata)
+
+
+    def iter_documents(self, files, workers: int = 1, max_pending: int = 256):
+        """
+        Construct the langchain documents of the given files lazily, in the order of the files. With more than one worker,
+        the files are parsed in a process pool, and at most max_pending files are parsed ahead of the consumer.
+        :param files: The iterable of the files to load.
+        :param workers: The number of worker processes.
+        :param max_pending: The maximum number of files parsed ahead of the consumer.
+        :return: The generator of (file, langchain document) pairs.
+        """
+
+        if workers <= 1:
+            for file in files:
+                yield file, self.construct_single_document(file)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for file in files:
+                pending.append((file, pool.submit(load_xml_document, file)))
+                if len(pending) >= max_pending:
+                    file, future = pending.popleft()
+                    yield file, future.result()
+
+            while pending:
+                file, future = pending.popleft()
+                yield file, future.result()
+
+
     def construct_document(self):
         """
         Construct a langchain document list.
@@ -97,20 +197,7 @@ class XMLLoader(basic.BasicDocumentLoader):
         """
         documents = []
         for file in self.load_file_name():
-            text = self.get_microsoft_document_text(file)
-            metadata = self.get_microsoft_document_metadata(file + ".meta")
-            title = metadata["title"]
-            summary = metadata["summary"]
-            page_content = """{title} - {summary}""".format(title=title, summary=summary)
-
-            metadata = {
-                'title': title,
-                'summary': summary,
-                'text':text
-            }
-            document = Document(page_content=page_content, metadata=metadata)
-            
-            documents.append(document)
+            documents.append(self.construct_single_document(file))
         return documents
     
 
@@ -1,6 +1,34 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+from typing import Any, Callable, Iterator, Tuple, Union
+
+
+class DemonstrationStepDict(dict):
+    """
+    The dictionary of a step in the record. The screenshot can be stored as a function that loads it, which is called
+    every time the screenshot is read, so that the screenshots of a large record are not all kept in memory.
+    """
+
+    def __getitem__(self, key: str) -> Any:
+        """
+        Get the value of the key, loading it if it is stored as a function.
+        """
+        value = super().__getitem__(key)
+        return value() if callable(value) else value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get the value of the key, loading it if it is stored as a function.
+        """
+        return self[key] if key in self else default
+
+    def materialize(self) -> dict:
+        """
+        Get the step as a plain dictionary, with the loaded values.
+        """
+        return {key: self[key] for key in self}
+
 
 class DemonstrationStep:
     """
@@ -13,11 +41,12 @@ class DemonstrationStep:
         application: str,
         description: str,
         action: str,
-        screenshot: str,
+        screenshot: Union[str, Callable[[], str]],
         comment: str,
     ):
         """
         Create a new step.
+        The screenshot is a data URL, or a function that loads it.
         """
         self.application = application
         self.description = description
@@ -42,7 +71,7 @@ class DemonstrationRecord:
         self.__step_num = step_num
         # adding each key-value pair in steps to the record
         for index, step in steps.items():
-            setattr(self, index, step.__dict__)
+            setattr(self, index, DemonstrationStepDict(step.__dict__))
 
     def set_request(self, request: str):
         """
@@ -67,3 +96,13 @@ class DemonstrationRecord:
         Get the step number.
         """
         return self.__step_num
+
+    def iter_items(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Iterate over the attributes of the record, with the steps as plain dictionaries.
+        Only the screenshot of the current step is loaded at a time.
+        """
+        for key, value in self.__dict__.items():
+            if isinstance(value, DemonstrationStepDict):
+                value = value.materialize()
+            yield key, value
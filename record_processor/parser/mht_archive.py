@@ -0,0 +1,273 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import io
+import threading
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Optional
+
+
+@dataclass
+class MHTPart:
+    """
+    The location of a MIME part in the .mht file.
+    """
+
+    content_type: str
+    content_transfer_encoding: str
+    offset: int
+    length: int
+
+
+class MHTArchive:
+    """
+    The streaming reader of a steps recorder .mht file. The file is scanned once in chunks to index the MIME parts
+    by their Content-Location, with the offset and the length of their contents, and a part is only read when it is
+    requested. The .mht file is read straight from the recorded zip file, without extracting it to disk.
+
+    The .mht member of the zip file is compressed, so its stream only seeks forward cheaply: a seek backwards
+    decompresses the member again from its start. The recently read parts are kept in a small cache, so that a part
+    read again, e.g. main.htm or the screenshot of a retried summary, does not seek backwards, and the parts are
+    fastest to read in the order of their offsets, as the screenshots of the steps are.
+    """
+
+    CHUNK_SIZE = 1 << 20
+    MAX_HEADER_SIZE = 1 << 16
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        archive: Optional[zipfile.ZipFile] = None,
+        cache_size: int = 32 << 20,
+    ):
+        """
+        Create a new MHTArchive and index its parts.
+        :param stream: The seekable binary stream of the .mht file.
+        :param archive: The zip file of the stream, closed with the MHTArchive.
+        :param cache_size: The max size (bytes) of the recently read parts kept in memory. 0 disables the cache.
+        """
+        self.stream = stream
+        self.archive = archive
+        self.parts: Dict[str, MHTPart] = {}
+        self._lock = threading.Lock()
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_bytes = 0
+
+        self.boundary = self.__find_boundary()
+        self.__index_parts()
+
+    @classmethod
+    def from_zip(cls, zip_file_path: str) -> "MHTArchive":
+        """
+        Open the .mht file recorded in a zip file.
+        :param zip_file_path: The path of the zip file.
+        :return: The MHTArchive.
+        """
+        archive = zipfile.ZipFile(zip_file_path, "r")
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if not members:
+            archive.close()
+            raise ValueError(f"No .mht file found in {zip_file_path}.")
+
+        member = next(
+            (info for info in members if info.filename.lower().endswith(".mht")),
+            members[0],
+        )
+        return cls(archive.open(member), archive)
+
+    @classmethod
+    def from_string(cls, content: str) -> "MHTArchive":
+        """
+        Open the content of a .mht file.
+        :param content: The content of the .mht file.
+        :return: The MHTArchive.
+        """
+        return cls(io.BytesIO(content.encode("utf-8")))
+
+    def __find_boundary(self) -> bytes:
+        """
+        Find the boundary in the header of the .mht file.
+        :return: The boundary.
+        """
+        self.stream.seek(0)
+        header = self.stream.read(self.CHUNK_SIZE)
+
+        boundary_start = header.find(b"boundary=")
+        if boundary_start == -1:
+            raise ValueError("Boundary not found in the .mht file.")
+
+        boundary_start += len(b"boundary=")
+        boundary_end = header.find(b"\n", boundary_start)
+        return header[boundary_start:boundary_end].strip().strip(b'"')
+
+    @staticmethod
+    def __parse_headers(headers: bytes) -> Dict[str, str]:
+        """
+        Parse the headers of a part.
+        :param headers: The header block of the part.
+        :return: The headers, in a format of {name: value}.
+        """
+        parsed = {}
+        for line in headers.decode("utf-8", errors="replace").splitlines():
+            if ":" in line:
+                name, value = line.split(":")[:2]
+                parsed[name.strip()] = value.strip()
+        return parsed
+
+    def __index_parts(self) -> None:
+        """
+        Scan the .mht file in chunks for the boundary lines, and index the parts that have a Content-Location.
+        """
+        marker = b"--" + self.boundary
+
+        self.stream.seek(0)
+        buffer = b""
+        base = 0  # The offset of the buffer in the file.
+        scan = 0  # The position in the buffer to scan from.
+        previous: Optional[dict] = None
+        end_of_file = False
+
+        while not end_of_file:
+            chunk = self.stream.read(self.CHUNK_SIZE)
+            end_of_file = not chunk
+            buffer += chunk
+
+            while True:
+                position = buffer.find(marker, scan)
+                if position == -1:
+                    break
+
+                # The boundary only counts at the start of a line.
+                if position > 0 and buffer[position - 1 : position] != b"\n":
+                    scan = position + len(marker)
+                    continue
+
+                closing = buffer[position + len(marker) : position + len(marker) + 2] == b"--"
+                header_end = -1
+                if not closing:
+                    limit = position + self.MAX_HEADER_SIZE
+                    header_end = min(
+                        (
+                            index + len(separator)
+                            for separator in [b"\n\r\n", b"\n\n"]
+                            for index in [buffer.find(separator, position, limit)]
+                            if index != -1
+                        ),
+                        default=-1,
+                    )
+                    if header_end == -1 and len(buffer) < limit and not end_of_file:
+                        # Read more before parsing the headers.
+                        break
+
+                if previous is not None:
+                    previous["length"] = base + position - previous["offset"]
+                    self.__add_part(previous)
+                    previous = None
+
+                if closing or header_end == -1:
+                    scan = position + len(marker)
+                    continue
+
+                previous = {
+                    "headers": self.__parse_headers(buffer[position:header_end]),
+                    "offset": base + header_end,
+                }
+                scan = header_end
+
+            # Keep the unscanned bytes, and the byte before them to check the start of a line.
+            keep = max(min(scan, len(buffer) - len(marker)) - 1, 0)
+            buffer = buffer[keep:]
+            base += keep
+            scan -= keep
+
+        if previous is not None:
+            previous["length"] = base + len(buffer) - previous["offset"]
+            self.__add_part(previous)
+
+    def __add_part(self, part: dict) -> None:
+        """
+        Add a scanned part to the index if it has a Content-Location.
+        :param part: The headers, the offset and the length of the part.
+        """
+        headers = part["headers"]
+        if "Content-Location" not in headers:
+            return
+
+        self.parts[headers["Content-Location"]] = MHTPart(
+            headers.get("Content-Type", ""),
+            headers.get("Content-Transfer-Encoding", ""),
+            part["offset"],
+            part["length"],
+        )
+
+    def read(self, content_location: str) -> str:
+        """
+        Read the content of a part, with the line breaks normalized to "\\n" and the surrounding whitespace removed.
+        :param content_location: The Content-Location of the part.
+        :return: The content of the part.
+        """
+        content = self.__read_bytes(content_location)
+
+        return (
+            content.decode("utf-8", errors="replace")
+            .replace("\r\n", "\n")
+            .replace("\r", "\n")
+            .strip()
+        )
+
+    def __read_bytes(self, content_location: str) -> bytes:
+        """
+        Read the raw content of a part, from the cache of the recently read parts if it is there.
+        :param content_location: The Content-Location of the part.
+        :return: The raw content of the part.
+        """
+        part = self.parts[content_location]
+
+        with self._lock:
+            if content_location in self._cache:
+                self._cache.move_to_end(content_location)
+                return self._cache[content_location]
+
+            self.stream.seek(part.offset)
+            content = self.stream.read(part.length)
+
+            if len(content) <= self.cache_size:
+                self._cache[content_location] = content
+                self._cache_bytes += len(content)
+                while self._cache_bytes > self.cache_size:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_bytes -= len(evicted)
+
+        return content
+
+    def read_data_url(self, content_location: str) -> str:
+        """
+        Read a part as a data URL, e.g. a screenshot.
+        :param content_location: The Content-Location of the part.
+        :return: The data URL of the part.
+        """
+        part = self.parts[content_location]
+        return "data:{type};{encoding}, {content}".format(
+            type=part.content_type,
+            encoding=part.content_transfer_encoding,
+            content=self.read(content_location),
+        )
+
+    def close(self) -> None:
+        """
+        Close the stream and the zip file.
+        """
+        self._cache.clear()
+        self._cache_bytes = 0
+        self.stream.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def __enter__(self) -> "MHTArchive":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
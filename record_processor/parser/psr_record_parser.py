@@ -1,12 +1,15 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import functools
 import re
 import xml.etree.ElementTree as ET
+from typing import Union
 
 from bs4 import BeautifulSoup
 
 from .demonstration_record import DemonstrationRecord, DemonstrationStep
+from .mht_archive import MHTArchive
 
 
 class PSRRecordParser:
@@ -14,12 +17,15 @@ class PSRRecordParser:
     Class for parsing the steps recorder .mht file content to user demonstration record.
     """
 
-    def __init__(self, content: str):
+    def __init__(self, content: Union[str, MHTArchive]):
         """
         Constructor for the RecordParser class.
+        content: The content of the .mht file, or the MHTArchive of the .mht file,
+        from which the screenshots are read lazily.
         """
-        self.content = content
-        self.parts_dict = {}
+        self.archive = (
+            content if isinstance(content, MHTArchive) else MHTArchive.from_string(content)
+        )
         self.applications = []
         self.comments = []
         self.steps = []
@@ -27,88 +33,21 @@ class PSRRecordParser:
     def parse_to_record(self) -> DemonstrationRecord:
         """
         Parse the steps recorder .mht file content to record in following steps:
-        1. Find the boundary in the .mht file.
-        2. Split the file by the boundary into parts.
-        3. Get the comments for each step.
-        4. Get the steps from the content.
-        5. Construct the record object and return it.
+        1. Read the main.htm part indexed by the MHTArchive.
+        2. Get the comments for each step.
+        3. Get the steps from the content, with the screenshots loaded lazily from the MHTArchive.
+        4. Construct the record object and return it.
         return: A record object.
         """
-        boundary = self.__find_boundary()
-        self.parts_dict = self.__split_file_by_boundary(boundary)
-        self.comments = self.__get_comments(self.parts_dict["main.htm"]["Content"])
-        self.steps = self.__get_steps(self.parts_dict["main.htm"]["Content"])
+        main_content = self.archive.read("main.htm")
+        self.comments = self.__get_comments(main_content)
+        self.steps = self.__get_steps(main_content)
         record = DemonstrationRecord(
             list(set(self.applications)), len(self.steps), **self.steps
         )
 
         return record
 
-    def __find_boundary(self) -> str:
-        """
-        Find the boundary in the .mht file.
-        """
-
-        boundary_start = self.content.find("boundary=")
-
-        if boundary_start != -1:
-            boundary_start += len("boundary=")
-            boundary_end = self.content.find("\n", boundary_start)
-            boundary = self.content[boundary_start:boundary_end].strip('"')
-            return boundary
-        else:
-            raise ValueError("Boundary not found in the .mht file.")
-
-    def __split_file_by_boundary(self, boundary: str) -> dict:
-        """
-        Split the file by the boundary into parts,
-        Store the parts in a dictionary, including the content type,
-        content location and content transfer encoding.
-        boundary: The boundary of the file.
-        return: A dictionary of parts in the file.
-        """
-        parts = self.content.split("--" + boundary)
-        part_dict = {}
-        for part in parts:
-            content_type_start = part.find("Content-Type:")
-            content_location_start = part.find("Content-Location:")
-            content_transfer_encoding_start = part.find("Content-Transfer-Encoding:")
-            part_info = {}
-            if content_location_start != -1:
-                content_location_end = part.find("\n", content_location_start)
-                content_location = (
-                    part[content_location_start:content_location_end]
-                    .split(":")[1]
-                    .strip()
-                )
-
-                # add the content location
-                if content_type_start != -1:
-                    content_type_end = part.find("\n", content_type_start)
-                    content_type = (
-                        part[content_type_start:content_type_end].split(":")[1].strip()
-                    )
-                    part_info["Content-Type"] = content_type
-
-                # add the content transfer encoding
-                if content_transfer_encoding_start != -1:
-                    content_transfer_encoding_end = part.find(
-                        "\n", content_transfer_encoding_start
-                    )
-                    content_transfer_encoding = (
-                        part[
-                            content_transfer_encoding_start:content_transfer_encoding_end
-                        ]
-                        .split(":")[1]
-                        .strip()
-                    )
-                    part_info["Content-Transfer-Encoding"] = content_transfer_encoding
-
-                content = part[content_location_end:].strip()
-                part_info["Content"] = content
-                part_dict[content_location] = part_info
-        return part_dict
-
     def __get_steps(self, content: str) -> dict:
         """
         Get the steps from the content in fllowing steps:
@@ -174,20 +113,14 @@ class PSRRecordParser:
             )
         return comments
 
-    def __get_screenshot(self, screenshot_file_name: str) -> str:
+    def __get_screenshot(self, screenshot_file_name: str) -> functools.partial:
         """
-        Get the screenshot by screenshot file name.
-        The screenshot related information is stored in the parts_dict.
+        Get the loader of the screenshot by screenshot file name.
+        The screenshot is read from the MHTArchive only when the loader is called.
         screenshot_file_name: The file name of the screenshot.
-        return: The screenshot in base64 string.
+        return: The function that loads the screenshot in base64 data URL.
         """
-        screenshot_part = self.parts_dict[screenshot_file_name]
-        content = screenshot_part["Content"]
-        content_type = screenshot_part["Content-Type"]
-        content_transfer_encoding = screenshot_part["Content-Transfer-Encoding"]
-
-        screenshot = "data:{type};{encoding}, {content}".format(
-            type=content_type, encoding=content_transfer_encoding, content=content
-        )
+        if screenshot_file_name not in self.archive.parts:
+            raise KeyError(screenshot_file_name)
 
-        return screenshot
+        return functools.partial(self.archive.read_data_url, screenshot_file_name)
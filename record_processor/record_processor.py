@@ -3,12 +3,14 @@
 
 import os
 import argparse
+import contextlib
 from .summarizer.summarizer import DemonstrationSummarizer
 from ufo.config.config import Config
+from .parser.mht_archive import MHTArchive
 from .parser.psr_record_parser import PSRRecordParser
-from .utils import create_folder, save_to_json, unzip_and_read_file
+from .utils import create_folder, save_items_to_json
 from ufo.utils import print_with_color
-from typing import Tuple
+from typing import List, Tuple
 
 
 configs = Config.get_instance().config_data
@@ -17,15 +19,16 @@ args = argparse.ArgumentParser()
 args.add_argument(
     "--request",
     "-r",
-    help="The request that user want to achieve.",
+    help="The request that user want to achieve, one for each record.",
     type=lambda s: s.strip() or None,
     nargs="+",
 )
 args.add_argument(
     "--behavior-record-path",
     "-p",
-    help="The path for user behavior record in zip file.",
+    help="The path for user behavior record in zip file. Several records are summarized concurrently.",
     type=lambda f: f if f.endswith(".zip") else None,
+    nargs="+",
 )
 parsed_args = args.parse_args()
 
@@ -33,50 +36,64 @@ parsed_args = args.parse_args()
 def main():
     """
     Main function.
-    1. Read the user demonstration record and parse it.
-    2. Summarize the demonstration record.
-    3. Let user decide whether to save the demonstration record.
-    4. Save the demonstration record if user choose to save.
+    1. Read the user demonstration records and parse them.
+    2. Summarize the demonstration records, concurrently if there are several.
+    3. Let user decide whether to save each demonstration record.
+    4. Save the demonstration records if user choose to save.
     """
     try:
-        content = unzip_and_read_file(parsed_args.behavior_record_path)
-        record = PSRRecordParser(content).parse_to_record()
-        record.set_request(parsed_args.request[0])
-
-        summarizer = DemonstrationSummarizer(
-            configs["APP_AGENT"]["VISUAL_MODE"],
-            configs["DEMONSTRATION_PROMPT"],
-            configs["APPAGENT_EXAMPLE_PROMPT"],
-            configs["API_PROMPT"],
-            configs["RAG_DEMONSTRATION_COMPLETION_N"],
-        )
-
-        summaries, total_cost = summarizer.get_summary_list(record)
-
-        is_save, index = __asker(summaries)
-        if is_save and index >= 0:
-            demonstration_path = configs["DEMONSTRATION_SAVED_PATH"]
-            create_folder(demonstration_path)
-
-            save_to_json(
-                record.__dict__,
-                os.path.join(
-                    demonstration_path,
-                    "demonstration_log",
-                    parsed_args.request[0].replace(" ", "_"),
-                )
-                + ".json",
-            )
-            summarizer.create_or_update_yaml(
-                [summaries[index]],
-                os.path.join(demonstration_path, "demonstration.yaml"),
+        record_paths: List[str] = parsed_args.behavior_record_path
+        requests: List[str] = parsed_args.request
+        if len(requests) != len(record_paths):
+            raise ValueError(
+                f"Got {len(requests)} requests for {len(record_paths)} records, one request is needed for each record."
             )
-            summarizer.create_or_update_vector_db(
-                [summaries[index]], os.path.join(demonstration_path, "demonstration_db")
+
+        # The screenshots of the records are read from their archives lazily, so the archives stay open until the
+        # records are summarized.
+        with contextlib.ExitStack() as stack:
+            records = []
+            for record_path, request in zip(record_paths, requests):
+                archive = stack.enter_context(MHTArchive.from_zip(record_path))
+                record = PSRRecordParser(archive).parse_to_record()
+                record.set_request(request)
+                records.append(record)
+
+            summarizer = DemonstrationSummarizer(
+                configs["APP_AGENT"]["VISUAL_MODE"],
+                configs["DEMONSTRATION_PROMPT"],
+                configs["APPAGENT_EXAMPLE_PROMPT"],
+                configs["API_PROMPT"],
+                configs["RAG_DEMONSTRATION_COMPLETION_N"],
             )
 
-        formatted_cost = "${:.2f}".format(total_cost)
-        print_with_color(f"Request total cost is {formatted_cost}", "yellow")
+            summary_lists, total_cost = summarizer.get_summary_lists(records)
+
+            for record, request, summaries in zip(records, requests, summary_lists):
+                if len(records) > 1:
+                    print_with_color(f"Request: {request}", "magenta")
+
+                is_save, index = __asker(summaries)
+                if is_save and index >= 0:
+                    demonstration_path = configs["DEMONSTRATION_SAVED_PATH"]
+                    create_folder(demonstration_path)
+
+                    save_items_to_json(
+                        record.iter_items(),
+                        os.path.join(
+                            demonstration_path,
+                            "demonstration_log",
+                            request.replace(" ", "_"),
+                        )
+                        + ".json",
+                    )
+                    summarizer.create_or_update_vector_db(
+                        [summaries[index]],
+                        os.path.join(demonstration_path, "demonstration_db"),
+                    )
+
+            formatted_cost = "${:.2f}".format(total_cost)
+            print_with_color(f"Request total cost is {formatted_cost}", "yellow")
 
     except ValueError as e:
         print_with_color(str(e), "red")
@@ -1,24 +1,25 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
-import os
-from typing import Tuple
-
-import yaml
-from langchain.docstore.document import Document
-from langchain_community.vectorstores import FAISS
+from typing import Iterable, List, Optional, Tuple
 
 from record_processor.parser.demonstration_record import DemonstrationRecord
 from record_processor.utils import json_parser
-from ufo.llm.llm_call import get_completions
+from ufo.config.config import Config
+from ufo.experience.store import ExperienceStore
+from ufo.llm.llm_call import get_completions_with_backoff
+from ufo.module.concurrency import iter_ordered
 from ufo.prompter.demonstration_prompter import DemonstrationPrompter
+from ufo.rag.embeddings import get_retriever_embedding
+
+configs = Config.get_instance().config_data
 
 
 class DemonstrationSummarizer:
     """
     The DemonstrationSummarizer class is the summarizer for the demonstration learning.
     It summarizes the demonstration record to a list of summaries,
-    and save the summaries to the YAML file and the vector database.
+    and appends the summaries to the demonstration store.
     A sample of the summary is as follows:
     {
         "example": {
@@ -59,13 +60,13 @@ class DemonstrationSummarizer:
 
     def get_summary_list(self, record: DemonstrationRecord) -> Tuple[list, float]:
         """
-        Get the summary list for a record
+        Get the summary list for a record. The rate-limited requests are retried with backoff.
         :param record: The demonstration record.
         return: The summary list for the user defined completion number and the cost
         """
 
         prompt = self.__build_prompt(record)
-        response_string_list, cost = get_completions(
+        response_string_list, cost = get_completions_with_backoff(
             prompt, "APPAGENT", use_backup_engine=True, n=self.completion_num
         )
         summaries = []
@@ -78,6 +79,27 @@ class DemonstrationSummarizer:
 
         return summaries, cost
 
+    def get_summary_lists(
+        self, records: Iterable[DemonstrationRecord], max_workers: Optional[int] = None
+    ) -> Tuple[List[list], float]:
+        """
+        Get the summary lists for several records. The records are summarized concurrently by a bounded number of
+        workers, and the summary lists keep the order of the records.
+        :param records: The demonstration records.
+        :param max_workers: The max number of concurrent summarization requests, SUMMARIZATION_CONCURRENCY by default.
+        return: The summary list of each record and the total cost.
+        """
+        if max_workers is None:
+            max_workers = configs.get("SUMMARIZATION_CONCURRENCY", 4)
+
+        summary_lists = []
+        total_cost = 0.0
+        for summaries, cost in iter_ordered(self.get_summary_list, records, max_workers):
+            summary_lists.append(summaries)
+            total_cost += cost
+
+        return summary_lists, total_cost
+
     def __build_prompt(self, demo_record: DemonstrationRecord) -> list:
         """
         Build the prompt by the user demonstration record.
@@ -133,62 +155,14 @@ class DemonstrationSummarizer:
 
             return summary
 
-    @staticmethod
-    def create_or_update_yaml(summaries: list, yaml_path: str):
-        """
-        Create or update the YAML file.
-        :param summaries: The summaries.
-        :param yaml_path: The path of the YAML file.
-        """
-
-        # Check if the file exists, if not, create a new one
-        if not os.path.exists(yaml_path):
-            with open(yaml_path, "w"):
-                pass
-            print(f"Created new YAML file: {yaml_path}")
-
-        # Read existing data from the YAML file
-        with open(yaml_path, "r") as file:
-            existing_data = yaml.safe_load(file)
-
-        # Initialize index and existing_data if file is empty
-        index = len(existing_data) if existing_data else 0
-        existing_data = existing_data or {}
-
-        # Update data with new summaries
-        for i, summary in enumerate(summaries):
-            example = {f"example{index + i}": summary}
-            existing_data.update(example)
-
-        # Write updated data back to the YAML file
-        with open(yaml_path, "w") as file:
-            yaml.safe_dump(
-                existing_data, file, default_flow_style=False, sort_keys=False
-            )
-
-        print(f"Updated existing YAML file successfully: {yaml_path}")
-
     @staticmethod
     def create_or_update_vector_db(summaries: list, db_path: str):
         """
-        Create or update the vector database.
+        Append the summaries to the demonstration store. The saved summaries are not read or rewritten.
         :param summaries: The summaries.
         :param db_path: The path of the vector database.
         """
 
-        document_list = []
-
-        for summary in summaries:
-            request = summary["request"]
-            document_list.append(Document(page_content=request, metadata=summary))
-
-        db = FAISS.from_documents(document_list, get_hugginface_embedding())
-
-        # Check if the db exists, if not, create a new one.
-        if os.path.exists(db_path):
-            prev_db = FAISS.load_local(db_path, get_hugginface_embedding())
-            db.merge_from(prev_db)
-
-        db.save_local(db_path)
+        ExperienceStore(db_path).append(summaries, get_retriever_embedding())
 
         print(f"Updated vector DB successfully: {db_path}")
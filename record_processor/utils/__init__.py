@@ -5,6 +5,7 @@
 import zipfile
 import json
 import os
+from typing import Any, Iterable, Tuple
 
 
 def unzip_and_read_file(file_path: str) -> str:
@@ -55,6 +56,28 @@ def save_to_json(data: dict, output_file_path: str):
         json.dump(data, file, indent=4)
         
         
+def save_items_to_json(items: Iterable[Tuple[str, Any]], output_file_path: str):
+    """
+    Save the key-value pairs to a JSON file as an object, writing one pair at a time.
+    The output is the same as save_to_json(dict(items), output_file_path).
+    items: the key-value pairs to save.
+    output_file_path: the path of the output file.
+    """
+
+    # Extract the directory path from the file path
+    directory = os.path.dirname(output_file_path)
+
+    create_folder(directory)
+
+    with open(output_file_path, 'w') as file:
+        separator = "{\n"
+        for key, value in items:
+            value_json = json.dumps(value, indent=4).replace("\n", "\n    ")
+            file.write(f"{separator}    {json.dumps(key)}: {value_json}")
+            separator = ",\n"
+        file.write("\n}" if separator == ",\n" else "{}")
+
+
 def create_folder(folder_path: str):
     """
     Create a folder if it doesn't exist.
@@ -0,0 +1,86 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import pytest
+
+pytest.importorskip("pywinauto")
+pytest.importorskip("pyautogui")
+
+from ufo.agents.memory.blackboard import Blackboard
+from ufo.automator.ui_control.screenshot import PhotographerFacade
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    """
+    Count the encoded screenshots, with every screenshot existing on disk.
+    :return: The paths of the encoded screenshots, in the encoding order.
+    """
+    paths = []
+
+    def encode_image_from_path(image_path, mime_type=None):
+        paths.append(image_path)
+        return f"data:image/png;base64,{image_path}"
+
+    monkeypatch.setattr(
+        PhotographerFacade, "image_exists", staticmethod(lambda path: True)
+    )
+    monkeypatch.setattr(
+        PhotographerFacade,
+        "encode_image_from_path",
+        staticmethod(encode_image_from_path),
+    )
+    monkeypatch.setattr("ufo.agents.memory.blackboard.SCREENSHOT_SAVING_MODE", "sync")
+    return paths
+
+
+def image_urls(prompt):
+    return [
+        content["image_url"]["url"]
+        for content in prompt
+        if content["type"] == "image_url"
+    ]
+
+
+def test_each_added_screenshot_is_encoded_once(encoded):
+    blackboard = Blackboard(token_budget=0, image_cache_size=0)
+
+    for step in range(5):
+        blackboard.add_image(f"step{step}.png", {"step": step})
+        prompt = blackboard.blackboard_to_prompt()
+
+    assert encoded == [f"step{step}.png" for step in range(5)]
+    assert image_urls(prompt) == [
+        f"data:image/png;base64,step{step}.png" for step in range(5)
+    ]
+
+
+def test_only_the_latest_encodings_are_kept(encoded):
+    blackboard = Blackboard(token_budget=0, image_cache_size=2)
+
+    for step in range(4):
+        blackboard.add_image(f"step{step}.png")
+    blackboard.blackboard_to_prompt()
+    encoded.clear()
+
+    blackboard.add_image("step4.png")
+    blackboard.blackboard_to_prompt()
+
+    # The new screenshot is encoded, and the older ones beyond the cache size are encoded again.
+    assert encoded == ["step0.png", "step1.png", "step4.png"]
+    assert sorted(blackboard._encoded_images) == ["step3.png", "step4.png"]
+
+
+def test_evicted_screenshots_are_not_encoded(encoded):
+    blackboard = Blackboard(token_budget=0, image_cache_size=0)
+    blackboard.screenshots.max_items = 2
+
+    for step in range(4):
+        blackboard.add_image(f"step{step}.png")
+        blackboard.blackboard_to_prompt()
+
+    assert encoded == ["step0.png", "step1.png", "step2.png", "step3.png"]
+    assert sorted(blackboard._encoded_images) == ["step2.png", "step3.png"]
+
+    blackboard.blackboard_to_prompt()
+    assert len(encoded) == 4
@@ -0,0 +1,55 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ufo.module.concurrency import DesktopLock, SessionTimer, iter_ordered
+
+
+def test_bound_task_time_is_added_to_the_session():
+    SessionTimer.reset()
+    SessionTimer.add("llm", 1.0)
+    buckets = SessionTimer.current()
+
+    def task():
+        with SessionTimer.bind(buckets):
+            SessionTimer.add("llm", 2.0)
+            with DesktopLock.hold():
+                pass
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(task).result()
+
+    phases = SessionTimer.snapshot()
+    assert phases["llm"] == 3.0
+    assert "ui" in phases and "desktop_wait" in phases
+
+
+def test_unbound_task_time_is_not_added_to_the_session():
+    SessionTimer.reset()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(SessionTimer.add, "llm", 2.0).result()
+
+    assert SessionTimer.snapshot() == {}
+
+
+def test_concurrent_bound_tasks_do_not_lose_time():
+    SessionTimer.reset()
+    buckets = SessionTimer.current()
+
+    def task(_):
+        with SessionTimer.bind(buckets):
+            for _ in range(1000):
+                SessionTimer.add("ui", 1.0)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(task, range(8)))
+
+    assert SessionTimer.snapshot()["ui"] == 8000.0
+
+
+def test_iter_ordered_keeps_the_order_of_the_items():
+    assert list(iter_ordered(lambda x: x * x, range(20), max_workers=4)) == [
+        x * x for x in range(20)
+    ]
@@ -0,0 +1,44 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pywinauto")
+pytest.importorskip("pyautogui")
+
+from ufo.automator.ui_control.control_filter import BasicControlFilter
+
+
+def test_topk_indices_are_sorted_by_descending_score():
+    scores = np.array([0.1, 0.9, 0.4, 0.7, 0.3], dtype=np.float32)
+
+    assert BasicControlFilter.topk_indices(scores, 3).tolist() == [1, 3, 2]
+    assert BasicControlFilter.topk_indices(scores, 1).tolist() == [1]
+
+
+def test_topk_indices_keep_the_order_of_equal_scores():
+    scores = np.array([0.5, 0.2, 0.5, 0.5, 0.9], dtype=np.float32)
+
+    assert BasicControlFilter.topk_indices(scores, 10).tolist() == [4, 0, 2, 3, 1]
+
+
+def test_topk_indices_of_no_scores_are_empty():
+    scores = np.array([0.5, 0.2], dtype=np.float32)
+
+    assert BasicControlFilter.topk_indices(scores, 0).tolist() == []
+    assert BasicControlFilter.topk_indices(scores[:0], 3).tolist() == []
+
+
+def test_cos_sim_matrix_matches_the_pairwise_similarity():
+    rng = np.random.default_rng(0)
+    contents = rng.normal(size=(5, 8))
+    plans = rng.normal(size=(3, 8))
+
+    matrix = BasicControlFilter.cos_sim_matrix(contents, plans)
+
+    assert matrix.shape == (5, 3)
+    for i, content in enumerate(contents):
+        for j, plan in enumerate(plans):
+            cosine = content @ plan / np.linalg.norm(content) / np.linalg.norm(plan)
+            assert matrix[i, j] == pytest.approx(cosine, abs=1e-5)
@@ -0,0 +1,107 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import os
+
+import numpy as np
+import pytest
+
+if not os.path.exists("ufo/config/config.yaml"):
+    pytest.skip("ufo/config/config.yaml is not configured.", allow_module_level=True)
+
+from ufo.utils.embedding_cache import DiskEmbeddingStore, EmbeddingCache
+
+MODEL = "all-MiniLM-L6-v2"
+
+
+def vector(value: float, dim: int = 4) -> np.ndarray:
+    return np.full(dim, value, dtype=np.float32)
+
+
+def make_cache(max_size: int = 16, cache_dir: str = "") -> EmbeddingCache:
+    """
+    Make a cache that is not shared with the other tests.
+    :param max_size: The maximum number of embeddings kept in memory.
+    :param cache_dir: The folder of the on-disk store, disabled if empty.
+    :return: The cache.
+    """
+    cache = object.__new__(EmbeddingCache)
+    cache._init_cache(MODEL, max_size, cache_dir)
+    return cache
+
+
+def test_store_is_reloaded_from_disk(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path), MODEL)
+    store.put({"a": vector(1), "b": vector(2)})
+    store.put({"b": vector(9), "c": vector(3)})
+
+    reloaded = DiskEmbeddingStore(str(tmp_path), MODEL)
+
+    assert len(reloaded) == 3
+    assert reloaded.get("b").tolist() == vector(2).tolist()
+    assert reloaded.get("c").tolist() == vector(3).tolist()
+    assert reloaded.get("d") is None
+
+
+def test_torn_rows_of_an_interrupted_writer_are_repaired(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path), MODEL)
+    store.put({"a": vector(1), "b": vector(2)})
+
+    # An interrupted writer left a vector without its key, and a partial key line.
+    with open(store.vector_path, "ab") as f:
+        f.write(vector(7).tobytes() + b"\x00\x01")
+    with open(store.key_path, "ab") as f:
+        f.write(b"tor")
+
+    repaired = DiskEmbeddingStore(str(tmp_path), MODEL)
+
+    assert len(repaired) == 2
+    assert os.path.getsize(repaired.vector_path) == 2 * 4 * 4
+    with open(repaired.key_path, "rb") as f:
+        assert f.read() == b"a\nb\n"
+
+    repaired.put({"c": vector(3)})
+    assert DiskEmbeddingStore(str(tmp_path), MODEL).get("c").tolist() == vector(3).tolist()
+
+
+def test_writers_sharing_a_folder_read_each_other(tmp_path):
+    first = DiskEmbeddingStore(str(tmp_path), MODEL)
+    second = DiskEmbeddingStore(str(tmp_path), MODEL)
+
+    first.put({"a": vector(1)})
+    second.put({"b": vector(2)})
+    first.put({"c": vector(3)})
+
+    reloaded = DiskEmbeddingStore(str(tmp_path), MODEL)
+    for key, value in [("a", 1), ("b", 2), ("c", 3)]:
+        assert reloaded.get(key).tolist() == vector(value).tolist()
+
+
+def test_only_missing_contents_are_encoded_once():
+    cache = make_cache()
+    batches = []
+
+    def encoder(items):
+        batches.append(items)
+        return [vector(len(item)) for item in items]
+
+    cache.encode(["ab", "abc"], encoder)
+    embeddings = cache.encode(["abc", "abcd", "abcd", "ab"], encoder)
+
+    assert batches == [["ab", "abc"], ["abcd"]]
+    assert embeddings[:, 0].tolist() == [3, 4, 4, 2]
+    assert cache.encode("ab", encoder).tolist() == vector(2).tolist()
+    assert cache.statistics()["misses"] == 3
+
+
+def test_embeddings_are_read_from_disk_after_eviction(tmp_path):
+    cache = make_cache(max_size=1, cache_dir=str(tmp_path))
+    encoder = lambda items: [vector(len(item)) for item in items]
+
+    cache.encode(["ab", "abc"], encoder)
+    cache.encode("ab", lambda items: pytest.fail("The embedding is on disk."))
+
+    statistics = cache.statistics()
+    assert statistics["disk_hits"] == 1
+    assert statistics["memory_size"] == 1
+    assert statistics["disk_size"] == 2
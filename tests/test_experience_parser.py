@@ -0,0 +1,77 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import json
+
+import pytest
+
+pytest.importorskip("pywinauto")
+pytest.importorskip("pyautogui")
+
+from ufo.automator.ui_control.screenshot import PhotographerFacade
+from ufo.experience.parser import ExperienceLogLoader
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    """
+    Make the log folder of a session with two requests, of two and one steps.
+    :return: The path of the log folder.
+    """
+    responses = [
+        {"Round": 0, "Request": "open word", "Application": "WINWORD.EXE"},
+        {"Round": 0, "Request": "open word", "Application": "explorer.exe"},
+        {"Round": 1, "Request": "save it", "Application": "WINWORD.EXE"},
+    ]
+    with open(tmp_path / "response.log", "w", encoding="utf-8") as f:
+        for response in responses:
+            f.write(json.dumps(response) + "\n")
+    for step in range(len(responses) + 1):
+        (tmp_path / f"action_step{step}.png").write_bytes(b"png")
+    (tmp_path / "action_step0_selected_controls.png").write_bytes(b"png")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    """
+    Count the encoded screenshots.
+    :return: The paths of the encoded screenshots, in the encoding order.
+    """
+    paths = []
+
+    def encode_image_from_path(image_path, mime_type=None):
+        paths.append(image_path)
+        return f"data:image/png;base64,{len(paths)}"
+
+    monkeypatch.setattr(
+        PhotographerFacade,
+        "encode_image_from_path",
+        staticmethod(encode_image_from_path),
+    )
+    return paths
+
+
+def test_logs_are_streamed_by_request(log_path, encoded):
+    loader = ExperienceLogLoader(log_path)
+
+    logs = list(loader.iter_logs())
+
+    assert [(log["request"], log["round"], log["step_num"]) for log in logs] == [
+        ("open word", 0, 2),
+        ("save it", 1, 1),
+    ]
+    assert sorted(logs[0]["application"]) == ["WINWORD.EXE", "explorer.exe"]
+    assert loader.request_partition == [[0, 1], [2]]
+    assert encoded == []
+
+
+def test_screenshots_are_encoded_on_access(log_path, encoded):
+    first = next(ExperienceLogLoader(log_path).iter_logs())
+    screenshots = first["step_0"]["screenshot"]
+
+    assert screenshots["raw"] == "data:image/png;base64,1"
+    assert screenshots["raw"] == "data:image/png;base64,2"
+    assert screenshots["selected_controls"] == "data:image/png;base64,3"
+    assert first["step_1"]["screenshot"]["selected_controls"] is None
+    assert len(encoded) == 3
@@ -0,0 +1,136 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import hashlib
+import os
+
+import pytest
+import yaml
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from ufo.experience.store import ExperienceStore
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings of the texts, which count the embedded texts.
+    """
+
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[:8]]
+
+
+def summary(request: str, *apps: str) -> dict:
+    return {"request": request, "app_list": list(apps)}
+
+
+def requests(db: FAISS):
+    return sorted(document.metadata["request"] for _, document in ExperienceStore.documents(db))
+
+
+def test_appended_summaries_are_loaded_without_embedding(tmp_path):
+    embedding = FakeEmbeddings()
+    store = ExperienceStore(str(tmp_path))
+
+    store.append([summary("open word", "WINWORD.EXE")], embedding)
+    store.append([summary("merge sheets", "EXCEL.EXE", "WINWORD.EXE")], embedding)
+    embedding.texts.clear()
+
+    assert store.is_partitioned()
+    assert requests(store.load(embedding)) == ["merge sheets", "open word"]
+    assert requests(store.partition("WINWORD.EXE").load(embedding)) == [
+        "merge sheets",
+        "open word",
+    ]
+    assert requests(store.partition("excel.exe").load(embedding)) == ["merge sheets"]
+    assert embedding.texts == []
+
+
+def test_torn_record_of_a_failed_writer_is_repaired(tmp_path):
+    embedding = FakeEmbeddings()
+    store = ExperienceStore(str(tmp_path))
+    store.append([summary("open word", "WINWORD.EXE")], embedding)
+
+    # A failed writer left a vector and a partial record.
+    with open(store.vector_path, "ab") as f:
+        f.write(b"\x00" * 4 * 8)
+    with open(store.record_path, "ab") as f:
+        f.write(b'{"id": "torn", "te')
+
+    assert [record["text"] for record in store.read()[0]] == ["open word"]
+    store.append([summary("save file", "WINWORD.EXE")], embedding)
+
+    records, vectors = store.read()
+    assert [record["text"] for record in records] == ["open word", "save file"]
+    assert vectors.shape == (2, 8)
+
+
+def test_compaction_folds_the_records_and_drops_the_duplicates(tmp_path):
+    embedding = FakeEmbeddings()
+    store = ExperienceStore(str(tmp_path))
+    store.append([summary("open word", "WINWORD.EXE")], embedding)
+    store.append(
+        [summary("open word", "WINWORD.EXE"), summary("merge sheets", "EXCEL.EXE")],
+        embedding,
+    )
+    yaml_path = str(tmp_path / "experience.yaml")
+
+    assert store.compact(embedding, yaml_path) == 2
+
+    assert store.has_snapshot()
+    assert store.read()[0] == []
+    assert requests(store.load(embedding)) == ["merge sheets", "open word"]
+    assert requests(store.partition("WINWORD.EXE").load(embedding)) == ["open word"]
+    with open(yaml_path, "r") as f:
+        assert sorted(example["request"] for example in yaml.safe_load(f).values()) == [
+            "merge sheets",
+            "open word",
+        ]
+
+
+def test_compaction_partitions_a_legacy_store(tmp_path):
+    embedding = FakeEmbeddings()
+    FAISS.from_texts(
+        ["open word"],
+        embedding,
+        metadatas=[summary("open word", "WINWORD.EXE")],
+    ).save_local(str(tmp_path))
+    store = ExperienceStore(str(tmp_path))
+
+    store.append([summary("merge sheets", "EXCEL.EXE")], embedding)
+    # The partitions only hold the summaries appended since the upgrade.
+    assert not store.is_partitioned()
+    assert not os.path.exists(ExperienceStore.partition_path(str(tmp_path), "WINWORD.EXE"))
+
+    store.compact(embedding)
+
+    assert store.is_partitioned()
+    assert requests(store.partition("WINWORD.EXE").load(embedding)) == ["open word"]
+    assert requests(store.partition("EXCEL.EXE").load(embedding)) == ["merge sheets"]
+
+
+def test_compaction_removes_the_partitions_without_summaries(tmp_path):
+    embedding = FakeEmbeddings()
+    store = ExperienceStore(str(tmp_path))
+    store.append([summary("open word", "WINWORD.EXE")], embedding)
+    # The partition of an application whose summaries are no longer in the store.
+    store.partition("mspaint.exe").append([summary("draw", "mspaint.exe")], embedding)
+
+    store.compact(embedding)
+
+    assert sorted(os.listdir(os.path.join(str(tmp_path), ExperienceStore.PARTITION_FOLDER))) == [
+        "winword.exe"
+    ]
@@ -0,0 +1,68 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import base64
+import io
+import os
+
+from PIL import Image
+
+from ufo.llm.image_transcoder import ImageTranscoder
+
+
+def data_url(color, size=(64, 64)) -> str:
+    """
+    Make the data URL of a PNG image of a single color.
+    :param color: The color of the image.
+    :param size: The size of the image.
+    :return: The data URL.
+    """
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_resized_image_is_converted_once():
+    transcoder = ImageTranscoder()
+    image = data_url("red", (1024, 512))
+
+    first = transcoder.to_base64(image, max_size=512)
+    second = transcoder.to_base64(image, max_size=512)
+
+    assert first == second
+    assert transcoder.statistics()["misses"] == 1
+    assert transcoder.statistics()["hits"] == 1
+    resized = Image.open(io.BytesIO(base64.b64decode(first)))
+    assert resized.size == (512, 256)
+
+
+def test_same_image_is_written_once(tmp_path):
+    transcoder = ImageTranscoder()
+
+    path = transcoder.to_file(data_url("red"), max_size=512, folder=str(tmp_path))
+
+    assert transcoder.to_file(data_url("red"), 512, str(tmp_path)) == path
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+
+def test_least_recently_used_files_are_deleted(tmp_path):
+    transcoder = ImageTranscoder()
+    colors = ["red", "green", "blue"]
+    paths = [
+        transcoder.to_file(data_url(color), 512, str(tmp_path)) for color in colors
+    ]
+    file_size = os.path.getsize(paths[0])
+
+    # Reuse the first image, so that the second one is the least recently used.
+    transcoder.to_file(data_url("red"), 512, str(tmp_path))
+    transcoder.to_file(
+        data_url("white"),
+        512,
+        str(tmp_path),
+        max_files_mb=3.5 * file_size / 1024 / 1024,
+    )
+
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+    assert os.path.exists(paths[2])
+    assert len(os.listdir(tmp_path)) == 3
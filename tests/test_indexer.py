@@ -0,0 +1,118 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_community")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from learner import indexer
+from learner.utils import save_json_file
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings of the texts, which count the embedded texts.
+    """
+
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[:8]]
+
+
+@pytest.fixture
+def embeddings(monkeypatch, tmp_path):
+    """
+    Use the fake embeddings, and a records file in the temporary folder.
+    :return: The fake embeddings.
+    """
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(indexer, "get_hugginface_embedding", lambda: fake)
+    monkeypatch.setattr(indexer, "RECORDS_PATH", str(tmp_path / "records.json"))
+    return fake
+
+
+def write_document(docs, name: str, title: str) -> str:
+    """
+    Write a help document and its metadata.
+    :param docs: The folder of the documents.
+    :param name: The name of the document.
+    :param title: The title of the document.
+    :return: The path of the document.
+    """
+    path = os.path.join(docs, name + ".xml")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<doc><p>{title}</p></doc>".format(title=title))
+    with open(path + ".meta", "w", encoding="utf-8") as f:
+        f.write(
+            '<meta><title>{title}</title><Content-Summary value="How to {title}"/></meta>'.format(
+                title=title
+            )
+        )
+    return path
+
+
+def titles(path: str, embeddings: Embeddings):
+    db = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    return sorted(
+        db.docstore.search(doc_id).metadata["title"]
+        for doc_id in db.index_to_docstore_id.values()
+    )
+
+
+def test_only_new_and_changed_documents_are_embedded(embeddings, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    save_path = str(tmp_path / "db")
+    write_document(str(docs), "insert", "insert a table")
+    removed = write_document(str(docs), "print", "print a page")
+
+    path = indexer.create_indexer("word", str(docs), "xml", True, save_path, chunk_size=1)
+    assert len(embeddings.texts) == 2
+
+    # Nothing changed, so nothing is embedded.
+    assert indexer.create_indexer("word", str(docs), "xml", True, save_path) == path
+    assert len(embeddings.texts) == 2
+
+    embeddings.texts.clear()
+    write_document(str(docs), "insert", "insert a chart")
+    write_document(str(docs), "save", "save a file")
+    os.remove(removed)
+    os.remove(removed + ".meta")
+
+    assert indexer.create_indexer("word", str(docs), "xml", True, save_path) == path
+    assert sorted(embeddings.texts) == [
+        "insert a chart - How to insert a chart",
+        "save a file - How to save a file",
+    ]
+    assert titles(path, embeddings) == ["insert a chart", "save a file"]
+
+
+def test_legacy_record_is_rebuilt(embeddings, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    save_path = str(tmp_path / "db")
+    write_document(str(docs), "insert", "insert a table")
+
+    path = indexer.create_indexer("word", str(docs), "xml", False, save_path)
+    # A record of an earlier version only has the path of the indexer.
+    save_json_file(indexer.RECORDS_PATH, {"word": path})
+    embeddings.texts.clear()
+
+    assert indexer.create_indexer("word", str(docs), "xml", True, save_path) == path
+    assert len(embeddings.texts) == 1
+    assert titles(path, embeddings) == ["insert a table"]
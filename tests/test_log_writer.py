@@ -0,0 +1,69 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import base64
+import json
+import logging
+import os
+
+from ufo.module.log_writer import (
+    REQUEST_IMAGE_FOLDER,
+    AsyncLogWriter,
+    JSONLogFormatter,
+    RequestImageStore,
+)
+
+IMAGE = "data:image/png;base64," + base64.b64encode(b"fake png").decode()
+
+
+def make_record(msg) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, 0, msg, None, None)
+
+
+def test_json_message_is_formatted_as_a_json_line():
+    formatter = JSONLogFormatter()
+    message = {"step": 1, "prompt": [{"text": "hello"}, {"image": IMAGE}]}
+
+    assert json.loads(formatter.format(make_record(message))) == message
+
+
+def test_text_message_is_formatted_as_is():
+    assert JSONLogFormatter().format(make_record("plain text")) == "plain text"
+
+
+def test_images_are_stored_once_and_restored(tmp_path):
+    log_path = str(tmp_path)
+    formatter = JSONLogFormatter(RequestImageStore(log_path))
+    message = {"prompt": [{"image": IMAGE}, {"image": IMAGE}]}
+
+    logged = json.loads(formatter.format(make_record(message)))
+
+    path = logged["prompt"][0]["image"]
+    assert path.startswith(REQUEST_IMAGE_FOLDER + "/") and path.endswith(".png")
+    assert logged["prompt"][1]["image"] == path
+    assert os.listdir(os.path.join(log_path, REQUEST_IMAGE_FOLDER)) == [
+        os.path.basename(path)
+    ]
+    assert RequestImageStore.restore(logged, log_path) == message
+
+
+def test_message_changed_after_logging_is_logged_as_it_was(tmp_path):
+    log_file = str(tmp_path / "request.log")
+    handler = logging.FileHandler(log_file, encoding="utf-8")
+    handler.setFormatter(JSONLogFormatter())
+
+    logger = logging.getLogger(f"test_log_writer_{id(tmp_path)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    AsyncLogWriter.attach(logger, handler)
+
+    message = {"step": 1, "plan": ["open"]}
+    logger.info(message)
+    message["step"] = 2
+    message["plan"].append("close")
+
+    AsyncLogWriter.flush(logger)
+    handler.close()
+
+    with open(log_file, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [{"step": 1, "plan": ["open"]}]
@@ -0,0 +1,87 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import io
+import zipfile
+
+import pytest
+
+from record_processor.parser.mht_archive import MHTArchive
+
+SCREENSHOT = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk" * 50
+
+
+def make_mht(newline: str) -> str:
+    """
+    Make a .mht file of a recording with a page and a screenshot.
+    :param newline: The line break of the file.
+    :return: The content of the .mht file.
+    """
+    lines = [
+        "MIME-Version: 1.0",
+        'Content-Type: multipart/related; boundary="=_NextPart_SMP_1"',
+        "",
+        "--=_NextPart_SMP_1",
+        "Content-Type: text/html; charset=UTF-8",
+        "Content-Location: main.htm",
+        "",
+        "<html>",
+        "<p>Step 1: Click --=_NextPart_SMP_1 in the text</p>",
+        "</html>",
+        "--=_NextPart_SMP_1",
+        "Content-Type: image/jpeg",
+        "Content-Transfer-Encoding: base64",
+        "Content-Location: screenshot0001.JPEG",
+        "",
+        SCREENSHOT,
+        "--=_NextPart_SMP_1",
+        "Content-Type: text/plain",
+        "",
+        "A part without a location.",
+        "--=_NextPart_SMP_1--",
+        "",
+    ]
+    return newline.join(lines)
+
+
+@pytest.mark.parametrize("newline", ["\r\n", "\n"])
+@pytest.mark.parametrize("chunk_size", [128, 1 << 20])
+def test_parts_are_indexed_with_either_line_break(monkeypatch, newline, chunk_size):
+    # Small chunks split the parts and their headers across the reads.
+    monkeypatch.setattr(MHTArchive, "CHUNK_SIZE", chunk_size)
+
+    with MHTArchive.from_string(make_mht(newline)) as archive:
+        assert sorted(archive.parts) == ["main.htm", "screenshot0001.JPEG"]
+        assert archive.read("main.htm") == (
+            "<html>\n<p>Step 1: Click --=_NextPart_SMP_1 in the text</p>\n</html>"
+        )
+        assert archive.read_data_url("screenshot0001.JPEG") == (
+            "data:image/jpeg;base64, " + SCREENSHOT
+        )
+
+
+def test_archive_is_read_from_the_zip_file(tmp_path):
+    zip_path = str(tmp_path / "recording.zip")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("Recording_20240101_1200.mht", make_mht("\r\n"))
+
+    with MHTArchive.from_zip(zip_path) as archive:
+        # Reading the parts out of their order seeks backwards in the member.
+        assert archive.read("screenshot0001.JPEG") == SCREENSHOT
+        assert archive.read("main.htm").startswith("<html>")
+        assert archive.read("screenshot0001.JPEG") == SCREENSHOT
+
+
+def test_recently_read_parts_are_cached():
+    # The raw screenshot part ends with the line break before the next boundary.
+    part_size = len(SCREENSHOT) + 1
+    archive = MHTArchive(
+        io.BytesIO(make_mht("\n").encode("utf-8")), cache_size=part_size
+    )
+
+    archive.read("main.htm")
+    archive.read("screenshot0001.JPEG")
+
+    # The screenshot fills the cache, so the page is evicted.
+    assert list(archive._cache) == ["screenshot0001.JPEG"]
+    assert archive._cache_bytes == part_size
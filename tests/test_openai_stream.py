@@ -0,0 +1,108 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from ufo.llm.openai import OpenAIService
+
+PRICES = {"openai/gpt-4o": {"input": 0.005, "output": 0.015}}
+
+
+def make_chunk(deltas=(), usage=None):
+    """
+    Make a fake chat completion chunk.
+    :param deltas: The text deltas of the chunk, in a format of [(choice index, text)].
+    :param usage: The usage reported by the chunk.
+    :return: The chunk.
+    """
+    choices = [
+        SimpleNamespace(index=index, delta=SimpleNamespace(content=text))
+        for index, text in deltas
+    ]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeCompletions:
+    """
+    The fake chat completions API of a client, which streams the given chunks.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.kwargs = None
+
+    def create(self, **kwargs):
+        self.kwargs = kwargs
+        return iter(self.chunks)
+
+
+def make_service(chunks) -> OpenAIService:
+    """
+    Make an OpenAI service with a fake client, without creating an HTTP client.
+    :param chunks: The chunks streamed by the fake client.
+    :return: The service.
+    """
+    service = OpenAIService.__new__(OpenAIService)
+    service.config_llm = {"API_MODEL": "gpt-4o"}
+    service.config = {"TEMPERATURE": 0.0, "MAX_TOKENS": 100, "TOP_P": 0.0}
+    service.api_type = "openai"
+    service.prices = PRICES
+    service.client = SimpleNamespace(
+        chat=SimpleNamespace(completions=FakeCompletions(chunks))
+    )
+    return service
+
+
+def test_consume_stream_joins_deltas_and_prices_usage():
+    chunks = [
+        make_chunk([(0, '{"Control'), (1, "Second")]),
+        make_chunk([(0, 'Label": "3"}'), (1, None)]),
+        make_chunk(usage=SimpleNamespace(prompt_tokens=1000, completion_tokens=100)),
+    ]
+    deltas = []
+
+    responses, cost = make_service(chunks)._consume_stream(
+        iter(chunks), "gpt-4o", 2, deltas.append
+    )
+
+    assert responses == ['{"ControlLabel": "3"}', "Second"]
+    # Only the deltas of the first completion are sent to the callback.
+    assert deltas == ['{"Control', 'Label": "3"}']
+    assert cost == pytest.approx(0.005 + 0.0015)
+
+
+def test_consume_stream_reads_raw_usage():
+    chunks = [
+        make_chunk([(0, "Hello")]),
+        make_chunk(usage={"prompt_tokens": 1000, "completion_tokens": 0}),
+    ]
+
+    responses, cost = make_service(chunks)._consume_stream(iter(chunks), "gpt-4o", 1)
+
+    assert responses == ["Hello"]
+    assert cost == pytest.approx(0.005)
+
+
+def test_consume_stream_without_usage_costs_nothing():
+    chunks = [make_chunk([(0, "Hello")])]
+
+    _, cost = make_service(chunks)._consume_stream(iter(chunks), "gpt-4o", 1)
+
+    assert cost == 0.0
+
+
+def test_stream_options_are_sent_in_the_body():
+    chunks = [make_chunk([(0, "Hello")])]
+    service = make_service(chunks)
+
+    responses, _ = service.chat_completion([], 1, stream=True)
+
+    kwargs = service.client.chat.completions.kwargs
+    assert responses == ["Hello"]
+    assert "stream_options" not in kwargs
+    assert kwargs["extra_body"] == {"stream_options": {"include_usage": True}}
@@ -0,0 +1,76 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+from ufo.rag.cache import RetrievalCache
+
+
+class FakeRetriever:
+    """
+    A fake retriever, which counts its retrievals.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+
+    def retrieve(self, query, top_k, filter=None):
+        self.calls += 1
+        return [f"{self.name}:{query}:{top_k}:{self.calls}"]
+
+
+def test_results_are_reused_within_the_scope():
+    cache = RetrievalCache()
+    retriever = FakeRetriever("experience")
+    cache.set_scope((1, "subtask"))
+
+    first = cache.retrieve(retriever, "open word", 3)
+    assert cache.retrieve(retriever, "open word", 3) == first
+    cache.set_scope((1, "subtask"))
+    assert cache.retrieve(retriever, "open word", 3) == first
+
+    assert retriever.calls == 1
+    assert cache.get_statistics() == {"hits": 2, "misses": 1, "size": 1}
+
+
+def test_scope_change_invalidates_the_results():
+    cache = RetrievalCache()
+    retriever = FakeRetriever("experience")
+
+    cache.set_scope((1, "first subtask"))
+    cache.retrieve(retriever, "open word", 3)
+    cache.set_scope((1, "second subtask"))
+    cache.retrieve(retriever, "open word", 3)
+    cache.invalidate()
+    cache.retrieve(retriever, "open word", 3)
+
+    assert retriever.calls == 3
+    assert cache.get_statistics()["size"] == 1
+
+
+def test_results_are_keyed_by_retriever_query_and_filter():
+    cache = RetrievalCache()
+    experience = FakeRetriever("experience")
+    demonstration = FakeRetriever("demonstration")
+
+    cache.retrieve(experience, "open word", 3)
+    cache.retrieve(demonstration, "open word", 3)
+    cache.retrieve(experience, "open excel", 3)
+    cache.retrieve(experience, "open word", 5)
+    cache.retrieve(experience, "open word", 3, filter_key="word", filter=len)
+
+    assert experience.calls == 4
+    assert demonstration.calls == 1
+    assert cache.get_statistics()["hits"] == 0
+
+
+def test_disabled_cache_retrieves_every_time():
+    cache = RetrievalCache(enabled=False)
+    retriever = FakeRetriever("experience")
+
+    cache.retrieve(retriever, "open word", 3)
+    cache.retrieve(retriever, "open word", 3)
+    cache.reset_statistics()
+    cache.retrieve(retriever, "open word", 3)
+
+    assert retriever.calls == 3
+    assert cache.get_statistics() == {"hits": 0, "misses": 1, "size": 0}
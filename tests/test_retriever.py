@@ -0,0 +1,112 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain")
+pytest.importorskip("requests")
+
+if not os.path.exists("ufo/config/config.yaml"):
+    pytest.skip("ufo/config/config.yaml is not configured.", allow_module_level=True)
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from ufo.experience.store import ExperienceStore
+from ufo.rag import retriever
+from ufo.rag.retriever import ExperienceRetriever, IndexRegistry
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings of the texts.
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[:8]]
+
+
+@pytest.fixture
+def embedding(monkeypatch):
+    """
+    Use the fake embeddings in the retrievers, with an empty registry.
+    :return: The fake embeddings.
+    """
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(retriever, "get_retriever_embedding", lambda: fake)
+    IndexRegistry.clear()
+    yield fake
+    IndexRegistry.clear()
+
+
+@pytest.fixture
+def meta_reads(monkeypatch):
+    """
+    Count the reads of the metadata of the stores.
+    :return: The paths of the stores whose metadata is read.
+    """
+    paths = []
+    is_partitioned = ExperienceStore.is_partitioned
+
+    def count(store):
+        paths.append(store.path)
+        return is_partitioned(store)
+
+    monkeypatch.setattr(ExperienceStore, "is_partitioned", count)
+    return paths
+
+
+def summary(request: str, *apps: str) -> dict:
+    return {"request": request, "app_list": list(apps)}
+
+
+def word_filter(metadata) -> bool:
+    return "WINWORD.EXE" in metadata["app_list"]
+
+
+def test_partitioned_store_is_routed_to_the_partition(tmp_path, embedding, meta_reads):
+    path = str(tmp_path)
+    ExperienceStore(path).append(
+        [summary("open word", "WINWORD.EXE"), summary("merge sheets", "EXCEL.EXE")],
+        embedding,
+    )
+    experience = ExperienceRetriever(path)
+
+    for _ in range(3):
+        documents = experience.retrieve("open", 5, app_name="WINWORD.EXE")
+        assert [document.page_content for document in documents] == ["open word"]
+
+    # Each store is only checked when it is loaded, not on each retrieval.
+    assert meta_reads == [path, ExperienceStore.partition_path(path, "WINWORD.EXE")]
+
+
+def test_legacy_store_is_filtered_until_it_is_compacted(tmp_path, embedding):
+    path = str(tmp_path)
+    FAISS.from_texts(
+        ["open word"], embedding, metadatas=[summary("open word", "WINWORD.EXE")]
+    ).save_local(path)
+    store = ExperienceStore(path)
+    store.append([summary("merge sheets", "EXCEL.EXE")], embedding)
+    experience = ExperienceRetriever(path)
+
+    assert not IndexRegistry.is_partitioned(path)
+    documents = experience.retrieve("open", 5, filter=word_filter, app_name="WINWORD.EXE")
+    assert [document.page_content for document in documents] == ["open word"]
+
+    store.compact(embedding)
+
+    assert IndexRegistry.is_partitioned(path)
+    documents = experience.retrieve("open", 5, app_name="WINWORD.EXE")
+    assert [document.page_content for document in documents] == ["open word"]
+
+
+def test_missing_index_is_not_partitioned(tmp_path, embedding):
+    assert not IndexRegistry.is_partitioned(str(tmp_path / "missing"))
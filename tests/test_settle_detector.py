@@ -0,0 +1,68 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import time
+
+from PIL import Image
+
+from ufo.utils.settle import SettleDetector
+
+
+class FakeWindow:
+    """
+    A fake window, whose frame turns from black to white at the change time after the action.
+    """
+
+    def __init__(self, change_time: float = None, change_duration: float = 0.0):
+        """
+        :param change_time: The time (s) the window starts changing, or None if it does not change.
+        :param change_duration: The time (s) the window keeps changing, e.g. an animation.
+        """
+        self.start_time = time.time()
+        self.change_time = change_time
+        self.change_duration = change_duration
+
+    def grab(self) -> Image.Image:
+        """
+        Grab a frame of the window.
+        :return: The frame.
+        """
+        elapsed = time.time() - self.start_time
+        if self.change_time is None or elapsed < self.change_time:
+            return Image.new("RGB", (128, 128), "black")
+        if elapsed < self.change_time + self.change_duration:
+            # A different frame at each poll while the window is changing.
+            return Image.new("RGB", (128, 128), (int(elapsed * 1000) % 256,) * 3)
+        return Image.new("RGB", (128, 128), "white")
+
+
+def make_detector() -> SettleDetector:
+    return SettleDetector(stable_time=0.2, poll_interval=0.02, min_wait=0.5)
+
+
+def test_unchanged_window_waits_min_wait():
+    waited = make_detector().wait(FakeWindow().grab, timeout=5)
+    assert 0.5 <= waited < 1.0
+
+
+def test_delayed_change_is_waited_for():
+    window = FakeWindow(change_time=0.3)
+    waited = make_detector().wait(window.grab, timeout=5)
+
+    # The wait does not end before the change, and ends once the window is stable after it.
+    assert waited >= 0.3 + 0.2
+    assert window.grab().getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_settles_after_animation():
+    waited = make_detector().wait(
+        FakeWindow(change_time=0.0, change_duration=0.8).grab, timeout=5
+    )
+    assert 0.8 + 0.2 <= waited < 1.5
+
+
+def test_timeout_on_constant_change():
+    waited = make_detector().wait(
+        FakeWindow(change_time=0.0, change_duration=10).grab, timeout=0.6
+    )
+    assert 0.6 <= waited < 1.0
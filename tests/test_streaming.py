@@ -0,0 +1,62 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+from ufo.llm.streaming import IncrementalJSONParser, JSONFieldStream
+
+
+def test_parser_closes_each_field_once_across_deltas():
+    parser = IncrementalJSONParser()
+    text = '{"Observation": "a \\"quoted\\" {text}", "Plan": [{"step": 1}, "b"], "Done": true}'
+
+    fields = []
+    for char in text:
+        fields.extend(parser.feed(char))
+
+    assert fields == [
+        ("Observation", 'a "quoted" {text}'),
+        ("Plan", [{"step": 1}, "b"]),
+        ("Done", True),
+    ]
+
+
+def test_parser_skips_invalid_values_and_text_after_the_object():
+    parser = IncrementalJSONParser()
+
+    assert parser.feed('Sure!\n{"Label": oops, "Plan": []} {"Label": "2"}') == [
+        ("Plan", [])
+    ]
+    assert parser.feed('{"Label": "3"}') == []
+
+
+def test_field_callback_before_object_is_closed():
+    stream = JSONFieldStream()
+    labels = []
+    stream.on("ControlLabel", labels.append)
+
+    stream.feed('```json\n{"Observation": "A {brace}", "Control')
+    assert labels == []
+
+    stream.feed('Label": "3", "Plan": ["open"')
+    assert labels == ["3"]
+    assert "Plan" not in stream.fields
+
+    stream.feed("]}\n```")
+    assert stream.fields["Plan"] == ["open"]
+
+
+def test_reset_calls_reset_callbacks_and_restarts_parsing():
+    stream = JSONFieldStream()
+    labels = []
+    resets = []
+    stream.on("ControlLabel", labels.append)
+    stream.on_reset(lambda: resets.append(True))
+
+    stream.feed('{"ControlLabel": "1", "Plan')
+    stream.reset()
+
+    assert resets == [True]
+    assert stream.fields == {}
+
+    # The retried request streams a new object from its start.
+    stream.feed('{"ControlLabel": "2"}')
+    assert labels == ["1", "2"]
@@ -16,6 +16,7 @@ from ufo.config.config import Config
 from ufo.module import interactor
 from ufo.module.context import Context
 from ufo.prompter.agent_prompter import AppAgentPrompter
+from ufo.rag.cache import RetrievalCache
 
 configs = Config.get_instance().config_data
 
@@ -58,6 +59,7 @@ class AppAgent(BasicAgent):
         self.online_doc_retriever = None
         self.experience_retriever = None
         self.human_demonstration_retriever = None
+        self.retrieval_cache = RetrievalCache(configs.get("RETRIEVAL_CACHE", True))
 
         self.Puppeteer = self.create_puppteer_interface()
         self.set_state(ContinueAppAgentState())
@@ -211,7 +213,8 @@ class AppAgent(BasicAgent):
 
         # Retrieve offline documents and construct the prompt
         if self.offline_doc_retriever:
-            offline_docs = self.offline_doc_retriever.retrieve(
+            offline_docs = self.retrieval_cache.retrieve(
+                self.offline_doc_retriever,
                 "How to {query} for {app}".format(
                     query=request, app=self._process_name
                 ),
@@ -227,8 +230,8 @@ class AppAgent(BasicAgent):
 
         # Retrieve online documents and construct the prompt
         if self.online_doc_retriever:
-            online_search_docs = self.online_doc_retriever.retrieve(
-                request, online_top_k, filter=None
+            online_search_docs = self.retrieval_cache.retrieve(
+                self.online_doc_retriever, request, online_top_k, filter=None
             )
             online_docs_prompt = self.prompter.retrived_documents_prompt_helper(
                 "Online Search Results",
@@ -247,12 +250,16 @@ class AppAgent(BasicAgent):
         :return: The retrieved examples and tips string.
         """
 
-        # Retrieve experience examples. Only retrieve the examples that are related to the current application.
-        experience_docs = self.experience_retriever.retrieve(
+        # Retrieve experience examples. Only retrieve the examples that are related to the current application,
+        # from its partition, or with the filter if the experience database is not partitioned.
+        experience_docs = self.retrieval_cache.retrieve(
+            self.experience_retriever,
             request,
             experience_top_k,
+            filter_key=self._app_root_name,
             filter=lambda x: self._app_root_name.lower()
             in [app.lower() for app in x["app_list"]],
+            app_name=self._app_root_name,
         )
 
         if experience_docs:
@@ -272,9 +279,13 @@ class AppAgent(BasicAgent):
         :return: The retrieved examples and tips string.
         """
 
-        # Retrieve demonstration examples.
-        demonstration_docs = self.human_demonstration_retriever.retrieve(
-            request, demonstration_top_k
+        # Retrieve demonstration examples, from the partition of the current application if it has one.
+        demonstration_docs = self.retrieval_cache.retrieve(
+            self.human_demonstration_retriever,
+            request,
+            demonstration_top_k,
+            filter_key=self._app_root_name,
+            app_name=self._app_root_name,
         )
 
         if demonstration_docs:
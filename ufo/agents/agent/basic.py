@@ -14,6 +14,7 @@ from ufo.agents.states.basic import AgentState, AgentStatus
 from ufo.automator import puppeteer
 from ufo.config.config import Config
 from ufo.llm import llm_call
+from ufo.llm.streaming import JSONFieldStream
 from ufo.module.context import Context
 from ufo.module.interactor import question_asker
 
@@ -138,17 +139,25 @@ class BasicAgent(ABC):
 
     @classmethod
     def get_response(
-        cls, message: List[dict], namescope: str, use_backup_engine: bool
+        cls,
+        message: List[dict],
+        namescope: str,
+        use_backup_engine: bool,
+        field_stream: Optional[JSONFieldStream] = None,
     ) -> str:
         """
         Get the response for the prompt.
         :param message: The message for LLMs.
         :param namescope: The namescope for the LLMs.
         :param use_backup_engine: Whether to use the backup engine.
+        :param field_stream: The consumer of the streamed response, to get the fields of the response as soon as they are closed.
         :return: The response.
         """
         response_string, cost = llm_call.get_completion(
-            message, namescope, use_backup_engine=use_backup_engine
+            message,
+            namescope,
+            use_backup_engine=use_backup_engine,
+            field_stream=field_stream,
         )
         return response_string, cost
 
@@ -4,14 +4,21 @@
 import json
 import os
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from ufo.agents.memory.memory import Memory, MemoryItem
-from ufo.automator.ui_control.screenshot import PhotographerFacade
+from ufo.automator.ui_control.screenshot import (
+    SCREENSHOT_SAVING_MODE,
+    PhotographerFacade,
+)
 from ufo.config.config import Config
 
 configs = Config.get_instance().config_data
 
+BLACKBOARD_TOKEN_BUDGET = int(configs.get("BLACKBOARD_TOKEN_BUDGET", 0))
+BLACKBOARD_EVICTION = configs.get("BLACKBOARD_EVICTION", "oldest_first")
+BLACKBOARD_IMAGE_CACHE_SIZE = int(configs.get("BLACKBOARD_IMAGE_CACHE_SIZE", 10))
+
 
 @dataclass
 class ImageMemoryItemNames:
@@ -33,19 +40,131 @@ class ImageMemoryItem(MemoryItem):
     _memory_attributes = list(ImageMemoryItemNames.__annotations__.keys())
 
 
+@dataclass
+class BlackboardSection(Memory):
+    """
+    A section of the blackboard, holding at most max_items items. The version is increased on every change, so that the
+    serialized prompt of the section is only rebuilt when the section changes.
+    """
+
+    max_items: int = 0
+    eviction: str = "oldest_first"
+    version: int = 0
+
+    def __post_init__(self) -> None:
+        """
+        Check the eviction policy.
+        """
+        if self.eviction not in ["oldest_first", "keep_first_and_last"]:
+            raise ValueError(f"Invalid blackboard eviction policy: {self.eviction}")
+
+    def load(self, content: List[MemoryItem]) -> None:
+        """
+        Load the data from the memory.
+        :param content: The content to load.
+        """
+        super().load(content)
+        self.version += 1
+        while self.max_items > 0 and self.length > self.max_items:
+            self.evict()
+
+    def add_memory_item(self, memory_item: MemoryItem) -> None:
+        """
+        Add a memory item to the section, evicting an item if the section is full.
+        :param memory_item: The memory item to add.
+        """
+        super().add_memory_item(memory_item)
+        self.version += 1
+        while self.max_items > 0 and self.length > self.max_items:
+            self.evict()
+
+    def delete_memory_item(self, step: int) -> None:
+        """
+        Delete a memory item from the section.
+        :param step: The step of the memory item to delete.
+        """
+        super().delete_memory_item(step)
+        self.version += 1
+
+    def clear(self) -> None:
+        """
+        Clear the section.
+        """
+        super().clear()
+        self.version += 1
+
+    def evict(self) -> Optional[MemoryItem]:
+        """
+        Evict an item according to the eviction policy: "oldest_first" evicts the oldest item, and "keep_first_and_last"
+        evicts the oldest item but the first one, keeping the first and the latest items as long as possible.
+        :return: The evicted item, or None if the section is empty.
+        """
+        if self.is_empty():
+            return None
+
+        index = 1 if self.eviction == "keep_first_and_last" and self.length > 2 else 0
+        item = self._content.pop(index)
+        self.version += 1
+        return item
+
+
 class Blackboard:
     """
     Class for the blackboard, which stores the data and images which are visible to all the agents.
+    Each section holds a bounded number of items, and the whole blackboard is kept within a token budget by evicting
+    items from the largest section. The screenshots are stored as paths and encoded only when they are emitted, and the
+    encodings of the latest screenshots are kept for the next prompts. The prompt of each text section is cached until
+    the section changes.
     """
 
-    def __init__(self) -> None:
+    # The sections of the blackboard in the prompt order, with their prompt prefixes.
+    SECTION_PREFIXES = {
+        "questions": "[Questions & Answers:]",
+        "requests": "[Request History:]",
+        "trajectories": "[Step Trajectories:]",
+        "screenshots": "",
+    }
+
+    # A rough estimate of the tokens of an image in the prompt.
+    IMAGE_TOKENS = 765
+
+    # The number of characters per token in the estimate of the text tokens.
+    CHARS_PER_TOKEN = 4
+
+    def __init__(
+        self,
+        token_budget: int = BLACKBOARD_TOKEN_BUDGET,
+        eviction: str = BLACKBOARD_EVICTION,
+        image_cache_size: int = BLACKBOARD_IMAGE_CACHE_SIZE,
+    ) -> None:
         """
         Initialize the blackboard.
+        :param token_budget: The max number of estimated tokens of the blackboard prompt. 0 means no limit.
+        :param eviction: The eviction policy of the sections, "oldest_first" or "keep_first_and_last".
+        :param image_cache_size: The number of the latest screenshots whose encodings are kept. 0 means all the
+        screenshots on the blackboard.
         """
-        self._questions: Memory = Memory()
-        self._requests: Memory = Memory()
-        self._trajectories: Memory = Memory()
-        self._screenshots: Memory = Memory()
+        self.token_budget = token_budget
+        self.image_cache_size = image_cache_size
+
+        self._questions = BlackboardSection(
+            max_items=configs.get("BLACKBOARD_MAX_QUESTIONS", 0), eviction=eviction
+        )
+        self._requests = BlackboardSection(
+            max_items=configs.get("BLACKBOARD_MAX_REQUESTS", 0), eviction=eviction
+        )
+        self._trajectories = BlackboardSection(
+            max_items=configs.get("BLACKBOARD_MAX_TRAJECTORIES", 0), eviction=eviction
+        )
+        self._screenshots = BlackboardSection(
+            max_items=configs.get("BLACKBOARD_MAX_SCREENSHOTS", 0), eviction=eviction
+        )
+
+        # The cached prompts of the text sections, in a format of {section name: (section version, prompt, tokens)}.
+        self._prompt_cache: Dict[str, Tuple[int, List[Dict], int]] = {}
+
+        # The encodings of the latest screenshots, in a format of {image path: image url}.
+        self._encoded_images: Dict[str, str] = {}
 
         if configs.get("USE_CUSTOMIZATION", False):
             self.load_questions(
@@ -53,7 +172,7 @@ class Blackboard:
             )
 
     @property
-    def questions(self) -> Memory:
+    def questions(self) -> BlackboardSection:
         """
         Get the data from the blackboard.
         :return: The questions from the blackboard.
@@ -61,7 +180,7 @@ class Blackboard:
         return self._questions
 
     @property
-    def requests(self) -> Memory:
+    def requests(self) -> BlackboardSection:
         """
         Get the data from the blackboard.
         :return: The requests from the blackboard.
@@ -69,7 +188,7 @@ class Blackboard:
         return self._requests
 
     @property
-    def trajectories(self) -> Memory:
+    def trajectories(self) -> BlackboardSection:
         """
         Get the data from the blackboard.
         :return: The trajectories from the blackboard.
@@ -77,7 +196,7 @@ class Blackboard:
         return self._trajectories
 
     @property
-    def screenshots(self) -> Memory:
+    def screenshots(self) -> BlackboardSection:
         """
         Get the images from the blackboard.
         :return: The images from the blackboard.
@@ -104,6 +223,8 @@ class Blackboard:
             data_memory.set_values_from_dict({"text": data})
             memory.add_memory_item(data_memory)
 
+        self.enforce_token_budget()
+
     def add_questions(self, questions: Union[MemoryItem, Dict[str, str]]) -> None:
         """
         Add the data to the blackboard.
@@ -139,20 +260,24 @@ class Blackboard:
         :param metadata: The metadata of the image.
         """
 
-        if os.path.exists(screenshot_path):
+        # The screenshot is encoded when it is emitted in a prompt, unless it is never written to disk.
+        screenshot_str = None
 
+        if not PhotographerFacade.image_exists(screenshot_path):
+            print(f"Screenshot path {screenshot_path} does not exist.")
+            screenshot_str = ""
+        elif SCREENSHOT_SAVING_MODE == "none":
             screenshot_str = PhotographerFacade().encode_image_from_path(
                 screenshot_path
             )
-        else:
-            print(f"Screenshot path {screenshot_path} does not exist.")
-            screenshot_str = ""
+
+        metadata = metadata or {}
 
         image_memory_item = ImageMemoryItem()
         image_memory_item.set_values_from_dict(
             {
                 ImageMemoryItemNames.METADATA: metadata.get(
-                    ImageMemoryItemNames.METADATA
+                    ImageMemoryItemNames.METADATA, metadata
                 ),
                 ImageMemoryItemNames.IMAGE_PATH: screenshot_path,
                 ImageMemoryItemNames.IMAGE_STR: screenshot_str,
@@ -160,6 +285,7 @@ class Blackboard:
         )
 
         self.screenshots.add_memory_item(image_memory_item)
+        self.enforce_token_budget()
 
     def questions_to_json(self) -> str:
         """
@@ -213,12 +339,30 @@ class Blackboard:
 
     def screenshots_to_prompt(self) -> List[str]:
         """
-        Convert the images to a prompt.
+        Convert the images to a prompt. The images are encoded here, when they are emitted, and the encodings of the
+        latest screenshots are kept so that they are not encoded again for the next prompt.
         :return: The prompt.
         """
 
+        screenshots = self.screenshots.list_content
+        retained = screenshots
+        if self.image_cache_size > 0:
+            retained = screenshots[-self.image_cache_size :]
+        retained_paths = {
+            screenshot_dict.get(ImageMemoryItemNames.IMAGE_PATH, "")
+            for screenshot_dict in retained
+        }
+
+        encoded_images = {}
         user_content = []
-        for screenshot_dict in self.screenshots.list_content:
+        for screenshot_dict in screenshots:
+            screenshot_path = screenshot_dict.get(ImageMemoryItemNames.IMAGE_PATH, "")
+            image_url = self._encoded_images.get(screenshot_path)
+            if image_url is None:
+                image_url = self._encode_screenshot(screenshot_dict)
+            if screenshot_path in retained_paths:
+                encoded_images[screenshot_path] = image_url
+
             user_content.append(
                 {
                     "type": "text",
@@ -230,17 +374,101 @@ class Blackboard:
             user_content.append(
                 {
                     "type": "image_url",
-                    "image_url": {
-                        "url": screenshot_dict.get(ImageMemoryItemNames.IMAGE_STR, "")
-                    },
+                    "image_url": {"url": image_url},
                 }
             )
 
+        # The encodings of the screenshots evicted from the blackboard or older than the cache size are dropped.
+        self._encoded_images = encoded_images
+
         return user_content
 
+    @staticmethod
+    def _encode_screenshot(screenshot_dict: Dict[str, str]) -> str:
+        """
+        Encode a screenshot of the blackboard.
+        :param screenshot_dict: The screenshot item.
+        :return: The encoded image url.
+        """
+        screenshot_str = screenshot_dict.get(ImageMemoryItemNames.IMAGE_STR)
+        if screenshot_str is not None:
+            return screenshot_str
+
+        screenshot_path = screenshot_dict.get(ImageMemoryItemNames.IMAGE_PATH, "")
+        if not PhotographerFacade.image_exists(screenshot_path):
+            return ""
+        return PhotographerFacade().encode_image_from_path(screenshot_path)
+
+    def _section_prompt(self, name: str) -> Tuple[List[Dict], int]:
+        """
+        Get the prompt of a section and its estimated tokens. The prompt of a text section is taken from the cache if
+        the section has not changed. The prompt of the screenshots is not cached, as it holds the encoded images.
+        :param name: The name of the section.
+        :return: The prompt and the estimated tokens of the section.
+        """
+        section: BlackboardSection = getattr(self, name)
+
+        if name == "screenshots":
+            prompt = self.screenshots_to_prompt()
+            return prompt, self._section_text_tokens(name)
+
+        cached = self._prompt_cache.get(name)
+        if cached is not None and cached[0] == section.version:
+            return cached[1], cached[2]
+
+        prompt = self.texts_to_prompt(section, self.SECTION_PREFIXES[name])
+
+        tokens = sum(
+            (
+                self.IMAGE_TOKENS
+                if content["type"] == "image_url"
+                else len(content["text"]) // self.CHARS_PER_TOKEN
+            )
+            for content in prompt
+        )
+
+        self._prompt_cache[name] = (section.version, prompt, tokens)
+        return prompt, tokens
+
+    def _section_text_tokens(self, name: str) -> int:
+        """
+        Estimate the tokens of a section without encoding its images.
+        :param name: The name of the section.
+        :return: The estimated tokens.
+        """
+        if name != "screenshots":
+            return self._section_prompt(name)[1]
+
+        # The images count with a fixed estimate, so the screenshots are not encoded to be counted.
+        return sum(
+            self.IMAGE_TOKENS
+            + len(json.dumps(screenshot_dict.get(ImageMemoryItemNames.METADATA, "")))
+            // self.CHARS_PER_TOKEN
+            for screenshot_dict in self.screenshots.list_content
+        )
+
+    def enforce_token_budget(self) -> None:
+        """
+        Evict items from the largest section until the blackboard prompt fits in the token budget.
+        """
+        if self.token_budget <= 0:
+            return
+
+        while True:
+            tokens = {
+                name: self._section_text_tokens(name) for name in self.SECTION_PREFIXES
+            }
+            if sum(tokens.values()) <= self.token_budget:
+                return
+
+            name = max(tokens, key=tokens.get)
+            if getattr(self, name).evict() is None:
+                return
+
     def blackboard_to_prompt(self) -> List[str]:
         """
-        Convert the blackboard to a prompt.
+        Convert the blackboard to a prompt. Only the text sections that changed are serialized again, and only the
+        screenshots whose encodings are not kept are encoded again.
         :return: The prompt.
         """
         prefix = [
@@ -250,13 +478,9 @@ class Blackboard:
             }
         ]
 
-        blackboard_prompt = (
-            prefix
-            + self.texts_to_prompt(self.questions, "[Questions & Answers:]")
-            + self.texts_to_prompt(self.requests, "[Request History:]")
-            + self.texts_to_prompt(self.trajectories, "[Step Trajectories:]")
-            + self.screenshots_to_prompt()
-        )
+        blackboard_prompt = prefix
+        for name in self.SECTION_PREFIXES:
+            blackboard_prompt = blackboard_prompt + self._section_prompt(name)[0]
 
         return blackboard_prompt
 
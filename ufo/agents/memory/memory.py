@@ -62,6 +62,13 @@ class MemoryItem:
         for key, value in values.items():
             self.set_value(key, value)
 
+    def remove_value(self, key: str) -> None:
+        """
+        Remove a field from the memory item.
+        :param key: The key of the field.
+        """
+        self.__dict__.pop(key, None)
+
     def get_value(self, key: str) -> Optional[str]:
         """
         Get the value of the field.
@@ -2,19 +2,21 @@
 # Licensed under the MIT License.
 
 
-import json
 import os
 import time
-from typing import TYPE_CHECKING, Dict, List, Tuple
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 from pywinauto.controls.uiawrapper import UIAWrapper
 
 from ufo import utils
 from ufo.agents.processors.basic import BaseProcessor
-from ufo.automator.ui_control.screenshot import PhotographerDecorator
+from ufo.automator.ui_control.screenshot import ImageEncoder, PhotographerDecorator
 from ufo.automator.ui_control.control_filter import ControlFilterFactory
 from ufo.config.config import Config
+from ufo.module.concurrency import DesktopLock
 from ufo.module.context import Context, ContextNames
+from ufo.utils.embedding_cache import EmbeddingCache
 
 
 if TYPE_CHECKING:
@@ -48,6 +50,11 @@ class AppAgentProcessor(BaseProcessor):
         self._image_url = []
         self.control_filter_factory = ControlFilterFactory()
         self.filtered_annotation_dict = None
+        self._examples = []
+        self._tips = []
+        self._external_knowledge_prompt = ""
+        self._frame = None
+        self._control_prefetch: Optional[Tuple[str, Future]] = None
 
     @property
     def action(self) -> str:
@@ -112,6 +119,11 @@ class AppAgentProcessor(BaseProcessor):
                 class_name_list=configs["CONTROL_LIST"],
             )
 
+        ImageEncoder.reset_statistics()
+
+        # The application window is grabbed once, and the frame is shared by all the screenshots of the step.
+        self._frame = self.photographer.create_frame(self.application_window)
+
         # Get the annotation dictionary for the control items, in a format of {control_label: control_element}.
         self._annotation_dict = self.photographer.get_annotation_dict(
             self.application_window, control_list, annotation_type="number"
@@ -121,16 +133,21 @@ class AppAgentProcessor(BaseProcessor):
         self.filtered_annotation_dict = self.get_filtered_annotation_dict(
             self._annotation_dict
         )
-        self.photographer.capture_app_window_screenshot(
-            self.application_window, save_path=screenshot_save_path
+
+        # The screenshots are kept in memory for the prompt, and written to disk according to the screenshot saving mode.
+        screenshot = self.photographer.capture_app_window_screenshot(
+            self.application_window, save_path=screenshot_save_path, frame=self._frame
         )
 
         # Capture the screenshot of the selected control items with annotation and save it.
-        self.photographer.capture_app_window_screenshot_with_annotation_dict(
-            self.application_window,
-            self.filtered_annotation_dict,
-            annotation_type="number",
-            save_path=annotated_screenshot_save_path,
+        screenshot_annotated = (
+            self.photographer.capture_app_window_screenshot_with_annotation_dict(
+                self.application_window,
+                self.filtered_annotation_dict,
+                annotation_type="number",
+                save_path=annotated_screenshot_save_path,
+                frame=self._frame,
+            )
         )
 
         # If the configuration is set to include the last screenshot with selected controls tagged, save the last screenshot.
@@ -145,27 +162,25 @@ class AppAgentProcessor(BaseProcessor):
             self._image_url += [
                 self.photographer.encode_image_from_path(
                     last_control_screenshot_save_path
-                    if os.path.exists(last_control_screenshot_save_path)
+                    if self.photographer.image_exists(
+                        last_control_screenshot_save_path
+                    )
                     else last_screenshot_save_path
                 )
             ]
 
         # Whether to concatenate the screenshots of clean screenshot and annotated screenshot into one image.
         if configs["CONCAT_SCREENSHOT"]:
-            self.photographer.concat_screenshots(
+            screenshot_concat = self.photographer.concat_screenshots(
                 screenshot_save_path,
                 annotated_screenshot_save_path,
                 concat_screenshot_save_path,
             )
-            self._image_url += [
-                self.photographer.encode_image_from_path(concat_screenshot_save_path)
-            ]
+            self._image_url += [self.photographer.encode_image(screenshot_concat)]
         else:
-            screenshot_url = self.photographer.encode_image_from_path(
-                screenshot_save_path
-            )
-            screenshot_annotated_url = self.photographer.encode_image_from_path(
-                annotated_screenshot_save_path
+            screenshot_url = self.photographer.encode_image(screenshot)
+            screenshot_annotated_url = self.photographer.encode_image(
+                screenshot_annotated
             )
             self._image_url += [screenshot_url, screenshot_annotated_url]
 
@@ -196,25 +211,38 @@ class AppAgentProcessor(BaseProcessor):
         )
 
     @BaseProcessor.method_timer
-    def get_prompt_message(self) -> None:
+    def retrieve_knowledge(self) -> None:
         """
-        Get the prompt message for the AppAgent.
+        Retrieve the examples, tips and external knowledge for the AppAgent. It runs in parallel with the screenshot capture.
+        The results are memoized by the retrieval cache of the AppAgent for all the steps of the subtask.
         """
 
-        examples, tips = self.demonstration_prompt_helper()
+        retrieval_cache = self.app_agent.retrieval_cache
+        retrieval_cache.set_scope((self.round_num, self.subtask))
+        retrieval_cache.reset_statistics()
+
+        self._examples, self._tips = self.demonstration_prompt_helper()
 
         # Get the external knowledge prompt for the AppAgent using the offline and online retrievers.
-        external_knowledge_prompt = self.app_agent.external_knowledge_prompt_helper(
-            self.request,
-            configs["RAG_OFFLINE_DOCS_RETRIEVED_TOPK"],
-            configs["RAG_ONLINE_RETRIEVED_TOPK"],
+        self._external_knowledge_prompt = (
+            self.app_agent.external_knowledge_prompt_helper(
+                self.request,
+                configs["RAG_OFFLINE_DOCS_RETRIEVED_TOPK"],
+                configs["RAG_ONLINE_RETRIEVED_TOPK"],
+            )
         )
 
+    @BaseProcessor.method_timer
+    def get_prompt_message(self) -> None:
+        """
+        Get the prompt message for the AppAgent.
+        """
+
         # Construct the prompt message for the AppAgent.
         self._prompt_message = self.app_agent.message_constructor(
-            dynamic_examples=examples,
-            dynamic_tips=tips,
-            dynamic_knowledge=external_knowledge_prompt,
+            dynamic_examples=self._examples,
+            dynamic_tips=self._tips,
+            dynamic_knowledge=self._external_knowledge_prompt,
             image_list=self._image_url,
             control_info=self.filtered_control_info,
             prev_subtask=self.previous_subtasks,
@@ -226,15 +254,13 @@ class AppAgentProcessor(BaseProcessor):
         )
 
         # Log the prompt message. Only save them in debug mode.
-        log = json.dumps(
-            {
-                "step": self.session_step,
-                "prompt": self._prompt_message,
-                "control_items": self._control_info,
-                "filted_control_items": self.filtered_control_info,
-                "status": "",
-            }
-        )
+        log = {
+            "step": self.session_step,
+            "prompt": self._prompt_message,
+            "control_items": self._control_info,
+            "filted_control_items": self.filtered_control_info,
+            "status": "",
+        }
         self.request_logger.debug(log)
 
     @BaseProcessor.method_timer
@@ -243,16 +269,119 @@ class AppAgentProcessor(BaseProcessor):
         Get the response from the LLM.
         """
 
+        field_stream = self.create_field_stream()
+        if field_stream is not None:
+            # Locate the selected control while the model is still writing the plan and the comment.
+            field_stream.on("ControlLabel", self.prefetch_control)
+            field_stream.on_reset(self.discard_prefetch)
+
         # Try to get the response from the LLM. If an error occurs, catch the exception and log the error.
         try:
             self._response, self.cost = self.app_agent.get_response(
-                self._prompt_message, "APPAGENT", use_backup_engine=True
+                self._prompt_message,
+                "APPAGENT",
+                use_backup_engine=True,
+                field_stream=field_stream,
             )
 
         except Exception:
             self.llm_error_handler()
             return
 
+        finally:
+            self.record_llm_call()
+
+            # The prefetch holds the desktop lock, so it must finish before the action takes the lock.
+            if self._control_prefetch is not None:
+                self._control_prefetch[1].exception()
+
+    def prefetch_control(self, control_label: str) -> None:
+        """
+        Locate the selected control in the background as soon as its label is streamed. Only the first streamed
+        label is prefetched. The control is located again in execute_action if the final label is different.
+        :param control_label: The streamed label of the selected control.
+        """
+        if self._control_prefetch is not None or not self._annotation_dict:
+            return
+
+        control_selected = self._annotation_dict.get(control_label, "")
+        if not control_selected:
+            return
+
+        self._control_prefetch = (
+            control_label,
+            self.submit_background(self._locate_control_in_background, control_selected),
+        )
+
+    def discard_prefetch(self) -> None:
+        """
+        Discard the control prefetched from a failed request, e.g. when the request is retried with the backup
+        engine, so that the label streamed by the retry is prefetched again.
+        """
+        if self._control_prefetch is None:
+            return
+
+        # Wait for the prefetch, so that it does not log the control after it is cleared.
+        self._control_prefetch[1].exception()
+        self._control_prefetch = None
+        self.clear_located_control()
+
+    def clear_located_control(self) -> None:
+        """
+        Clear the information and the screenshot of a prefetched control from the step log.
+        """
+        self._control_log = {
+            "control_class": None,
+            "control_type": None,
+            "control_automation_id": None,
+        }
+        self._memory_data.remove_value("SelectedControlScreenshot")
+
+    def _locate_control_in_background(self, control_selected: UIAWrapper) -> None:
+        """
+        Locate the selected control in the phase thread pool, under the desktop lock.
+        :param control_selected: The selected control item.
+        """
+        with DesktopLock.hold():
+            self.locate_control(control_selected)
+
+    @BaseProcessor.method_timer
+    def locate_control(self, control_selected: UIAWrapper) -> None:
+        """
+        Get the information of the selected control for the log, and capture its screenshot.
+        :param control_selected: The selected control item.
+        """
+        control_coordinates = PhotographerDecorator.coordinate_adjusted(
+            self.application_window.rectangle(), control_selected.rectangle()
+        )
+
+        self._control_log = {
+            "control_class": control_selected.element_info.class_name,
+            "control_type": control_selected.element_info.control_type,
+            "control_automation_id": control_selected.element_info.automation_id,
+            "control_friendly_class_name": control_selected.friendly_class_name(),
+            "control_coordinates": {
+                "left": control_coordinates[0],
+                "top": control_coordinates[1],
+                "right": control_coordinates[2],
+                "bottom": control_coordinates[3],
+            },
+        }
+
+        # Save the screenshot of the tagged selected control.
+        self.capture_control_screenshot(control_selected)
+
+    def is_control_located(self) -> bool:
+        """
+        Check whether the selected control of the response was located while the response was streamed.
+        :return: True if the prefetched control is the selected control and was located successfully.
+        """
+        return (
+            self._control_prefetch is not None
+            and self._control_prefetch[0] == self._control_label
+            and self._control_prefetch[1].exception() is None
+        )
+
     @BaseProcessor.method_timer
     def parse_response(self) -> None:
         """
@@ -292,6 +421,10 @@ class AppAgentProcessor(BaseProcessor):
 
         control_selected = self._annotation_dict.get(self._control_label, "")
 
+        if not control_selected and self._control_prefetch is not None:
+            # The prefetched control was not selected by the final response, so it is not logged.
+            self.clear_located_control()
+
         try:
             # Get the selected control item from the annotation dictionary and LLM response.
             # The LLM response is a number index corresponding to the key in the annotation dictionary.
@@ -302,30 +435,13 @@ class AppAgentProcessor(BaseProcessor):
                     control_selected.draw_outline(colour="red", thickness=3)
                     time.sleep(configs.get("RECTANGLE_TIME", 0))
 
-                control_coordinates = PhotographerDecorator.coordinate_adjusted(
-                    self.application_window.rectangle(), control_selected.rectangle()
-                )
-
-                self._control_log = {
-                    "control_class": control_selected.element_info.class_name,
-                    "control_type": control_selected.element_info.control_type,
-                    "control_automation_id": control_selected.element_info.automation_id,
-                    "control_friendly_class_name": control_selected.friendly_class_name(),
-                    "control_coordinates": {
-                        "left": control_coordinates[0],
-                        "top": control_coordinates[1],
-                        "right": control_coordinates[2],
-                        "bottom": control_coordinates[3],
-                    },
-                }
+                if not self.is_control_located():
+                    self.locate_control(control_selected)
 
                 self.app_agent.Puppeteer.receiver_manager.create_ui_control_receiver(
                     control_selected, self.application_window
                 )
 
-                # Save the screenshot of the tagged selected control.
-                self.capture_control_screenshot(control_selected)
-
                 if self.status.upper() == self._agent_status_manager.SCREENSHOT.value:
                     self.handle_screenshot_status()
                 else:
@@ -358,6 +474,7 @@ class AppAgentProcessor(BaseProcessor):
             self.application_window,
             sub_control_list=[control_selected],
             save_path=control_screenshot_save_path,
+            frame=self._frame,
         )
 
     def handle_screenshot_status(self) -> None:
@@ -373,6 +490,7 @@ class AppAgentProcessor(BaseProcessor):
             "annotation", self._args, self._annotation_dict
         )
 
+    @BaseProcessor.method_timer
     def update_memory(self) -> None:
         """
         Update the memory of the Agent.
@@ -403,6 +521,25 @@ class AppAgentProcessor(BaseProcessor):
         self._memory_data.set_values_from_dict(additional_memory)
         self._memory_data.set_values_from_dict(self._control_log)
         self._memory_data.set_values_from_dict({"time_cost": self._time_cost})
+        self._memory_data.set_values_from_dict(self.stream_statistics())
+        self._memory_data.set_values_from_dict(self.llm_call_statistics())
+
+        # Record the size and the encoding time of the images of the step, including the images encoded in the phase
+        # thread pool.
+        self._memory_data.set_values_from_dict(
+            {"ImageEncoding": ImageEncoder.get_statistics()}
+        )
+
+        # Log the hits and misses of the retrieval cache in the step.
+        self._memory_data.set_values_from_dict(
+            {"RetrievalCache": self.app_agent.retrieval_cache.get_statistics()}
+        )
+
+        # Log the cumulative hit rate of the embedding caches of the control filters and the retrievers.
+        if EmbeddingCache.is_enabled():
+            self._memory_data.set_values_from_dict(
+                {"EmbeddingCache": EmbeddingCache.get_statistics()}
+            )
 
         if self.status.upper() == self._agent_status_manager.CONFIRM.value:
             self._memory_data.set_values_from_dict({"UserConfirm": "Yes"})
@@ -490,6 +627,7 @@ class AppAgentProcessor(BaseProcessor):
 
         return examples, tips
 
+    @BaseProcessor.method_timer
     def get_filtered_annotation_dict(
         self, annotation_dict: Dict[str, UIAWrapper]
     ) -> Dict[str, UIAWrapper]:
@@ -547,7 +685,7 @@ class AppAgentProcessor(BaseProcessor):
             )
 
             cropped_icons_dict = self.photographer.get_cropped_icons_dict(
-                self.application_window, annotation_dict
+                self.application_window, annotation_dict, frame=self._frame
             )
             filtered_icon_dict = model_icon.control_filter(
                 annotation_dict,
@@ -4,10 +4,13 @@
 
 from functools import wraps
 import json
+import threading
 import time
 import traceback
 from abc import ABC, abstractmethod
-from typing import Any, List
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 from pywinauto.controls.uiawrapper import UIAWrapper
 
@@ -15,12 +18,16 @@ from ufo import utils
 from ufo.agents.agent.basic import BasicAgent
 from ufo.agents.memory.memory import MemoryItem
 from ufo.automator.ui_control.inspector import ControlInspectorFacade
-from ufo.automator.ui_control.screenshot import PhotographerFacade
+from ufo.automator.ui_control.screenshot import ImageEncoder, PhotographerFacade
 from ufo.config.config import Config
+from ufo.llm import llm_call
+from ufo.llm.streaming import JSONFieldStream
+from ufo.module.concurrency import DesktopLock, SessionTimer, initialize_com
 from ufo.module.context import Context, ContextNames
 
 configs = Config.get_instance().config_data
 BACKEND = configs["CONTROL_BACKEND"]
+PARALLEL_STEP_PHASES = configs.get("PARALLEL_STEP_PHASES", True)
 
 
 class BaseProcessor(ABC):
@@ -30,6 +37,18 @@ class BaseProcessor(ABC):
     Each processor is responsible for processing the user request and updating the HostAgent and AppAgent at a single step in a round.
     """
 
+    # The phases to prepare the prompt of a step, in a format of {phase: [the phases it depends on]}, in the sequential order.
+    # The retrieval only depends on the request, so it overlaps with the screenshot capture and the control inspection.
+    _prompt_phases: Dict[str, List[str]] = {
+        "capture_screenshot": [],
+        "get_control_info": ["capture_screenshot"],
+        "retrieve_knowledge": [],
+        "get_prompt_message": ["get_control_info", "retrieve_knowledge"],
+    }
+
+    # The phases that access the desktop, which run under the desktop lock.
+    _desktop_phases = {"capture_screenshot", "get_control_info"}
+
     def __init__(self, agent: BasicAgent, context: Context) -> None:
         """
         Initialize the processor.
@@ -66,6 +85,29 @@ class BaseProcessor(ABC):
 
         self._total_time_cost = 0
         self._time_cost = {}
+        self._time_cost_lock = threading.Lock()
+        self._field_stream: Optional[JSONFieldStream] = None
+        self._llm_call_statistics: Dict[str, Any] = {}
+
+        self._profiler = context.get(ContextNames.PROFILER)
+        self._profile_step = self.session_step
+
+        # The thread pool of the session to run the independent phases of a step in parallel.
+        self._phase_executor: ThreadPoolExecutor = context.get(
+            ContextNames.PHASE_EXECUTOR
+        )
+
+    @staticmethod
+    def create_phase_executor() -> ThreadPoolExecutor:
+        """
+        Create the thread pool of a session to run the independent phases of its steps in parallel. Each session has
+        its own pool, so that the phases of a session do not wait for the phases of the other sessions, and the threads
+        of the pool initialize COM to use the UI Automation objects.
+        :return: The thread pool.
+        """
+        return ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="StepPhase", initializer=initialize_com
+        )
 
     def process(self) -> None:
         """
@@ -74,7 +116,7 @@ class BaseProcessor(ABC):
         1. Print the step information.
         2. Capture the screenshot.
         3. Get the control information.
-        4. Get the prompt message.
+        4. Get the prompt message, with the knowledge retrieved in parallel with steps 2 and 3.
         5. Get the response.
         6. Update the cost.
         7. Parse the response.
@@ -85,18 +127,13 @@ class BaseProcessor(ABC):
         """
 
         start_time = time.time()
+        self._profile_step = self.session_step
 
         # Step 1: Print the step information.
         self.print_step_info()
 
-        # Step 2: Capture the screenshot.
-        self.capture_screenshot()
-
-        # Step 3: Get the control information.
-        self.get_control_info()
-
-        # Step 4: Get the prompt message.
-        self.get_prompt_message()
+        # Step 2-4: Capture the screenshot, get the control information, retrieve the knowledge and get the prompt message.
+        self.run_phase_graph(self._prompt_phases)
 
         # Step 5: Get the response.
         self.get_response()
@@ -119,18 +156,24 @@ class BaseProcessor(ABC):
             return
 
         # Step 8: Execute the action.
-        self.execute_action()
+        with DesktopLock.hold():
+            self.execute_action()
 
         # Step 9: Update the memory.
         self.update_memory()
 
         # Step 10: Update the status.
-        self.update_status()
+        with self.phase_timer("update_status"):
+            self.update_status()
 
         self._total_time_cost = time.time() - start_time
 
         # Step 11: Save the log.
-        self.log_save()
+        with self.phase_timer("log_save"):
+            self.log_save()
+
+        if self._profiler is not None:
+            self._profiler.save()
 
     def resume(self) -> None:
         """
@@ -138,9 +181,11 @@ class BaseProcessor(ABC):
         """
 
         self._is_resumed = True
+        self._profile_step = self.session_step
 
         # Step 1: Execute the action.
-        self.execute_action()
+        with DesktopLock.hold():
+            self.execute_action()
 
         # Step 2: Update the memory.
         self.update_memory()
@@ -156,21 +201,175 @@ class BaseProcessor(ABC):
     @classmethod
     def method_timer(cls, func):
         """
-        Decorator to calculate the time cost of the method.
+        Decorator to calculate the time cost of the method. If the session has a step profiler,
+        the wall time, CPU time and allocated bytes of the method are also recorded as a phase of the step.
         :param func: The method to be decorated.
         :return: The decorated method.
         """
 
         @wraps(func)
         def wrapper(self, *args, **kwargs):
-            start_time = time.time()
-            result = func(self, *args, **kwargs)
-            end_time = time.time()
-            self._time_cost[func.__name__] = end_time - start_time
-            return result
+            with self.phase_timer(func.__name__):
+                return func(self, *args, **kwargs)
 
         return wrapper
 
+    @contextmanager
+    def phase_timer(self, phase: str) -> Iterator[None]:
+        """
+        Calculate the time cost of the phase in the block. If the session has a step profiler,
+        the wall time, CPU time and allocated bytes of the phase are also recorded.
+        :param phase: The name of the phase.
+        """
+        if self._profiler is None:
+            start_time = time.time()
+            yield
+            with self._time_cost_lock:
+                self._time_cost[phase] = time.time() - start_time
+            return
+
+        with self._profiler.measure(
+            self._profile_step, type(self.agent).__name__, phase
+        ) as metrics:
+            yield
+        # The phases running in the phase thread pool record their time cost concurrently.
+        with self._time_cost_lock:
+            self._time_cost[phase] = metrics.wall
+
+    def run_phase_graph(self, phases: Dict[str, List[str]]) -> None:
+        """
+        Run the phases of a step according to their dependencies. The phases that are ready at the same time run in parallel:
+        one in the calling thread, preferably a desktop phase, and the others in the phase thread pool. The consecutive desktop
+        phases of the calling thread are run under a single hold of the desktop lock, so that they see the same UI state.
+        If PARALLEL_STEP_PHASES is disabled, the phases run one by one in the calling thread in the declaration order.
+        :param phases: The phases to run, in a format of {phase: [the phases it depends on]}.
+        """
+
+        start_time = time.time()
+
+        pending = {phase: list(dependencies) for phase, dependencies in phases.items()}
+        finished = set()
+        running: Dict[str, Future] = {}
+
+        with ExitStack() as desktop_lock:
+            holding_desktop = False
+
+            while pending or running:
+                ready = [
+                    phase
+                    for phase, dependencies in pending.items()
+                    if all(dependency in finished for dependency in dependencies)
+                ]
+
+                # Wait for a background phase, without blocking the desktop for other sessions.
+                if not ready:
+                    if not running:
+                        raise ValueError(
+                            f"The dependencies of the phases {list(pending)} cannot be met."
+                        )
+
+                    if holding_desktop:
+                        desktop_lock.close()
+                        holding_desktop = False
+
+                    completed, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                    for phase, future in list(running.items()):
+                        if future in completed:
+                            future.result()
+                            finished.add(phase)
+                            del running[phase]
+                    continue
+
+                if not PARALLEL_STEP_PHASES:
+                    ready = ready[:1]
+
+                desktop_ready = [phase for phase in ready if phase in self._desktop_phases]
+                current = desktop_ready[0] if desktop_ready else ready[0]
+
+                for phase in ready:
+                    del pending[phase]
+                    if phase != current:
+                        running[phase] = self.submit_background(
+                            self._run_background_phase, phase
+                        )
+
+                if current in self._desktop_phases and not holding_desktop:
+                    desktop_lock.enter_context(DesktopLock.hold())
+                    holding_desktop = True
+                elif current not in self._desktop_phases and holding_desktop:
+                    desktop_lock.close()
+                    holding_desktop = False
+
+                getattr(self, current)()
+                finished.add(current)
+
+        with self._time_cost_lock:
+            self._time_cost["prompt_phases"] = time.time() - start_time
+
+    def _run_background_phase(self, phase: str) -> None:
+        """
+        Run a phase in the phase thread pool.
+        :param phase: The name of the phase.
+        """
+        if phase in self._desktop_phases:
+            with DesktopLock.hold():
+                getattr(self, phase)()
+        else:
+            getattr(self, phase)()
+
+    def submit_background(self, func: Callable, *args) -> Future:
+        """
+        Run a function in the phase thread pool of the session. The function is bound to the SessionTimer buckets and
+        the image encoding statistics of the calling thread, so that its time and its encoded images are reported with
+        the session and the step.
+        :param func: The function.
+        :param args: The arguments of the function.
+        :return: The future of the result.
+        """
+        buckets = SessionTimer.current()
+        statistics = ImageEncoder.current_statistics()
+
+        def run() -> Any:
+            with SessionTimer.bind(buckets), ImageEncoder.bind_statistics(statistics):
+                return func(*args)
+
+        return self._phase_executor.submit(run)
+
+    def create_field_stream(self) -> Optional[JSONFieldStream]:
+        """
+        Create the consumer of the streamed response of the step, if LLM_STREAMING is enabled.
+        :return: The JSONFieldStream, or None if the response is not streamed.
+        """
+        if not configs.get("LLM_STREAMING", False):
+            return None
+
+        self._field_stream = JSONFieldStream()
+        return self._field_stream
+
+    def stream_statistics(self) -> Dict[str, Any]:
+        """
+        Get the timings of the streamed response of the step for the log.
+        :return: The timings, or an empty dictionary if the response is not streamed.
+        """
+        if self._field_stream is None:
+            return {}
+        return {"StreamTiming": self._field_stream.statistics()}
+
+    def record_llm_call(self) -> None:
+        """
+        Record the statistics of the LLM call of the step. It must be called by the thread that made the call.
+        """
+        self._llm_call_statistics = llm_call.get_last_call_statistics()
+
+    def llm_call_statistics(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the LLM call of the step for the log.
+        :return: The statistics, or an empty dictionary if no call was recorded.
+        """
+        if not self._llm_call_statistics:
+            return {}
+        return {"LLMCall": self._llm_call_statistics}
+
     @abstractmethod
     def print_step_info(self) -> None:
         """
@@ -192,6 +391,13 @@ class BaseProcessor(ABC):
         """
         pass
 
+    def retrieve_knowledge(self) -> None:
+        """
+        Retrieve the knowledge for the prompt, e.g. the examples, tips and documents. It depends only on the request,
+        not on the screenshot, so it runs in parallel with the screenshot capture. Nothing is retrieved by default.
+        """
+        pass
+
     @abstractmethod
     def get_prompt_message(self) -> None:
         """
@@ -235,11 +441,26 @@ class BaseProcessor(ABC):
         self.agent.status = self.status
 
         if self.status != self._agent_status_manager.FINISH.value:
-            time.sleep(configs["SLEEP_TIME"])
+            settle_time = self.wait_for_settle()
+            self._memory_data.set_values_from_dict({"SettleTime": settle_time})
 
         self.round_step += 1
         self.session_step += 1
 
+    def wait_for_settle(self) -> float:
+        """
+        Wait for the UI to settle after the action. With the settle detection, it returns as soon as the application
+        window is visually stable, and waits SLEEP_TIME at most. Otherwise, it sleeps SLEEP_TIME.
+        :return: The time (s) waited.
+        """
+        if not configs.get("SETTLE_DETECTION", True):
+            time.sleep(configs["SLEEP_TIME"])
+            return configs["SLEEP_TIME"]
+
+        return self.photographer.wait_for_settle(
+            self.application_window, configs["SLEEP_TIME"], hold=DesktopLock.hold
+        )
+
     def log_save(self) -> None:
         """
         Save the log.
@@ -706,13 +927,11 @@ class BaseProcessor(ABC):
         Error handler for the LLM error.
         """
         error_trace = traceback.format_exc()
-        log = json.dumps(
-            {
-                "step": self.session_step,
-                "prompt": self._prompt_message,
-                "status": str(error_trace),
-            }
-        )
+        log = {
+            "step": self.session_step,
+            "prompt": self._prompt_message,
+            "status": str(error_trace),
+        }
         utils.print_with_color(
             "Error occurs when calling LLM: {e}".format(e=str(error_trace)), "red"
         )
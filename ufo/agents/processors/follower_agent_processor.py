@@ -2,9 +2,8 @@
 # Licensed under the MIT License.
 
 
-import json
-
 from ufo.agents.processors.app_agent_processor import AppAgentProcessor
+from ufo.agents.processors.basic import BaseProcessor
 from ufo.config.config import Config
 from typing import TYPE_CHECKING
 from ufo.module.context import Context, ContextNames
@@ -28,27 +27,20 @@ class FollowerAppAgentProcessor(AppAgentProcessor):
         super().__init__(agent, context)
         self.subtask = self.context.get(ContextNames.REQUEST)
 
+    @BaseProcessor.method_timer
     def get_prompt_message(self) -> None:
         """
         Get the prompt message for the AppAgent in the follower mode. It may accept additional prompts as input.
         """
 
-        examples, tips = self.demonstration_prompt_helper()
-
-        external_knowledge_prompt = self.app_agent.external_knowledge_prompt_helper(
-            self.request,
-            configs["RAG_OFFLINE_DOCS_RETRIEVED_TOPK"],
-            configs["RAG_ONLINE_RETRIEVED_TOPK"],
-        )
-
         # Get the current state of the application and the state difference between the current state and the previous state.
         current_state = {}
         state_diff = {}
 
         self._prompt_message = self.app_agent.message_constructor(
-            dynamic_examples=examples,
-            dynamic_tips=tips,
-            dynamic_knowledge=external_knowledge_prompt,
+            dynamic_examples=self._examples,
+            dynamic_tips=self._tips,
+            dynamic_knowledge=self._external_knowledge_prompt,
             image_list=self._image_url,
             control_info=self.filtered_control_info,
             prev_subtask=[],
@@ -61,13 +53,11 @@ class FollowerAppAgentProcessor(AppAgentProcessor):
             include_last_screenshot=configs["INCLUDE_LAST_SCREENSHOT"],
         )
 
-        log = json.dumps(
-            {
-                "step": self.session_step,
-                "prompt": self._prompt_message,
-                "control_items": self._control_info,
-                "filted_control_items": self.filtered_control_info,
-                "status": "",
-            }
-        )
+        log = {
+            "step": self.session_step,
+            "prompt": self._prompt_message,
+            "control_items": self._control_info,
+            "filted_control_items": self.filtered_control_info,
+            "status": "",
+        }
         self.request_logger.debug(log)
@@ -2,13 +2,13 @@
 # Licensed under the MIT License.
 
 
-import json
 from typing import TYPE_CHECKING
 
 from pywinauto.controls.uiawrapper import UIAWrapper
 
 from ufo import utils
 from ufo.agents.processors.basic import BaseProcessor
+from ufo.automator.ui_control.screenshot import ImageEncoder
 from ufo.config.config import Config
 from ufo.module.context import Context, ContextNames
 
@@ -57,19 +57,19 @@ class HostAgentProcessor(BaseProcessor):
         Capture the screenshot.
         """
 
+        ImageEncoder.reset_statistics()
+
         desktop_save_path = self.log_path + f"action_step{self.session_step}.png"
 
         self._memory_data.set_values_from_dict({"CleanScreenshot": desktop_save_path})
 
         # Capture the desktop screenshot for all screens.
-        self.photographer.capture_desktop_screen_screenshot(
+        desktop_screenshot = self.photographer.capture_desktop_screen_screenshot(
             all_screens=True, save_path=desktop_save_path
         )
 
-        # Encode the desktop screenshot into base64 format as required by the LLM.
-        self._desktop_screen_url = self.photographer.encode_image_from_path(
-            desktop_save_path
-        )
+        # Encode the in-memory desktop screenshot into base64 format as required by the LLM.
+        self._desktop_screen_url = self.photographer.encode_image(desktop_screenshot)
 
     @BaseProcessor.method_timer
     def get_control_info(self) -> None:
@@ -103,15 +103,13 @@ class HostAgentProcessor(BaseProcessor):
         )
 
         # Log the prompt message. Only save them in debug mode.
-        log = json.dumps(
-            {
-                "step": self.session_step,
-                "prompt": self._prompt_message,
-                "control_items": self._desktop_windows_info,
-                "filted_control_items": self._desktop_windows_info,
-                "status": "",
-            }
-        )
+        log = {
+            "step": self.session_step,
+            "prompt": self._prompt_message,
+            "control_items": self._desktop_windows_info,
+            "filted_control_items": self._desktop_windows_info,
+            "status": "",
+        }
         self.request_logger.debug(log)
 
     @BaseProcessor.method_timer
@@ -123,12 +121,18 @@ class HostAgentProcessor(BaseProcessor):
         # Try to get the response from the LLM. If an error occurs, catch the exception and log the error.
         try:
             self._response, self.cost = self.host_agent.get_response(
-                self._prompt_message, "HOSTAGENT", use_backup_engine=True
+                self._prompt_message,
+                "HOSTAGENT",
+                use_backup_engine=True,
+                field_stream=self.create_field_stream(),
             )
 
         except Exception:
             self.llm_error_handler()
 
+        finally:
+            self.record_llm_call()
+
     @BaseProcessor.method_timer
     def parse_response(self) -> None:
         """
@@ -237,6 +241,7 @@ class HostAgentProcessor(BaseProcessor):
         self.context.set(ContextNames.APPLICATION_ROOT_NAME, self.app_root)
         self.context.set(ContextNames.APPLICATION_PROCESS_NAME, self.control_text)
 
+    @BaseProcessor.method_timer
     def update_memory(self) -> None:
         """
         Update the memory of the Agent.
@@ -264,6 +269,14 @@ class HostAgentProcessor(BaseProcessor):
         self._memory_data.set_values_from_dict(additional_memory)
         self._memory_data.set_values_from_dict(self._control_log)
         self._memory_data.set_values_from_dict({"time_cost": self._time_cost})
+        self._memory_data.set_values_from_dict(self.stream_statistics())
+        self._memory_data.set_values_from_dict(self.llm_call_statistics())
+
+        # Record the size and the encoding time of the images of the step, including the images encoded in the phase
+        # thread pool.
+        self._memory_data.set_values_from_dict(
+            {"ImageEncoding": ImageEncoder.get_statistics()}
+        )
 
         self.host_agent.add_memory(self._memory_data)
 
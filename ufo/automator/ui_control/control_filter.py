@@ -1,11 +1,14 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
-import heapq
 import re
 import warnings
 from abc import abstractmethod
 from typing import Dict, List
 
+import numpy as np
+
+from ufo.utils.embedding_cache import EmbeddingCache
+
 warnings.filterwarnings("ignore")
 
 
@@ -68,6 +71,7 @@ class BasicControlFilter:
     """
 
     _instances = {}
+    cache = None
 
     def __new__(cls, model_path):
         """
@@ -78,6 +82,8 @@ class BasicControlFilter:
         if model_path not in cls._instances:
             instance = super(BasicControlFilter, cls).__new__(cls)
             instance.model = cls.load_model(model_path)
+            if EmbeddingCache.is_enabled():
+                instance.cache = EmbeddingCache(model_path)
             cls._instances[model_path] = instance
         return cls._instances[model_path]
 
@@ -94,12 +100,15 @@ class BasicControlFilter:
 
     def get_embedding(self, content):
         """
-        Encodes the given object into an embedding.
-        :param content: The content to encode.
+        Encodes the given object into an embedding. The embeddings of the texts and icons seen in the previous steps are read from the cache.
+        :param content: The content to encode, or a list of contents to encode in a batch.
         :return: The embedding of the object.
         """
 
-        return self.model.encode(content)
+        if self.cache is None:
+            return self.model.encode(content)
+
+        return self.cache.encode(content, self.model.encode)
 
     @abstractmethod
     def control_filter(self, control_dicts, plans, **kwargs):
@@ -162,6 +171,56 @@ class BasicControlFilter:
 
         return sentence_transformers.util.cos_sim(embedding1, embedding2)
 
+    @staticmethod
+    def cos_sim_matrix(embeddings1: np.ndarray, embeddings2: np.ndarray) -> np.ndarray:
+        """
+        Computes the cosine similarity between two sets of embeddings with a single matrix product.
+        :param embeddings1: The first set of embeddings, in a shape of (n, d).
+        :param embeddings2: The second set of embeddings, in a shape of (m, d).
+        :return: The cosine similarity matrix, in a shape of (n, m).
+        """
+        embeddings1 = np.atleast_2d(np.asarray(embeddings1, dtype=np.float32))
+        embeddings2 = np.atleast_2d(np.asarray(embeddings2, dtype=np.float32))
+
+        norm1 = np.linalg.norm(embeddings1, axis=1, keepdims=True)
+        norm2 = np.linalg.norm(embeddings2, axis=1, keepdims=True)
+        embeddings1 = embeddings1 / np.maximum(norm1, 1e-12)
+        embeddings2 = embeddings2 / np.maximum(norm2, 1e-12)
+
+        return embeddings1 @ embeddings2.T
+
+    def batch_scores(self, contents: List, plans: List[str]) -> np.ndarray:
+        """
+        Calculates the scores of all the contents at once. The plans and the contents are each embedded in a single batch,
+        and each content is scored by its maximum cosine similarity to the plans.
+        :param contents: The list of contents to score, e.g. control texts or icon images.
+        :param plans: The plans to be used for calculating the similarity.
+        :return: The scores of the contents, in a shape of (len(contents),).
+        """
+        if len(contents) == 0 or len(plans) == 0:
+            return np.zeros(len(contents), dtype=np.float32)
+
+        plans_embedding = self.get_embedding(list(plans))
+        contents_embedding = self.get_embedding(list(contents))
+
+        return self.cos_sim_matrix(contents_embedding, plans_embedding).max(axis=1)
+
+    @staticmethod
+    def topk_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """
+        Gets the indices of the top-k scores, sorted by descending score.
+        :param scores: The scores.
+        :param top_k: The number of top scores to select.
+        :return: The indices of the top-k scores.
+        """
+        if top_k <= 0 or len(scores) == 0:
+            return np.array([], dtype=int)
+        if top_k >= len(scores):
+            return np.argsort(-scores, kind="stable")
+
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
 
 class TextControlFilter:
     """
@@ -214,20 +273,19 @@ class SemanticControlFilter(BasicControlFilter):
         :param top_k: The number of top control items to return.
         :return: The filtered control items.
         """
-        scores_items = []
         filtered_control_dict = {}
 
-        for label, control_item in control_dicts.items():
-            control_text = control_item.element_info.name.lower()
-            score = self.control_filter_score(control_text, plans)
-            scores_items.append((label, score))
-        topk_scores_items = heapq.nlargest(top_k, (scores_items), key=lambda x: x[1])
-        topk_items = [
-            (score_item[0], score_item[1]) for score_item in topk_scores_items
+        labels = list(control_dicts.keys())
+        control_texts = [
+            control_dicts[label].element_info.name.lower() for label in labels
         ]
 
+        # Score all the control items with a single batched embedding and matrix product.
+        scores = self.batch_scores(control_texts, plans)
+        topk_labels = {labels[i] for i in self.topk_indices(scores, top_k)}
+
         for label, control_item in control_dicts.items():
-            if label in topk_items:
+            if label in topk_labels:
                 filtered_control_dict[label] = control_item
         return filtered_control_dict
 
@@ -259,14 +317,14 @@ class IconControlFilter(BasicControlFilter):
         :return: The list of top-k control items based on their scores.
         """
 
-        scores_items = []
         filtered_control_dict = {}
 
-        for label, cropped_icon in cropped_icons_dict.items():
-            score = self.control_filter_score(cropped_icon, plans)
-            scores_items.append((score, label))
-        topk_scores_items = heapq.nlargest(top_k, scores_items, key=lambda x: x[0])
-        topk_labels = [scores_items[1] for scores_items in topk_scores_items]
+        labels = list(cropped_icons_dict.keys())
+        cropped_icons = [cropped_icons_dict[label] for label in labels]
+
+        # Score all the cropped icons with a single batched embedding and matrix product.
+        scores = self.batch_scores(cropped_icons, plans)
+        topk_labels = {labels[i] for i in self.topk_indices(scores, top_k)}
 
         for label, control_item in control_dicts.items():
             if label in topk_labels:
@@ -1,23 +1,410 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import atexit
 import base64
-import functools
+import contextlib
 import mimetypes
 import os
+import queue
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from io import BytesIO
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
 
-from PIL import Image, ImageDraw, ImageFont, ImageGrab
+import numpy as np
+from PIL import Image, ImageDraw, ImageGrab
 from pywinauto.controls.uiawrapper import UIAWrapper
 from pywinauto.win32structures import RECT
 
 from ufo.config.config import Config
+from ufo.utils import annotation, print_with_color
+from ufo.utils.settle import SettleDetector
 
 configs = Config.get_instance().config_data
 
 DEFAULT_PNG_COMPRESS_LEVEL = int(configs["DEFAULT_PNG_COMPRESS_LEVEL"])
+SCREENSHOT_SAVING_MODE = configs.get("SCREENSHOT_SAVING_MODE", "sync").lower()
+
+
+class ImageEncoder:
+    """
+    The encoder of the images sent to the LLMs. The encoding profile (format, quality, max long edge and grayscale)
+    is applied once when a prompt image is built, while the screenshots saved to the log folder stay full-resolution PNG.
+    The number of images, the encoded bytes and the encoding time are accumulated per thread, so that each step can report them.
+    The tasks a step runs in a thread pool are bound to the statistics of the step, so that their images are counted too.
+    """
+
+    _instance = None
+    _local = threading.local()
+    _lock = threading.Lock()
+
+    # The supported formats, in a format of {format: (PIL format, mime type)}.
+    FORMATS = {
+        "png": ("PNG", "image/png"),
+        "jpeg": ("JPEG", "image/jpeg"),
+        "jpg": ("JPEG", "image/jpeg"),
+        "webp": ("WEBP", "image/webp"),
+    }
+
+    def __init__(
+        self,
+        format: str = "png",
+        quality: int = 85,
+        max_edge: int = 0,
+        grayscale: bool = False,
+    ) -> None:
+        """
+        Initialize the encoder.
+        :param format: The image format, "png", "jpeg" or "webp".
+        :param quality: The quality of the lossy formats, 1-100.
+        :param max_edge: The max length of the long edge of the images, larger images are downscaled. 0 keeps the original size.
+        :param grayscale: Whether to convert the images to grayscale.
+        """
+        format = format.lower()
+        if format not in self.FORMATS:
+            raise ValueError(f"Invalid image encoding format: {format}")
+
+        self.format = format
+        self.quality = int(quality)
+        self.max_edge = int(max_edge)
+        self.grayscale = grayscale
+
+    @classmethod
+    def get_instance(cls) -> "ImageEncoder":
+        """
+        Get the encoder of the configured encoding profile.
+        :return: The encoder.
+        """
+        if cls._instance is None:
+            cls._instance = cls(
+                format=configs.get("IMAGE_ENCODING_FORMAT", "png"),
+                quality=configs.get("IMAGE_ENCODING_QUALITY", 85),
+                max_edge=configs.get("IMAGE_ENCODING_MAX_EDGE", 0),
+                grayscale=configs.get("IMAGE_ENCODING_GRAYSCALE", False),
+            )
+        return cls._instance
+
+    @property
+    def mime_type(self) -> str:
+        """
+        Get the mime type of the encoded images.
+        :return: The mime type.
+        """
+        return self.FORMATS[self.format][1]
+
+    @property
+    def is_passthrough(self) -> bool:
+        """
+        Check if the profile keeps the images as they are, so that an image file can be sent without re-encoding.
+        :return: True if the images are kept as they are, False otherwise.
+        """
+        return self.format == "png" and self.max_edge <= 0 and not self.grayscale
+
+    def prepare(self, image: Image.Image) -> Image.Image:
+        """
+        Downscale and convert the image according to the profile. The given image is not modified.
+        :param image: The image.
+        :return: The prepared image.
+        """
+        if self.max_edge > 0 and max(image.size) > self.max_edge:
+            scale = self.max_edge / max(image.size)
+            size = (
+                max(1, round(image.width * scale)),
+                max(1, round(image.height * scale)),
+            )
+            # Reducing by an integer factor first keeps the resampling cheap on 4K screenshots.
+            image = image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+        if self.grayscale:
+            image = image.convert("L")
+        elif image.mode not in ("RGB", "L") and self.format != "png":
+            image = image.convert("RGB")
+
+        return image
+
+    def encode(self, image: Image.Image) -> bytes:
+        """
+        Encode the image according to the profile.
+        :param image: The image.
+        :return: The encoded bytes.
+        """
+        start_time = time.perf_counter()
+
+        image = self.prepare(image)
+        buffered = BytesIO()
+        if self.format == "png":
+            image.save(buffered, format="PNG", compress_level=DEFAULT_PNG_COMPRESS_LEVEL)
+        else:
+            image.save(buffered, format=self.FORMATS[self.format][0], quality=self.quality)
+        data = buffered.getvalue()
+
+        self.record(len(data), time.perf_counter() - start_time)
+        return data
+
+    def encode_url(self, image: Image.Image) -> str:
+        """
+        Encode the image to a base64 image url according to the profile.
+        :param image: The image.
+        :return: The base64 image url.
+        """
+        encoded_image = base64.b64encode(self.encode(image)).decode("ascii")
+        return f"data:{self.mime_type};base64," + encoded_image
+
+    @classmethod
+    def record(cls, num_bytes: int, seconds: float) -> None:
+        """
+        Record an encoded image in the statistics of the current thread.
+        :param num_bytes: The number of encoded bytes.
+        :param seconds: The encoding time.
+        """
+        statistics = cls._statistics()
+        with cls._lock:
+            statistics["images"] += 1
+            statistics["encoded_bytes"] += num_bytes
+            statistics["encode_time"] += seconds
+
+    @classmethod
+    def _statistics(cls) -> Dict[str, float]:
+        """
+        Get the statistics of the current thread.
+        :return: The statistics.
+        """
+        if not hasattr(cls._local, "statistics"):
+            cls.reset_statistics()
+        return cls._local.statistics
+
+    @classmethod
+    def reset_statistics(cls) -> None:
+        """
+        Reset the statistics of the current thread. They are reset in place, so that the tasks bound to them keep
+        recording into them.
+        """
+        statistics = getattr(cls._local, "statistics", None)
+        if statistics is None:
+            cls._local.statistics = statistics = {}
+        with cls._lock:
+            statistics.update({"images": 0, "encoded_bytes": 0, "encode_time": 0.0})
+
+    @classmethod
+    @contextlib.contextmanager
+    def bind_statistics(cls, statistics: Dict[str, float]) -> Iterator[None]:
+        """
+        Record the images encoded by the current thread in the block into the given statistics, e.g. the statistics of
+        the session that submitted the task to a thread pool.
+        :param statistics: The statistics, from current_statistics.
+        """
+        previous = getattr(cls._local, "statistics", None)
+        cls._local.statistics = statistics
+        try:
+            yield
+        finally:
+            if previous is None:
+                del cls._local.statistics
+            else:
+                cls._local.statistics = previous
+
+    @classmethod
+    def current_statistics(cls) -> Dict[str, float]:
+        """
+        Get the statistics of the current thread, to bind a task of the session to them.
+        :return: The statistics.
+        """
+        return cls._statistics()
+
+    @classmethod
+    def get_statistics(cls) -> Dict[str, float]:
+        """
+        Get the number of images, the encoded bytes and the encoding time of the current thread since the last reset.
+        :return: The statistics.
+        """
+        statistics = cls._statistics()
+        with cls._lock:
+            return dict(statistics)
+
+
+class ScreenshotWriter:
+    """
+    The writer of the screenshots. The screenshots captured in a step are kept in memory for the prompt construction,
+    and are written to disk synchronously, by a background thread, or not at all, depending on the saving mode:
+    "sync" writes the file before returning, "async" queues the file to the background writer, and "none" skips the disk writes.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        """
+        Singleton pattern.
+        """
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init_writer(SCREENSHOT_SAVING_MODE)
+        return cls._instance
+
+    def _init_writer(self, mode: str, max_recent: int = 16) -> None:
+        """
+        Initialize the writer.
+        :param mode: The saving mode, "sync", "async" or "none".
+        :param max_recent: The number of recent screenshots kept in memory.
+        """
+        if mode not in ["sync", "async", "none"]:
+            raise ValueError(f"Invalid screenshot saving mode: {mode}")
+
+        self.mode = mode
+        self.max_recent = max_recent
+        # Recent screenshots, in a format of {path: [image, encoded image url]}.
+        self._recent: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+
+        if self.mode == "async":
+            self._queue = queue.Queue()
+            thread = threading.Thread(
+                target=self._worker, name="ScreenshotWriter", daemon=True
+            )
+            thread.start()
+            atexit.register(self.flush)
+
+    def _worker(self) -> None:
+        """
+        The background thread that writes the queued screenshots to disk.
+        """
+        while True:
+            image, save_path = self._queue.get()
+            try:
+                self._write(image, save_path)
+            except Exception as e:
+                print_with_color(
+                    f"Warning: Failed to save the screenshot to {save_path}: {e}",
+                    "yellow",
+                )
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _write(image: Image.Image, save_path: str) -> None:
+        """
+        Write the screenshot to disk.
+        :param image: The screenshot.
+        :param save_path: The path to save the screenshot.
+        """
+        image.save(save_path, compress_level=DEFAULT_PNG_COMPRESS_LEVEL)
+
+    def save(self, image: Image.Image, save_path: str) -> None:
+        """
+        Save the screenshot. The screenshot must not be modified after it is saved.
+        :param image: The screenshot.
+        :param save_path: The path to save the screenshot.
+        """
+        with self._lock:
+            self._recent[save_path] = [image, None]
+            self._recent.move_to_end(save_path)
+            while len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+        if self.mode == "sync":
+            self._write(image, save_path)
+        elif self.mode == "async":
+            self._queue.put((image, save_path))
+
+    def get_image(self, save_path: str) -> Optional[Image.Image]:
+        """
+        Get a recent screenshot from memory.
+        :param save_path: The path the screenshot is saved to.
+        :return: The screenshot, or None if it is not in memory.
+        """
+        with self._lock:
+            entry = self._recent.get(save_path)
+        return entry[0] if entry else None
+
+    def get_encoded(self, save_path: str) -> Optional[str]:
+        """
+        Get the encoded url of a recent screenshot, encoding it on first use.
+        :param save_path: The path the screenshot is saved to.
+        :return: The encoded image url, or None if the screenshot is not in memory.
+        """
+        with self._lock:
+            entry = self._recent.get(save_path)
+        if entry is None:
+            return None
+        if entry[1] is None:
+            entry[1] = PhotographerFacade.encode_image(entry[0])
+        return entry[1]
+
+    def exists(self, save_path: str) -> bool:
+        """
+        Check if the screenshot is in memory or on disk.
+        :param save_path: The path the screenshot is saved to.
+        :return: True if the screenshot exists, False otherwise.
+        """
+        with self._lock:
+            if save_path in self._recent:
+                return True
+        return os.path.exists(save_path)
+
+    def flush(self) -> None:
+        """
+        Wait until all the queued screenshots are written to disk.
+        """
+        if self._queue is not None:
+            self._queue.join()
+
+
+def save_screenshot(image: Image.Image, save_path: Optional[str]) -> None:
+    """
+    Save the screenshot with the screenshot writer.
+    :param image: The screenshot.
+    :param save_path: The path to save the screenshot. Nothing is saved if it is None.
+    """
+    if save_path is not None:
+        ScreenshotWriter().save(image, save_path)
+
+
+class ScreenshotFrame:
+    """
+    A frame of a window, grabbed once and shared by the photographers of a step. The image of the frame is read-only:
+    the photographers that draw on it work on a copy, so that a step pays a single grab for the clean screenshot,
+    the annotated screenshot, the cropped icons and the selected control screenshot.
+    """
+
+    def __init__(self, control: UIAWrapper) -> None:
+        """
+        Initialize the frame. The window is grabbed on first use.
+        :param control: The window to capture.
+        """
+        self.control = control
+        self._image: Optional[Image.Image] = None
+        self._window_rect: Optional[RECT] = None
+        self._lock = threading.Lock()
+
+    def _grab(self) -> None:
+        """
+        Grab the window if it has not been grabbed yet.
+        """
+        with self._lock:
+            if self._image is None:
+                self._window_rect = self.control.rectangle()
+                self._image = self.control.capture_as_image()
+
+    @property
+    def image(self) -> Image.Image:
+        """
+        Get the image of the frame. The image must not be modified.
+        :return: The image of the frame.
+        """
+        self._grab()
+        return self._image
+
+    @property
+    def window_rect(self) -> RECT:
+        """
+        Get the rectangle of the window when the frame was grabbed.
+        :return: The rectangle of the window.
+        """
+        self._grab()
+        return self._window_rect
 
 
 class Photographer(ABC):
@@ -35,24 +422,37 @@ class ControlPhotographer(Photographer):
     Class to capture the control screenshot.
     """
 
-    def __init__(self, control: UIAWrapper):
+    def __init__(self, control: UIAWrapper, frame: Optional[ScreenshotFrame] = None):
         """
         Initialize the ControlPhotographer.
         :param control: The control item to capture.
+        :param frame: The shared frame of the control. The control is grabbed on each capture if None.
         """
         self.control = control
+        self.frame = frame
 
     def capture(self, save_path: str = None):
         """
-        Capture a screenshot.
+        Capture a screenshot. The screenshot of a shared frame must not be modified.
         :param save_path: The path to save the screenshot.
         :return: The screenshot."""
-        # Capture single window screenshot
-        screenshot = self.control.capture_as_image()
-        if save_path is not None:
-            screenshot.save(save_path, compress_level=DEFAULT_PNG_COMPRESS_LEVEL)
+        if self.frame is not None:
+            screenshot = self.frame.image
+        else:
+            # Capture single window screenshot
+            screenshot = self.control.capture_as_image()
+        save_screenshot(screenshot, save_path)
         return screenshot
 
+    def window_rect(self) -> RECT:
+        """
+        Get the rectangle of the control, at the time of the frame grab if the frame is shared.
+        :return: The rectangle of the control.
+        """
+        if self.frame is not None:
+            return self.frame.window_rect
+        return self.control.rectangle()
+
 
 class DesktopPhotographer(Photographer):
     """
@@ -73,8 +473,7 @@ class DesktopPhotographer(Photographer):
         :return: The screenshot.
         """
         screenshot = ImageGrab.grab(all_screens=self.all_screens)
-        if save_path is not None:
-            screenshot.save(save_path, compress_level=DEFAULT_PNG_COMPRESS_LEVEL)
+        save_screenshot(screenshot, save_path)
         return screenshot
 
 
@@ -98,6 +497,16 @@ class PhotographerDecorator(Photographer):
         """
         return self.photographer.capture(save_path)
 
+    def canvas(self) -> Image.Image:
+        """
+        Capture a screenshot to draw on. The screenshot of a shared frame is copied, so that the frame is kept clean.
+        :return: The screenshot to draw on.
+        """
+        screenshot = self.photographer.capture()
+        if getattr(self.photographer, "frame", None) is not None:
+            screenshot = screenshot.copy()
+        return screenshot
+
     @staticmethod
     def coordinate_adjusted(window_rect: RECT, control_rect: RECT) -> Tuple:
         """
@@ -116,6 +525,27 @@ class PhotographerDecorator(Photographer):
 
         return adjusted_rect
 
+    @staticmethod
+    def coordinates_adjusted(
+        window_rect: RECT, controls: List[UIAWrapper]
+    ) -> np.ndarray:
+        """
+        Adjust the coordinates of the control rectangles to the window rectangle at once.
+        :param window_rect: The window rectangle.
+        :param controls: The controls.
+        :return: The adjusted control rectangles, an array of (left, top, right, bottom) in shape (n, 4).
+        """
+        rects = [control.rectangle() for control in controls]
+        coordinates = np.asarray(
+            [(rect.left, rect.top, rect.right, rect.bottom) for rect in rects],
+            dtype=np.int64,
+        ).reshape(-1, 4)
+
+        return coordinates - np.asarray(
+            [window_rect.left, window_rect.top, window_rect.left, window_rect.top],
+            dtype=np.int64,
+        )
+
 
 class RectangleDecorator(PhotographerDecorator):
     """
@@ -164,8 +594,8 @@ class RectangleDecorator(PhotographerDecorator):
         :param save_path: The path to save the screenshot.
         :return: The screenshot with rectangles.
         """
-        screenshot = self.photographer.capture()
-        window_rect = self.photographer.control.rectangle()
+        screenshot = self.canvas()
+        window_rect = self.photographer.window_rect()
 
         for control in self.sub_control_list:
             if control:
@@ -174,8 +604,7 @@ class RectangleDecorator(PhotographerDecorator):
                 screenshot = self.draw_rectangles(
                     screenshot, coordinate=adjusted_rect, color=self.color
                 )
-        if save_path is not None:
-            screenshot.save(save_path, compress_level=DEFAULT_PNG_COMPRESS_LEVEL)
+        save_screenshot(screenshot, save_path)
         return screenshot
 
 
@@ -239,13 +668,13 @@ class AnnotationDecorator(PhotographerDecorator):
             font_color=font_color,
             border_color=border_color,
             button_color=button_color,
+            mode=image.mode,
         )
         # put button on source image
         image.paste(button_img, (coordinate[0], coordinate[1]))
         return image
 
     @staticmethod
-    @functools.lru_cache(maxsize=2048, typed=False)
     def _get_button_img(
         label_text: str,
         botton_margin: int = 5,
@@ -254,34 +683,22 @@ class AnnotationDecorator(PhotographerDecorator):
         font_color: str = "#000000",
         border_color: str = "#FF0000",
         button_color: str = "#FFF68F",
+        mode: str = "RGB",
     ):
-        font = AnnotationDecorator._get_font("arial.ttf", font_size)
-        text_size = font.getbbox(label_text)
-
-        # set button size + margins
-        button_size = (text_size[2] + botton_margin, text_size[3] + botton_margin)
-        # create image with correct size and black background
-        button_img = Image.new("RGBA", button_size, button_color)
-        button_draw = ImageDraw.Draw(button_img)
-        button_draw.text(
-            (botton_margin / 2, botton_margin / 2),
+        return annotation.get_label_image(
             label_text,
-            font=font,
-            fill=font_color,
-        )
-
-        # draw red rectangle around button
-        ImageDraw.Draw(button_img).rectangle(
-            [(0, 0), (button_size[0] - 1, button_size[1] - 1)],
-            outline=border_color,
-            width=border_width,
+            botton_margin=botton_margin,
+            border_width=border_width,
+            font_size=font_size,
+            font_color=font_color,
+            border_color=border_color,
+            button_color=button_color,
+            mode=mode,
         )
-        return button_img
 
     @staticmethod
-    @functools.lru_cache(maxsize=64, typed=False)
     def _get_font(name: str, size: int):
-        return ImageFont.truetype(name, size)
+        return annotation.get_font(name, size)
 
     @staticmethod
     def number_to_letter(n: int):
@@ -326,7 +743,7 @@ class AnnotationDecorator(PhotographerDecorator):
         """
         cropped_icons_dict = {}
         image = self.photographer.capture()
-        window_rect = self.photographer.control.rectangle()
+        window_rect = self.photographer.window_rect()
 
         for label_text, control in annotation_dict.items():
             control_rect = control.rectangle()
@@ -339,19 +756,23 @@ class AnnotationDecorator(PhotographerDecorator):
     def capture_with_annotation_dict(
         self, annotation_dict: Dict[str, UIAWrapper], save_path: Optional[str] = None
     ):
+        """
+        Capture a screenshot with the controls labeled. The rectangles of the controls are collected once, and the
+        labels are pasted at the top-left corner of their controls onto a single copy of the screenshot.
+        :param annotation_dict: The dictionary of the controls with annotation labels as keys.
+        :param save_path: The path to save the screenshot.
+        :return: The screenshot with annotations.
+        """
 
-        window_rect = self.photographer.control.rectangle()
-        screenshot_annotated = self.photographer.capture()
+        window_rect = self.photographer.window_rect()
+        screenshot = self.photographer.capture()
 
         color_dict = configs["ANNOTATION_COLORS"]
 
-        for label_text, control in annotation_dict.items():
-            control_rect = control.rectangle()
-            adjusted_rect = self.coordinate_adjusted(window_rect, control_rect)
-            adjusted_coordinate = (adjusted_rect[0], adjusted_rect[1])
-            screenshot_annotated = self.draw_rectangles_controls(
-                screenshot_annotated,
-                adjusted_coordinate,
+        controls = list(annotation_dict.values())
+        rects = self.coordinates_adjusted(window_rect, controls)
+        label_images = [
+            self._get_button_img(
                 label_text,
                 button_color=(
                     color_dict.get(
@@ -360,12 +781,17 @@ class AnnotationDecorator(PhotographerDecorator):
                     if self.color_diff
                     else self.color_default
                 ),
+                mode=screenshot.mode,
             )
+            for label_text, control in annotation_dict.items()
+        ]
 
-        if save_path is not None:
-            screenshot_annotated.save(
-                save_path, compress_level=DEFAULT_PNG_COMPRESS_LEVEL
-            )
+        # The labels are rendered onto a copy, so the shared frame is kept clean.
+        screenshot_annotated = annotation.render_labels(
+            screenshot, rects[:, :2], label_images
+        )
+
+        save_screenshot(screenshot_annotated, save_path)
 
         return screenshot_annotated
 
@@ -415,13 +841,31 @@ class PhotographerFacade:
     def __init__(self):
         pass
 
-    def capture_app_window_screenshot(self, control: UIAWrapper, save_path=None):
+    @staticmethod
+    def create_frame(control: UIAWrapper) -> ScreenshotFrame:
+        """
+        Create a frame of the control to share among the captures of a step. The control is grabbed on first use.
+        :param control: The control item to capture.
+        :return: The frame.
+        """
+        return ScreenshotFrame(control)
+
+    def capture_app_window_screenshot(
+        self,
+        control: UIAWrapper,
+        save_path=None,
+        frame: Optional[ScreenshotFrame] = None,
+    ):
         """
         Capture the control screenshot.
         :param control: The control item to capture.
+        :param save_path: The path to save the screenshot.
+        :param frame: The shared frame of the control.
         :return: The screenshot.
         """
-        screenshot = self.screenshot_factory.create_screenshot("app_window", control)
+        screenshot = self.screenshot_factory.create_screenshot(
+            "app_window", control, frame
+        )
         return screenshot.capture(save_path)
 
     def capture_desktop_screen_screenshot(self, all_screens=True, save_path=None):
@@ -435,6 +879,32 @@ class PhotographerFacade:
         )
         return screenshot.capture(save_path)
 
+    @staticmethod
+    def wait_for_settle(
+        control: Optional[UIAWrapper],
+        timeout: float,
+        hold: Optional[Callable[[], ContextManager]] = None,
+    ) -> float:
+        """
+        Wait until the window, or the desktop if there is no window, is visually stable after an action.
+        :param control: The window to watch. The desktop is watched if None or if the window cannot be grabbed.
+        :param timeout: The max time (s) to wait.
+        :param hold: The context manager to hold while grabbing a frame, e.g. the desktop lock.
+        :return: The time (s) waited.
+        """
+
+        def grab() -> Image.Image:
+            with hold() if hold is not None else contextlib.nullcontext():
+                if control is not None:
+                    try:
+                        return control.capture_as_image()
+                    except Exception:
+                        # The window may be closed by the action.
+                        pass
+                return ImageGrab.grab(all_screens=True)
+
+        return SettleDetector.from_config(configs).wait(grab, timeout)
+
     def capture_app_window_screenshot_with_rectangle(
         self,
         control: UIAWrapper,
@@ -442,6 +912,7 @@ class PhotographerFacade:
         width=3,
         sub_control_list: List[UIAWrapper] = None,
         save_path: Optional[str] = None,
+        frame: Optional[ScreenshotFrame] = None,
     ) -> Image.Image:
         """
         Capture the control screenshot with a rectangle.
@@ -450,9 +921,12 @@ class PhotographerFacade:
         :param color: The color of the rectangle.
         :param width: The width of the rectangle.
         :param sub_control_list: The list of the controls to draw rectangles on.
+        :param frame: The shared frame of the control.
         :return: The screenshot.
         """
-        screenshot = self.screenshot_factory.create_screenshot("app_window", control)
+        screenshot = self.screenshot_factory.create_screenshot(
+            "app_window", control, frame
+        )
         screenshot = RectangleDecorator(screenshot, color, width, sub_control_list)
         return screenshot.capture(save_path)
 
@@ -464,6 +938,7 @@ class PhotographerFacade:
         color_diff: bool = True,
         color_default: str = "#FFF68F",
         save_path: Optional[str] = None,
+        frame: Optional[ScreenshotFrame] = None,
     ) -> Image.Image:
         """
         Capture the control screenshot with annotations.
@@ -472,9 +947,12 @@ class PhotographerFacade:
         :param annotation_type: The type of the annotation.
         :param color_diff: Whether to use different colors for different control types.
         :param color_default: The default color of the annotation.
+        :param frame: The shared frame of the control.
         :return: The screenshot.
         """
-        screenshot = self.screenshot_factory.create_screenshot("app_window", control)
+        screenshot = self.screenshot_factory.create_screenshot(
+            "app_window", control, frame
+        )
         sub_control_list = list(annotation_control_dict.values())
         screenshot = AnnotationDecorator(
             screenshot, sub_control_list, annotation_type, color_diff, color_default
@@ -527,17 +1005,22 @@ class PhotographerFacade:
         return screenshot.get_annotation_dict()
 
     def get_cropped_icons_dict(
-        self, control: UIAWrapper, annotation_dict: Dict[str, UIAWrapper]
+        self,
+        control: UIAWrapper,
+        annotation_dict: Dict[str, UIAWrapper],
+        frame: Optional[ScreenshotFrame] = None,
     ) -> Dict[str, Image.Image]:
         """
         Get the dictionary of the cropped icons.
         :param control: The control item to capture.
-        :param sub_control_list: The list of the controls to annotate.
-        :param annotation_type: The type of the annotation.
+        :param annotation_dict: The dictionary of the controls with annotation labels as keys.
+        :param frame: The shared frame of the control.
         :return: The dictionary of the cropped icons.
         """
 
-        screenshot = self.screenshot_factory.create_screenshot("app_window", control)
+        screenshot = self.screenshot_factory.create_screenshot(
+            "app_window", control, frame
+        )
         screenshot = AnnotationDecorator(screenshot, sub_control_list=[])
         return screenshot.get_cropped_icons_dict(annotation_dict)
 
@@ -552,9 +1035,9 @@ class PhotographerFacade:
         :param output_path: The path to save the concatenated image.
         :return: The concatenated image.
         """
-        # Open the images
-        image1 = Image.open(image1_path)
-        image2 = Image.open(image2_path)
+        # Open the images, from memory if they were captured recently.
+        image1 = PhotographerFacade.load_image(image1_path)
+        image2 = PhotographerFacade.load_image(image2_path)
 
         # Ensure both images have the same height
         min_height = min(image1.height, image2.height)
@@ -567,21 +1050,58 @@ class PhotographerFacade:
         result.paste(image2, (image1.width, 0))
 
         # Save the result
-        result.save(output_path, compress_level=DEFAULT_PNG_COMPRESS_LEVEL)
+        save_screenshot(result, output_path)
 
         return result
 
+    @staticmethod
+    def load_image(image_path: str) -> Image.Image:
+        """
+        Load an image, from memory if it was captured recently, otherwise from disk.
+        :param image_path: The path of the image.
+        :return: The image.
+        """
+        image = ScreenshotWriter().get_image(image_path)
+        if image is None:
+            image = Image.open(image_path)
+        return image
+
+    @staticmethod
+    def image_exists(image_path: str) -> bool:
+        """
+        Check if an image exists in memory or on disk.
+        :param image_path: The path of the image.
+        :return: True if the image exists, False otherwise.
+        """
+        return ScreenshotWriter().exists(image_path)
+
+    @staticmethod
+    def flush_screenshots() -> None:
+        """
+        Wait until all the screenshots queued for saving are written to disk.
+        """
+        ScreenshotWriter().flush()
+
     @staticmethod
     def image_to_base64(image: Image.Image) -> str:
         """
-        Convert image to base64 string.
+        Convert image to base64 string with the image encoding profile.
 
         :param image: The image to convert.
         :return: The base64 string.
         """
-        buffered = BytesIO()
-        image.save(buffered, format="PNG", optimize=True)
-        return base64.b64encode(buffered.getvalue()).decode("utf-8")
+        return base64.b64encode(ImageEncoder.get_instance().encode(image)).decode(
+            "utf-8"
+        )
+
+    @staticmethod
+    def encode_image(image: Image.Image) -> str:
+        """
+        Encode an in-memory image to a base64 image url with the image encoding profile, without a disk round trip.
+        :param image: The image to encode.
+        :return: The base64 image url.
+        """
+        return ImageEncoder.get_instance().encode_url(image)
 
     @staticmethod
     def encode_image_from_path(image_path: str, mime_type: Optional[str] = None) -> str:
@@ -592,12 +1112,27 @@ class PhotographerFacade:
         :return: The base64 string.
         """
 
+        # Use the in-memory copy of a recently captured screenshot if available.
+        image_url = ScreenshotWriter().get_encoded(image_path)
+        if image_url is not None:
+            return image_url
+
         file_name = os.path.basename(image_path)
         mime_type = (
             mime_type if mime_type is not None else mimetypes.guess_type(file_name)[0]
         )
+
+        # Re-encode the image file unless the encoding profile sends the image files as they are.
+        encoder = ImageEncoder.get_instance()
+        if not encoder.is_passthrough:
+            with Image.open(image_path) as image:
+                return encoder.encode_url(image)
+
+        start_time = time.perf_counter()
         with open(image_path, "rb") as image_file:
-            encoded_image = base64.b64encode(image_file.read()).decode("ascii")
+            data = image_file.read()
+        encoded_image = base64.b64encode(data).decode("ascii")
+        encoder.record(len(data), time.perf_counter() - start_time)
 
         if mime_type is None or not mime_type.startswith("image/"):
             print(
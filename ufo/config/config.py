@@ -118,4 +118,9 @@ def get_offline_learner_indexer_config():
             records = json.load(file)
     else:
         records = {}
-    return records
+
+    # The records of the incremental indexer also keep the content hashes of the indexed documents.
+    return {
+        app: record["path"] if isinstance(record, dict) else record
+        for app, record in records.items()
+    }
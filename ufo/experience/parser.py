@@ -1,17 +1,56 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import functools
 import json
 import os
 import re
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from ufo.automator.ui_control.screenshot import PhotographerFacade
 from ufo.utils import print_with_color
 
 
+class StepScreenshots(Mapping):
+    """
+    The screenshots of a step, in a format of {version: image url}. A screenshot is read and encoded only when it is
+    accessed, and is not kept, so a log partition holds no image data.
+    """
+
+    VERSIONS = ["raw", "selected_controls"]
+
+    def __init__(self, loader: "ExperienceLogLoader", stepnum: int) -> None:
+        """
+        Initialize the screenshots of the step.
+        :param loader: The log loader.
+        :param stepnum: The step number of the screenshots.
+        """
+        self._loader = loader
+        self._stepnum = stepnum
+
+    def __getitem__(self, version: str) -> Optional[str]:
+        """
+        Load the screenshot of the version.
+        :param version: The version of the screenshot.
+        :return: The image url of the screenshot, or None if it does not exist.
+        """
+        if version not in self.VERSIONS:
+            raise KeyError(version)
+        return self._loader.load_screenshot(
+            self._stepnum, "" if version == "raw" else version
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.VERSIONS)
+
+    def __len__(self) -> int:
+        return len(self.VERSIONS)
+
+
 class ExperienceLogLoader:
     """
-    Loading the logs from previous runs.
+    Loading the logs from previous runs. The logs are streamed one request partition at a time.
     """
 
     def __init__(self, log_path: str):
@@ -20,32 +59,50 @@ class ExperienceLogLoader:
         :param log_path: The path of the log file.
         """
         self.log_path = log_path
-        self.response = self.load_response_log()
         self.max_stepnum = self.find_max_number_in_filenames(log_path)
-        self.request_partition = self.get_request_partition()
         self.screenshots = {}
 
         self.logs = []
 
-    def load_response_log(self):
+    @functools.cached_property
+    def response(self) -> List[Dict[str, Any]]:
         """
-        Load the response log.
+        Get the whole response log, loaded on first use.
         :return: The response log.
         """
+        return self.load_response_log()
+
+    @functools.cached_property
+    def request_partition(self) -> List[List[int]]:
+        """
+        Get the steps of each request partition, computed on first use.
+        :return: The request partition.
+        """
+        return self.get_request_partition()
+
+    def iter_response_log(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the response log line by line.
+        :return: The generator of the responses.
+        """
 
-        response = []
         response_log_path = os.path.join(self.log_path, "response.log")
         with open(response_log_path, "r", encoding="utf-8") as file:
-            # Read the lines and split them into a list
-            response_log = file.readlines()
-        for response_string in response_log:
-            try:
-                response.append(json.loads(response_string))
-            except json.JSONDecodeError:
-                print_with_color(
-                    f"Error loading response log: {response_string}", "yellow"
-                )
-        return response
+            for response_string in file:
+                try:
+                    yield json.loads(response_string)
+                except json.JSONDecodeError:
+                    print_with_color(
+                        f"Error loading response log: {response_string}", "yellow"
+                    )
+
+    def load_response_log(self):
+        """
+        Load the response log.
+        :return: The response log.
+        """
+
+        return list(self.iter_response_log())
 
     @staticmethod
     def find_max_number_in_filenames(log_path) -> int:
@@ -103,38 +160,68 @@ class ExperienceLogLoader:
 
         return image_url
 
+    def create_partition_log(
+        self, partition: List[Tuple[int, Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Create the log of a request partition. The screenshots of the steps are loaded when they are accessed.
+        :param partition: The steps of the partition, in a format of [(step, response)].
+        :return: The log of the partition.
+        """
+        request = partition[0][1]["Request"]
+        nround = partition[0][1]["Round"]
+
+        return {
+            "request": request,
+            "round": nround,
+            "step_num": len(partition),
+            **{
+                "step_%s"
+                % local_step: {
+                    "response": response,
+                    "is_first_action": local_step == 1,
+                    "screenshot": StepScreenshots(self, step),
+                }
+                for local_step, (step, response) in enumerate(partition)
+            },
+            "application": list({response["Application"] for _, response in partition}),
+        }
+
+    def iter_logs(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the logs of the request partitions. The response log is read line by line, and a partition is
+        yielded as soon as its last step is read, so only one partition is held in memory.
+        :return: The generator of the partition logs.
+        """
+        if self.max_stepnum is None:
+            return
+
+        current_round = 0
+        current_partition = []
+
+        for step, response in enumerate(self.iter_response_log()):
+            if step >= self.max_stepnum:
+                break
+
+            nround = response["Round"]
+
+            if nround != current_round:
+                if current_partition:
+                    yield self.create_partition_log(current_partition)
+                current_partition = [(step, response)]
+                current_round = nround
+            else:
+                current_partition.append((step, response))
+
+        if current_partition:
+            yield self.create_partition_log(current_partition)
+
     def create_logs(self) -> list:
         """
         Create the response log.
         :return: The response log.
         """
-        self.logs = []
-        for partition in self.request_partition:
-            request = self.response[partition[0]]["Request"]
-            nround = self.response[partition[0]]["Round"]
-            partitioned_logs = {
-                "request": request,
-                "round": nround,
-                "step_num": len(partition),
-                **{
-                    "step_%s"
-                    % local_step: {
-                        "response": self.response[step],
-                        "is_first_action": local_step == 1,
-                        "screenshot": {
-                            version: self.load_screenshot(
-                                step, "" if version == "raw" else version
-                            )
-                            for version in ["raw", "selected_controls"]
-                        },
-                    }
-                    for local_step, step in enumerate(partition)
-                },
-                "application": list(
-                    {self.response[step]["Application"] for step in partition}
-                ),
-            }
-            self.logs.append(partitioned_logs)
+        self.logs = list(self.iter_logs())
         return self.logs
 
     def get_request_partition(self) -> list:
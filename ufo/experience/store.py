@@ -0,0 +1,458 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+The append-only store of the summarized experiences and demonstrations. Saving a session appends its summaries and
+their embeddings to the end of the store, without reading or rewriting the saved ones, so its cost only depends on
+the number of new summaries. The store folder keeps the layout of the FAISS index it replaces, so a folder saved
+by an earlier version is read as the snapshot of the store:
+
+    index.faiss, index.pkl  The snapshot, a FAISS index written by the last compaction.
+    records.jsonl           The records appended since the snapshot, one {"id", "text", "metadata"} per line.
+    vectors.f32             The float32 embeddings of the records, the n-th row belongs to the n-th record.
+    store.json              The dimension of the embeddings, and whether the partitions hold all the summaries.
+    store.lock              The lock file of the writers.
+    apps/<app>/             The partition of each application, a store of the summaries whose app_list has the app.
+
+The root store is the global partition with all the summaries, so the retrievers search only the partition of their
+application instead of filtering the candidates of the global index. The partitions only hold the summaries appended
+since they were created, so the retrievers only route to them when the store is marked as partitioned: a store
+created empty by this version, or compacted. A folder saved by an earlier version is searched with the filter until
+it is compacted.
+
+Compact the store offline to fold the records into the snapshot and rebuild the partitions of the applications:
+
+    python -m ufo.experience.store vectordb/experience/experience_db --yaml vectordb/experience/experience.yaml
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import yaml
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from ufo.utils import file_lock
+
+
+class ExperienceStore:
+    """
+    The append-only store of the summaries of one experience or demonstration database. The writers append under a
+    file lock, writing the vectors before the records, so that a record is never read without its vector. The readers
+    do not lock, and only read the complete records, so a record being appended is read at the next load.
+    The partitions of the applications share the lock of the root store.
+    """
+
+    SNAPSHOT_NAME = "index"
+    RECORD_FILE = "records.jsonl"
+    VECTOR_FILE = "vectors.f32"
+    META_FILE = "store.json"
+    LOCK_FILE = "store.lock"
+    PARTITION_FOLDER = "apps"
+
+    def __init__(self, path: str, lock_path: Optional[str] = None) -> None:
+        """
+        Create a new ExperienceStore.
+        :param path: The folder of the store.
+        :param lock_path: The lock file of the writers, the lock file in the folder by default.
+        """
+        self.path = path
+        self.record_path = os.path.join(path, self.RECORD_FILE)
+        self.vector_path = os.path.join(path, self.VECTOR_FILE)
+        self.meta_path = os.path.join(path, self.META_FILE)
+        self.lock_path = lock_path or os.path.join(path, self.LOCK_FILE)
+
+    @staticmethod
+    def partition_name(app_name: str) -> str:
+        """
+        Get the folder name of the partition of an application.
+        :param app_name: The root name of the application, e.g. "WINWORD.EXE".
+        :return: The folder name of the partition.
+        """
+        return re.sub(r"[^\w.-]", "_", app_name.lower())
+
+    @classmethod
+    def partition_path(cls, path: str, app_name: str) -> str:
+        """
+        Get the folder of the partition of an application.
+        :param path: The folder of the root store.
+        :param app_name: The root name of the application.
+        :return: The folder of the partition.
+        """
+        return os.path.join(path, cls.PARTITION_FOLDER, cls.partition_name(app_name))
+
+    def partition(self, app_name: str) -> "ExperienceStore":
+        """
+        Get the partition of an application.
+        :param app_name: The root name of the application.
+        :return: The partition, which shares the lock of the store.
+        """
+        return ExperienceStore(self.partition_path(self.path, app_name), self.lock_path)
+
+    @classmethod
+    def group_by_app(cls, summaries: List[dict]) -> Dict[str, List[int]]:
+        """
+        Group the summaries by the partitions of their applications. A summary belongs to the partition of each of
+        the applications in its app_list.
+        :param summaries: The summaries.
+        :return: The indices of the summaries of each partition, in a format of {app_name: indices}.
+        """
+        groups: Dict[str, List[int]] = {}
+        for index, summary in enumerate(summaries):
+            app_names = {cls.partition_name(app) for app in summary.get("app_list") or []}
+            for app_name in app_names:
+                groups.setdefault(app_name, []).append(index)
+        return groups
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        """
+        Check whether the folder has records appended to a store.
+        :param path: The folder.
+        :return: True if the folder has a store, False otherwise.
+        """
+        return os.path.exists(os.path.join(path, cls.RECORD_FILE))
+
+    def has_snapshot(self) -> bool:
+        """
+        Check whether the store has a snapshot.
+        :return: True if the store has a snapshot, False otherwise.
+        """
+        return all(
+            os.path.exists(os.path.join(self.path, f"{self.SNAPSHOT_NAME}.{extension}"))
+            for extension in ["faiss", "pkl"]
+        )
+
+    def modified_time(self) -> Optional[float]:
+        """
+        Get the last modified time of the snapshot and the records.
+        :return: The last modified time, or None if the store is empty.
+        """
+        files = [
+            os.path.join(self.path, f"{self.SNAPSHOT_NAME}.faiss"),
+            os.path.join(self.path, f"{self.SNAPSHOT_NAME}.pkl"),
+            self.record_path,
+        ]
+        times = [os.path.getmtime(file) for file in files if os.path.exists(file)]
+        return max(times) if times else None
+
+    def _meta(self) -> Dict:
+        """
+        Get the metadata of the store.
+        :return: The metadata, in a format of {"dim": dimension, "partitioned": bool}, or {} if nothing has been appended.
+        """
+        if not os.path.exists(self.meta_path):
+            return {}
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _update_meta(self, **values) -> None:
+        """
+        Update the metadata of the store. It must hold the lock.
+        :param values: The values to update.
+        """
+        meta = self._meta()
+        meta.update(values)
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def _dim(self) -> Optional[int]:
+        """
+        Get the dimension of the embeddings.
+        :return: The dimension, or None if nothing has been appended.
+        """
+        return self._meta().get("dim")
+
+    def is_partitioned(self) -> bool:
+        """
+        Check whether the partitions of the applications hold all the summaries of the store, so that the retrieval of
+        an application can be routed to its partition. This is the case for a store created empty by this version,
+        and for a compacted store, but not for a store saved by an earlier version and appended to since.
+        :return: True if the store is partitioned, False otherwise.
+        """
+        return bool(self._meta().get("partitioned", False))
+
+    def _complete_records(self) -> Tuple[List[dict], List[int]]:
+        """
+        Read the complete records, stopping at a partially written line.
+        :return: The records, and the end offset (bytes) of each of them in the file.
+        """
+        records = []
+        ends = []
+
+        if not os.path.exists(self.record_path):
+            return records, ends
+
+        with open(self.record_path, "rb") as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+                offset += len(line)
+                ends.append(offset)
+
+        return records, ends
+
+    def read(self) -> Tuple[List[dict], np.ndarray]:
+        """
+        Read the records appended since the snapshot, with their vectors.
+        :return: The records, and their vectors in shape (n, dim).
+        """
+        records, _ = self._complete_records()
+        dim = self._dim()
+        if not records or dim is None:
+            return [], np.zeros((0, dim or 0), dtype=np.float32)
+
+        vectors = np.fromfile(self.vector_path, dtype=np.float32, count=len(records) * dim)
+        num_vectors = len(vectors) // dim
+        return records[:num_vectors], vectors[: num_vectors * dim].reshape(-1, dim)
+
+    def _repair(self, dim: int) -> int:
+        """
+        Truncate the records and the vectors left partially written by a failed writer. It must hold the lock.
+        :param dim: The dimension of the embeddings.
+        :return: The number of the complete records.
+        """
+        records, ends = self._complete_records()
+        num_vectors = (
+            os.path.getsize(self.vector_path) // (4 * dim)
+            if os.path.exists(self.vector_path)
+            else 0
+        )
+        num_records = min(len(records), num_vectors)
+        size = ends[num_records - 1] if num_records else 0
+
+        for file, length in [(self.record_path, size), (self.vector_path, num_records * dim * 4)]:
+            if os.path.exists(file) and os.path.getsize(file) != length:
+                with open(file, "r+b") as f:
+                    f.truncate(length)
+
+        return num_records
+
+    def append(self, summaries: List[dict], embedding: Embeddings) -> List[str]:
+        """
+        Append the summaries to the store and to the partitions of their applications. The summaries are embedded
+        once, by their requests, before the lock is taken.
+        :param summaries: The summaries.
+        :param embedding: The embeddings of the index.
+        :return: The ids of the appended records.
+        """
+        if not summaries:
+            return []
+
+        texts = [summary["request"] for summary in summaries]
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+        records = [
+            {"id": uuid.uuid4().hex, "text": text, "metadata": summary}
+            for text, summary in zip(texts, summaries)
+        ]
+
+        os.makedirs(self.path, exist_ok=True)
+        with file_lock(self.lock_path):
+            # The partitions of a new store hold all its summaries from the start.
+            is_new = not self.has_snapshot() and self._dim() is None
+
+            self._write(records, vectors)
+            if is_new:
+                self._update_meta(partitioned=True)
+
+            for app_name, rows in self.group_by_app(summaries).items():
+                self.partition(app_name)._write([records[i] for i in rows], vectors[rows])
+
+        return [record["id"] for record in records]
+
+    def _write(self, records: List[dict], vectors: np.ndarray) -> None:
+        """
+        Append the records and their vectors. It must hold the lock.
+        :param records: The records.
+        :param vectors: The vectors of the records, in shape (n, dim).
+        """
+        os.makedirs(self.path, exist_ok=True)
+
+        dim = self._dim()
+        if dim is None:
+            dim = vectors.shape[1]
+            self._update_meta(dim=dim)
+        elif dim != vectors.shape[1]:
+            raise ValueError(
+                f"The embeddings have {vectors.shape[1]} dimensions, but the store at {self.path} has {dim}."
+            )
+
+        self._repair(dim)
+
+        with open(self.vector_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.record_path, "ab") as f:
+            f.write(
+                "".join(
+                    json.dumps(record, ensure_ascii=False) + "\n" for record in records
+                ).encode("utf-8")
+            )
+
+    def load(self, embedding: Embeddings) -> FAISS:
+        """
+        Load the index of the store: the snapshot, with the records appended since the snapshot added from their stored
+        vectors, without embedding them again.
+        :param embedding: The embeddings of the index.
+        :return: The index.
+        """
+        # The snapshot was saved by the compaction or by an earlier version of the store, so its docstore is trusted.
+        db = (
+            FAISS.load_local(
+                self.path,
+                embedding,
+                index_name=self.SNAPSHOT_NAME,
+                allow_dangerous_deserialization=True,
+            )
+            if self.has_snapshot()
+            else None
+        )
+        records, vectors = self.read()
+
+        # A compaction running at the same time may have folded some records into the snapshot already.
+        if db is not None:
+            snapshot_ids = set(db.index_to_docstore_id.values())
+            rows = [i for i, record in enumerate(records) if record["id"] not in snapshot_ids]
+            records, vectors = [records[i] for i in rows], vectors[rows]
+
+        if records:
+            appended = FAISS.from_embeddings(
+                zip([record["text"] for record in records], vectors.tolist()),
+                embedding,
+                metadatas=[record["metadata"] for record in records],
+                ids=[record["id"] for record in records],
+            )
+            if db is None:
+                db = appended
+            else:
+                db.merge_from(appended)
+
+        if db is None:
+            raise FileNotFoundError(f"The store at {self.path} is empty.")
+
+        return db
+
+    @staticmethod
+    def documents(db: FAISS) -> List[Tuple[str, Dict]]:
+        """
+        Get the documents of the index in the order they were added.
+        :param db: The index.
+        :return: The (id, document) pairs.
+        """
+        return [
+            (doc_id, db.docstore.search(doc_id))
+            for _, doc_id in sorted(db.index_to_docstore_id.items())
+        ]
+
+    def _save_snapshot(self, db: FAISS) -> None:
+        """
+        Replace the snapshot with the index, then drop the records, which are in the snapshot. It must hold the lock.
+        :param db: The index.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self._update_meta(dim=db.index.d)
+
+        # Replace the snapshot files one by one, so that the snapshot is never partially written.
+        temp_path = tempfile.mkdtemp(dir=self.path)
+        try:
+            db.save_local(temp_path, index_name=self.SNAPSHOT_NAME)
+            for extension in ["faiss", "pkl"]:
+                file = f"{self.SNAPSHOT_NAME}.{extension}"
+                os.replace(os.path.join(temp_path, file), os.path.join(self.path, file))
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+        for file in [self.record_path, self.vector_path]:
+            if os.path.exists(file):
+                with open(file, "r+b") as f:
+                    f.truncate(0)
+
+    def compact(self, embedding: Embeddings, yaml_path: Optional[str] = None) -> int:
+        """
+        Fold the appended records into the snapshot, drop the duplicated summaries, and rebuild the partitions of the
+        applications from the compacted store, which also partitions a store saved by an earlier version, and marks the
+        store as partitioned. The partitions of the applications without summaries are removed. The writers are blocked
+        during the compaction, so it is meant to run offline.
+        :param embedding: The embeddings of the index.
+        :param yaml_path: The path to export the summaries as YAML, in the format of the former experience.yaml.
+        :return: The number of the summaries in the compacted store.
+        """
+        with file_lock(self.lock_path):
+            db = self.load(embedding)
+
+            seen = set()
+            duplicates = []
+            for doc_id, document in self.documents(db):
+                key = json.dumps(
+                    [document.page_content, document.metadata], sort_keys=True, default=str
+                )
+                if key in seen:
+                    duplicates.append(doc_id)
+                seen.add(key)
+            if duplicates:
+                db.delete(duplicates)
+
+            self._save_snapshot(db)
+
+            documents = self.documents(db)
+            vectors = db.index.reconstruct_n(0, db.index.ntotal)
+            groups = self.group_by_app([document.metadata for _, document in documents])
+
+            for app_name, rows in groups.items():
+                partition_db = FAISS.from_embeddings(
+                    [(documents[i][1].page_content, vectors[i].tolist()) for i in rows],
+                    embedding,
+                    metadatas=[documents[i][1].metadata for i in rows],
+                    ids=[documents[i][0] for i in rows],
+                )
+                self.partition(app_name)._save_snapshot(partition_db)
+
+            partition_folder = os.path.join(self.path, self.PARTITION_FOLDER)
+            if os.path.isdir(partition_folder):
+                for app_name in os.listdir(partition_folder):
+                    if app_name not in groups:
+                        shutil.rmtree(
+                            os.path.join(partition_folder, app_name), ignore_errors=True
+                        )
+
+            # Mark the store once all its partitions are rebuilt.
+            self._update_meta(partitioned=True)
+
+        if yaml_path:
+            data = {
+                f"example{index}": document.metadata
+                for index, (_, document) in enumerate(documents)
+            }
+            with open(yaml_path, "w") as file:
+                yaml.safe_dump(data, file, default_flow_style=False, sort_keys=False)
+
+        return db.index.ntotal
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compact an experience or demonstration store."
+    )
+    parser.add_argument("path", help="The folder of the store, e.g. vectordb/experience/experience_db.")
+    parser.add_argument("--yaml", help="The path to export the summaries as YAML.")
+    args = parser.parse_args()
+
+    from ufo.rag.embeddings import get_retriever_embedding
+
+    size = ExperienceStore(args.path).compact(get_retriever_embedding(), args.yaml)
+    print(f"Compacted {args.path}: {size} summaries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,18 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
-import os
-from typing import Tuple
-
-import yaml
-from langchain.docstore.document import Document
-from langchain_community.vectorstores import FAISS
+from typing import Iterable, Iterator, Optional, Tuple
 
+from ufo.config.config import Config
 from ufo.experience.parser import ExperienceLogLoader
-from ufo.llm.llm_call import get_completion
+from ufo.experience.store import ExperienceStore
+from ufo.llm.llm_call import get_completions_with_backoff
+from ufo.module.concurrency import iter_ordered
 from ufo.prompter.experience_prompter import ExperiencePrompter
-from ufo.utils import get_hugginface_embedding, json_parser
+from ufo.rag.embeddings import get_retriever_embedding
+from ufo.utils import json_parser
+
+configs = Config.get_instance().config_data
 
 
 class ExperienceSummarizer:
@@ -60,22 +61,24 @@ class ExperienceSummarizer:
 
         return experience_prompt
 
-    def get_summary(self, prompt_message: list) -> Tuple[dict, float]:
+    def get_summary(self, prompt_message: list) -> Tuple[Optional[dict], float]:
         """
-        Get the summary.
+        Get the summary. The rate-limited requests are retried with backoff.
         :param prompt_message: The prompt message.
-        return: The summary and the cost.
+        return: The summary, or None if the response cannot be parsed, and the cost.
         """
 
         # Get the completion for the prompt message
-        response_string, cost = get_completion(
+        response_strings, cost = get_completions_with_backoff(
             prompt_message, "APPAGENT", use_backup_engine=True
         )
         try:
-            response_json = json_parser(response_string)
+            response_json = json_parser(response_strings[0])
         except:
             response_json = None
 
+        summary = None
+
         # Restructure the response
         if response_json:
             summary = dict()
@@ -96,91 +99,61 @@ class ExperienceSummarizer:
 
         return summary, cost
 
-    def get_summary_list(self, logs: list) -> Tuple[list, float]:
+    def summarize_partition(self, log_partition: dict) -> Tuple[Optional[dict], float]:
+        """
+        Summarize a log partition.
+        :param log_partition: The log partition.
+        return: The summary, or None if the response cannot be parsed, and the cost.
         """
-        Get the summary list.
+        prompt = self.build_prompt(log_partition)
+        summary, cost = self.get_summary(prompt)
+        if summary:
+            summary["request"] = ExperienceLogLoader.get_user_request(log_partition)
+            summary["app_list"] = ExperienceLogLoader.get_app_list(log_partition)
+
+        return summary, cost
+
+    def get_summary_list(
+        self, logs: Iterable[dict], max_workers: Optional[int] = None
+    ) -> Tuple[list, float]:
+        """
+        Get the summary list. The partitions are summarized concurrently by a bounded number of workers, and only a
+        bounded number of them is taken from the logs ahead of the finished ones, so the logs can be streamed. The
+        summaries keep the order of the partitions, and the partitions that cannot be summarized are skipped.
         :param logs: The logs.
+        :param max_workers: The max number of concurrent summarization requests, SUMMARIZATION_CONCURRENCY by default.
         return: The summary list and the total cost.
         """
+        if max_workers is None:
+            max_workers = configs.get("SUMMARIZATION_CONCURRENCY", 4)
+
         summaries = []
         total_cost = 0.0
-        for log_partition in logs:
-            prompt = self.build_prompt(log_partition)
-            summary, cost = self.get_summary(prompt)
-            summary["request"] = ExperienceLogLoader.get_user_request(log_partition)
-            summary["app_list"] = ExperienceLogLoader.get_app_list(log_partition)
-            summaries.append(summary)
+        for summary, cost in iter_ordered(self.summarize_partition, logs, max_workers):
+            if summary:
+                summaries.append(summary)
             total_cost += cost
 
         return summaries, total_cost
 
     @staticmethod
-    def read_logs(log_path: str) -> list:
+    def read_logs(log_path: str) -> Iterator[dict]:
         """
-        Read the log.
+        Read the log lazily, one request partition at a time.
         :param log_path: The path of the log file.
+        :return: The generator of the partition logs.
         """
         replay_loader = ExperienceLogLoader(log_path)
-        logs = replay_loader.create_logs()
-        return logs
-
-    @staticmethod
-    def create_or_update_yaml(summaries: list, yaml_path: str):
-        """
-        Create or update the YAML file.
-
-        :param summaries: The summaries.
-        :param yaml_path: The path of the YAML file.
-        """
-
-        # Check if the file exists, if not, create a new one
-        if not os.path.exists(yaml_path):
-            with open(yaml_path, "w"):
-                pass
-            print(f"Created new YAML file: {yaml_path}")
-
-        # Read existing data from the YAML file
-        with open(yaml_path, "r") as file:
-            existing_data = yaml.safe_load(file)
-
-        # Initialize index and existing_data if file is empty
-        index = len(existing_data) if existing_data else 0
-        existing_data = existing_data or {}
-
-        # Update data with new summaries
-        for i, summary in enumerate(summaries):
-            example = {f"example{index + i}": summary}
-            existing_data.update(example)
-
-        # Write updated data back to the YAML file
-        with open(yaml_path, "w") as file:
-            yaml.safe_dump(
-                existing_data, file, default_flow_style=False, sort_keys=False
-            )
-
-        print(f"Updated existing YAML file successfully: {yaml_path}")
+        return replay_loader.iter_logs()
 
     @staticmethod
     def create_or_update_vector_db(summaries: list, db_path: str):
         """
-        Create or update the vector database.
+        Append the summaries to the experience store. The saved summaries are not read or rewritten.
         :param summaries: The summaries.
         :param db_path: The path of the vector database.
         """
 
-        document_list = []
-
-        for summary in summaries:
-            request = summary["request"]
-            document_list.append(Document(page_content=request, metadata=summary))
-
-        db = FAISS.from_documents(document_list, get_hugginface_embedding())
-
-        # Check if the db exists, if not, create a new one.
-        if os.path.exists(db_path):
-            prev_db = FAISS.load_local(db_path, get_hugginface_embedding())
-            db.merge_from(prev_db)
-
-        db.save_local(db_path)
+        ExperienceStore(db_path).append(summaries, get_retriever_embedding())
 
         print(f"Updated vector DB successfully: {db_path}")
@@ -2,9 +2,36 @@
 # Licensed under the MIT License.
 
 import abc
+import random
+import threading
+import time
+from dataclasses import dataclass
 from importlib import import_module
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ufo.module.concurrency import iter_ordered
+from ufo.utils import print_with_color
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float = 60) -> float:
+    """
+    Get the delay before a retry, with exponential backoff and full jitter, so that the concurrent requests do not
+    retry in lockstep.
+    :param attempt: The number of the failed attempts before this one, from 0.
+    :param base_delay: The base delay in seconds.
+    :param max_delay: The cap of the delay in seconds.
+    :return: A random delay up to base_delay * 2^attempt, capped at max_delay.
+    """
+    return random.uniform(0, min(base_delay * 2**attempt, max_delay))
+
 
 class BaseService(abc.ABC):
+    # The statistics of the last chat completion of the calling thread.
+    _completion_local = threading.local()
+
     @abc.abstractmethod
     def __init__(self, *args, **kwargs):
         pass
@@ -34,6 +61,80 @@ class BaseService(abc.ABC):
             raise ValueError(f"Service {name} not found.")
         return getattr(module, service_name)
 
+    def connection_info(self) -> Dict[str, Any]:
+        """
+        Get the connection information of the service, e.g. the pool size and the connection reuse count.
+        Services that do not manage their own HTTP connections return an empty dictionary.
+        :return: The connection information.
+        """
+        return {}
+
+    def parallel_completions(
+        self, complete: Callable[[], Tuple[str, float]], n: int
+    ) -> Tuple[List[str], float]:
+        """
+        Generate n completions for the services whose API returns one completion per request, by sending the n
+        requests concurrently, at most LLM_COMPLETION_CONCURRENCY at a time. A failed request is retried up to
+        MAX_RETRY times with exponential backoff and jitter. The completions that still fail are dropped, and the
+        last error is raised if none succeeded.
+        :param complete: The function sending one request, returning the completion and its cost.
+        :param n: The number of completions.
+        :return: The completions and their total cost.
+        """
+        max_retry = max(self.config.get("MAX_RETRY", 3), 1)
+        base_delay = self.config.get("LLM_RETRY_BACKOFF", 1.0)
+        max_workers = min(n, self.config.get("LLM_COMPLETION_CONCURRENCY", 4))
+
+        def complete_with_retry(_) -> Dict[str, Any]:
+            start_time = time.time()
+            error = None
+            for attempt in range(max_retry):
+                if attempt > 0:
+                    time.sleep(backoff_delay(attempt - 1, base_delay))
+                try:
+                    response, cost = complete()
+                    return {
+                        "response": response,
+                        "cost": cost,
+                        "retries": attempt,
+                        "latency": time.time() - start_time,
+                    }
+                except Exception as e:
+                    print_with_color(f"Error making API request: {e}", "red")
+                    error = e
+            return {
+                "error": error,
+                "retries": max_retry - 1,
+                "latency": time.time() - start_time,
+            }
+
+        results = list(iter_ordered(complete_with_retry, range(n), max_workers))
+        succeeded = [result for result in results if "error" not in result]
+
+        self._completion_local.statistics = {
+            "completions": len(succeeded),
+            "failures": n - len(succeeded),
+            "retries": sum(result["retries"] for result in results),
+            "completion_latencies": [result["latency"] for result in results],
+        }
+
+        if not succeeded:
+            raise results[-1]["error"]
+
+        return [result["response"] for result in succeeded], sum(
+            result["cost"] or 0.0 for result in succeeded
+        )
+
+    def pop_completion_statistics(self) -> Dict[str, Any]:
+        """
+        Get and clear the statistics of the last parallel completions of the calling thread.
+        Services that generate the n completions in one request return an empty dictionary.
+        :return: The number of completions, failures and retries, and the latency of each completion.
+        """
+        statistics = getattr(self._completion_local, "statistics", {})
+        self._completion_local.statistics = {}
+        return statistics
+
     def get_cost_estimator(
         self, api_type, model, prices, prompt_tokens, completion_tokens
     ) -> float:
@@ -66,3 +167,220 @@ class BaseService(abc.ABC):
         else:
             return 0
         return cost
+
+
+@dataclass
+class ServiceStatistics:
+    """
+    The statistics of the calls made through a pooled service instance.
+    """
+
+    calls: int = 0
+    failures: int = 0
+    retries: int = 0
+    total_latency: float = 0.0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def record(self, latency: float, success: bool = True, retries: int = 0) -> None:
+        """
+        Record a call to the service.
+        :param latency: The latency of the call in seconds.
+        :param success: Whether the call succeeded.
+        :param retries: The number of the requests retried within the call.
+        """
+        self.calls += 1
+        if not success:
+            self.failures += 1
+        self.retries += retries
+        self.total_latency += latency
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+
+    @property
+    def average_latency(self) -> float:
+        """
+        Get the average latency of the calls.
+        :return: The average latency in seconds.
+        """
+        return self.total_latency / self.calls if self.calls else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the statistics to a dictionary.
+        :return: The statistics dictionary.
+        """
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "total_latency": self.total_latency,
+            "average_latency": self.average_latency,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency,
+        }
+
+
+class ServiceRegistry:
+    """
+    The process-wide registry of the LLM services. A service is created once per agent type and API type,
+    so that its HTTP clients and connection pools stay warm across steps and sessions.
+    """
+
+    _services: Dict[Tuple[str, str], BaseService] = {}
+    _statistics: Dict[Tuple[str, str], ServiceStatistics] = {}
+    _lock = threading.Lock()
+    # The statistics of the last call of the calling thread.
+    _local = threading.local()
+
+    @classmethod
+    def get_service(cls, configs: dict, api_type: str, agent_type: str) -> BaseService:
+        """
+        Get the pooled service for the agent type, creating it on first use.
+        :param configs: The configurations.
+        :param api_type: The API type of the service, in lower case.
+        :param agent_type: The agent type, e.g. HOST_AGENT, APP_AGENT or BACKUP_AGENT.
+        :return: The service instance.
+        """
+        key = (agent_type, api_type)
+        with cls._lock:
+            if key not in cls._services:
+                service = BaseService.get_service(api_type)
+                cls._services[key] = service(configs, agent_type=agent_type)
+                cls._statistics[key] = ServiceStatistics()
+            return cls._services[key]
+
+    @classmethod
+    def chat_completion(
+        cls, configs: dict, api_type: str, agent_type: str, *args, **kwargs
+    ) -> Tuple[list, Optional[float]]:
+        """
+        Call the chat completion of the pooled service and record its latency.
+        :param configs: The configurations.
+        :param api_type: The API type of the service, in lower case.
+        :param agent_type: The agent type.
+        :return: The completions and the cost returned by the service.
+        """
+        service = cls.get_service(configs, api_type, agent_type)
+        statistics = cls._statistics[(agent_type, api_type)]
+
+        start_time = time.time()
+        success = False
+        try:
+            result = service.chat_completion(*args, **kwargs)
+            success = True
+        finally:
+            latency = time.time() - start_time
+            completion_statistics = service.pop_completion_statistics()
+            cls._local.last_call = {
+                "agent_type": agent_type,
+                "api_type": api_type,
+                "latency": latency,
+                "success": success,
+                "retries": completion_statistics.get("retries", 0),
+                **completion_statistics,
+            }
+            with cls._lock:
+                statistics.record(
+                    latency, success, completion_statistics.get("retries", 0)
+                )
+
+        return result
+
+    @classmethod
+    def get_last_call_statistics(cls) -> Dict[str, Any]:
+        """
+        Get the statistics of the last chat completion of the calling thread.
+        :return: The agent and API type of the service, the latency, the success and the number of retries of the
+        call, and for the services generating the completions in parallel, the number of completions and failures
+        and the latency of each completion.
+        """
+        return dict(getattr(cls._local, "last_call", {}))
+
+    @classmethod
+    def get_statistics(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the call and connection statistics of all the pooled services.
+        :return: The statistics, keyed by "{agent_type}/{api_type}".
+        """
+        with cls._lock:
+            items = list(cls._services.items())
+            statistics = {
+                key: value.to_dict() for key, value in cls._statistics.items()
+            }
+
+        return {
+            "{agent}/{api}".format(agent=key[0], api=key[1]): {
+                **statistics[key],
+                **service.connection_info(),
+            }
+            for key, service in items
+        }
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Clear the registry. The services will be recreated on the next call.
+        """
+        with cls._lock:
+            cls._services.clear()
+            cls._statistics.clear()
+
+
+class HTTPSessionPool:
+    """
+    The shared keep-alive HTTP sessions for the services that talk to their endpoints with requests.
+    One session is kept per base URL, so that agents using the same endpoint share the connection pool.
+    """
+
+    _sessions: Dict[str, requests.Session] = {}
+    _pool_sizes: Dict[str, int] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_session(cls, base_url: str, pool_size: int = 10) -> requests.Session:
+        """
+        Get the shared session for the base URL.
+        :param base_url: The base URL of the endpoint.
+        :param pool_size: The maximum number of connections kept alive in the pool.
+        :return: The shared session.
+        """
+        with cls._lock:
+            if base_url not in cls._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._sessions[base_url] = session
+                cls._pool_sizes[base_url] = pool_size
+            return cls._sessions[base_url]
+
+    @classmethod
+    def connection_info(cls, base_url: str) -> Dict[str, Any]:
+        """
+        Get the connection statistics of the shared session for the base URL.
+        :param base_url: The base URL of the endpoint.
+        :return: The pool size, the number of opened connections, requests and reused connections.
+        """
+        session = cls._sessions.get(base_url)
+        if session is None:
+            return {}
+
+        opened = 0
+        sent = 0
+        # The same adapter is mounted for http and https, only count it once.
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                opened += pool.num_connections
+                sent += pool.num_requests
+
+        return {
+            "pool_size": cls._pool_sizes.get(base_url, 0),
+            "connections_opened": opened,
+            "requests_sent": sent,
+            "connections_reused": max(sent - opened, 0),
+        }
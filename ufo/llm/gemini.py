@@ -1,12 +1,8 @@
-import time
-from typing import Any, Optional
-from io import BytesIO
-import base64
+from typing import Any, Optional, Tuple
 from PIL import Image
-import re
 import google.generativeai as genai
 from ufo.llm.base import BaseService
-from ufo.utils import print_with_color
+from ufo.llm.image_transcoder import ImageTranscoder
 
 
 class GeminiService(BaseService):
@@ -18,6 +14,9 @@ class GeminiService(BaseService):
         self.max_retry = self.config['MAX_RETRY']
         self.api_type = self.config_llm["API_TYPE"].lower()
         genai.configure(api_key = self.config_llm["API_KEY"])
+        self.transcoder = ImageTranscoder.get_instance(
+            self.config.get("IMAGE_TRANSCODE_CACHE_SIZE", 128)
+        )
 
     def chat_completion(
         self,
@@ -29,7 +28,7 @@ class GeminiService(BaseService):
         **kwargs: Any,
     ):
         """
-        Generates completions for a given list of messages.
+        Generates completions for a given list of messages. The n completions are requested concurrently.
         Args:
             messages (List[str]): The list of messages to generate completions for.
             n (int): The number of completions to generate for each message.
@@ -37,7 +36,7 @@ class GeminiService(BaseService):
             top_p (float, optional): Controls the diversity of the generated completions. Higher values (e.g., 0.8) make the completions more diverse, while lower values (e.g., 0.2) make the completions more focused. If not provided, the default value from the model configuration will be used.
             **kwargs: Additional keyword arguments to be passed to the underlying completion method.
         Returns:
-            List[str], None:A list of generated completions for each message and the cost set to be None.
+            List[str], float: A list of generated completions for each message and the total cost.
         Raises:
             Exception: If an error occurs while making the API request.
         """
@@ -46,35 +45,24 @@ class GeminiService(BaseService):
         )
         top_p = top_p if top_p is not None else self.config["TOP_P"]
         max_tokens = max_tokens if max_tokens is not None else self.config["MAX_TOKENS"]
-        genai_config = genai.GenerationConfig(candidate_count = n, max_output_tokens = max_tokens, temperature = temperature, \
+        # One candidate per request, the n requests are sent concurrently.
+        genai_config = genai.GenerationConfig(candidate_count = 1, max_output_tokens = max_tokens, temperature = temperature, \
             top_p = top_p, response_mime_type = "application/json")
-        self.client = genai.GenerativeModel(self.model, generation_config=genai_config)
-        
-        responses = []
-        cost = 0.0
+        # The model is created per call, as the service is shared by the concurrent sessions.
+        client = genai.GenerativeModel(self.model, generation_config=genai_config)
         
-        for _ in range(n):
-            for _ in range(self.max_retry):
-                try:
-                    response = self.client.generate_content(
-                        self.process_messages(messages),
-                    )
-                    responses.append(response.text)
-                    prompt_tokens = response.usage_metadata.prompt_token_count
-                    completion_tokens = response.usage_metadata.candidates_token_count
-                    cost += self.get_cost_estimator(
-                        self.api_type, self.model, self.prices, prompt_tokens, completion_tokens
-                        )
-                except Exception as e:
-                    print_with_color(f"Error making API request: {e}", "red")
-                    try:
-                        print_with_color(response, "red")
-                    except:
-                        _
-                    time.sleep(3)
-                    continue
+        prompt_contents = self.process_messages(messages)
+
+        def complete() -> Tuple[str, float]:
+            response = client.generate_content(prompt_contents)
+            prompt_tokens = response.usage_metadata.prompt_token_count
+            completion_tokens = response.usage_metadata.candidates_token_count
+            cost = self.get_cost_estimator(
+                self.api_type, self.model, self.prices, prompt_tokens, completion_tokens
+            )
+            return response.text, cost
 
-        return responses, cost
+        return self.parallel_completions(complete, n)
 
     def process_messages(self, messages):
         """
@@ -107,7 +95,8 @@ class GeminiService(BaseService):
             
     def base64_to_image(self, base64_str: str) -> Image.Image:
         """
-        Converts a base64 encoded image string to a PIL Image object.
+        Converts a base64 encoded image string to a PIL Image object. The decoded image is cached and shared,
+        so it is only decoded once.
 
         Args:
             base64_str (str): The base64 encoded image string.
@@ -116,9 +105,4 @@ class GeminiService(BaseService):
             Image.Image: The PIL Image object.
 
         """
-        base64_data = re.sub('^data:image/.+;base64,', '', base64_str)
-        byte_data = base64.b64decode(base64_data)
-        image_data = BytesIO(byte_data)
-        img = Image.open(image_data)
-        return img
-            
\ No newline at end of file
+        return self.transcoder.to_image(base64_str)
@@ -0,0 +1,257 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import base64
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from PIL import Image
+
+
+class ImageTranscoder:
+    """
+    The in-memory cache of the prompt images converted for the services that do not take the OpenAI image format,
+    e.g. resized for Ollama and Qwen, or decoded for Gemini. An image is converted once per content hash and target
+    size, so the retries, the backup engine and the following steps sending the same screenshot reuse the result.
+    The cache is bounded by the approximate size of the converted images, and the least recently used ones are evicted.
+    """
+
+    _instance: Optional["ImageTranscoder"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_size_mb: float = 128) -> None:
+        """
+        Create a new ImageTranscoder.
+        :param max_size_mb: The max size of the cached images in MB. 0 disables the cache.
+        """
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self._cache: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        # The files written by to_file, in a format of {path: size}, in the order they were last used.
+        self._files: OrderedDict = OrderedDict()
+        self._file_bytes = 0
+
+    @classmethod
+    def get_instance(cls, max_size_mb: float = 128) -> "ImageTranscoder":
+        """
+        Get the transcoder shared by the services.
+        :param max_size_mb: The max size of the cached images in MB, used when the transcoder is created.
+        :return: The ImageTranscoder instance.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(max_size_mb)
+            return cls._instance
+
+    @staticmethod
+    def split_data_url(image: str) -> str:
+        """
+        Get the base64 data of an image.
+        :param image: The data URL or the base64 string of the image.
+        :return: The base64 string.
+        """
+        return re.sub("^data:image/.+;base64,", "", image)
+
+    @staticmethod
+    def _key(data: str, *target: Hashable) -> Tuple:
+        """
+        Get the cache key of the converted image.
+        :param data: The base64 string of the image.
+        :param target: The target of the conversion, e.g. the kind and the max size.
+        :return: The cache key.
+        """
+        return (hashlib.sha1(data.encode("ascii")).hexdigest(),) + target
+
+    def _get_or_convert(
+        self, key: Tuple, convert: Callable[[], Any], size_of: Callable[[Any], int]
+    ) -> Any:
+        """
+        Get the converted image from the cache, or convert and cache it.
+        :param key: The cache key.
+        :param convert: The function to convert the image.
+        :param size_of: The function to get the approximate size of the converted image in bytes.
+        :return: The converted image.
+        """
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key][0]
+            self.misses += 1
+
+        value = convert()
+        size = size_of(value)
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = (value, size)
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._cache.popitem(last=False)
+                self._bytes -= evicted_size
+
+        return value
+
+    @staticmethod
+    def _decode(data: str) -> Image.Image:
+        """
+        Decode the base64 string of an image.
+        :param data: The base64 string.
+        :return: The loaded image.
+        """
+        image = Image.open(io.BytesIO(base64.b64decode(data)))
+        image.load()
+        return image
+
+    @staticmethod
+    def _resize(image: Image.Image, max_size: int) -> Image.Image:
+        """
+        Resize the image to fit in a square of max_size, keeping its aspect ratio. Smaller images are not enlarged.
+        :param image: The image.
+        :param max_size: The max width and height.
+        :return: The resized image.
+        """
+        orig_width, orig_height = image.size
+        scale = min(max_size / orig_width, max_size / orig_height, 1)
+        new_width = int(orig_width * scale)
+        new_height = int(orig_height * scale)
+        return image.resize((new_width, new_height), Image.LANCZOS)
+
+    def to_image(self, image: str) -> Image.Image:
+        """
+        Decode an image to a PIL image, e.g. for Gemini. The cached image is shared, and must not be modified.
+        :param image: The data URL or the base64 string of the image.
+        :return: The PIL image.
+        """
+        data = self.split_data_url(image)
+        return self._get_or_convert(
+            self._key(data, "image"),
+            lambda: self._decode(data),
+            lambda value: value.width * value.height * len(value.getbands()),
+        )
+
+    def to_base64(self, image: str, max_size: int, format: str = "PNG") -> str:
+        """
+        Resize an image and encode it to base64, e.g. for Ollama and Qwen.
+        :param image: The data URL or the base64 string of the image.
+        :param max_size: The max width and height of the resized image.
+        :param format: The format of the resized image.
+        :return: The base64 string of the resized image.
+        """
+        data = self.split_data_url(image)
+
+        def convert() -> str:
+            buffer = io.BytesIO()
+            self._resize(self._decode(data), max_size).save(buffer, format=format)
+            return base64.b64encode(buffer.getvalue()).decode()
+
+        return self._get_or_convert(
+            self._key(data, "base64", max_size, format), convert, len
+        )
+
+    def to_data_url(self, image: str, max_size: int, format: str = "PNG") -> str:
+        """
+        Resize an image and encode it to a data URL.
+        :param image: The data URL or the base64 string of the image.
+        :param max_size: The max width and height of the resized image.
+        :param format: The format of the resized image.
+        :return: The data URL of the resized image.
+        """
+        return "data:image/{format};base64,{data}".format(
+            format=format.lower(), data=self.to_base64(image, max_size, format)
+        )
+
+    def to_file(
+        self,
+        image: str,
+        max_size: int,
+        folder: str,
+        format: str = "PNG",
+        max_files_mb: float = 64,
+    ) -> str:
+        """
+        Resize an image and save it to a file named by the hash of its content, e.g. for the services that upload
+        local files. The file is only written once, so the following steps sending the same image reuse it. The files
+        written are bounded by their total size, and the least recently used ones are deleted.
+        :param image: The data URL or the base64 string of the image.
+        :param max_size: The max width and height of the resized image.
+        :param folder: The folder of the file.
+        :param format: The format of the resized image.
+        :param max_files_mb: The max total size of the files written in MB.
+        :return: The path of the file.
+        """
+        data = self.to_base64(image, max_size, format)
+        file_path = os.path.join(
+            folder,
+            "{digest}.{extension}".format(
+                digest=self._key(data)[0], extension=format.lower()
+            ),
+        )
+
+        if not os.path.exists(file_path):
+            os.makedirs(folder, exist_ok=True)
+            # Write to a temporary file first, so that a concurrent request never reads a partial image.
+            temp_path = "{path}.{thread}.tmp".format(
+                path=file_path, thread=threading.get_ident()
+            )
+            with open(temp_path, "wb") as f:
+                f.write(base64.b64decode(data))
+            os.replace(temp_path, file_path)
+
+        self._track_file(file_path, int(max_files_mb * 1024 * 1024))
+
+        return file_path
+
+    def _track_file(self, file_path: str, max_bytes: int) -> None:
+        """
+        Mark a file written by to_file as the most recently used, and delete the least recently used files while the
+        files exceed the max size. The given file is never deleted.
+        :param file_path: The path of the file.
+        :param max_bytes: The max total size of the files in bytes.
+        """
+        with self._lock:
+            if file_path in self._files:
+                self._files.move_to_end(file_path)
+            else:
+                size = os.path.getsize(file_path)
+                self._files[file_path] = size
+                self._file_bytes += size
+
+            evicted = []
+            while self._file_bytes > max_bytes and len(self._files) > 1:
+                path, size = self._files.popitem(last=False)
+                self._file_bytes -= size
+                evicted.append(path)
+
+        for path in evicted:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def statistics(self) -> Dict[str, Any]:
+        """
+        Get the hit-rate statistics of the cache.
+        :return: The statistics.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._cache),
+                "bytes": self._bytes,
+            }
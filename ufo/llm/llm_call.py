@@ -1,18 +1,28 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import time
+
 from ufo.utils import print_with_color
 from ..config.config import Config
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
 
-from .base import BaseService
+from ..module.concurrency import SessionTimer
+from .base import ServiceRegistry, backoff_delay
+from .streaming import JSONFieldStream
 
 
 configs = Config.get_instance().config_data
 
+# The API types whose services stream the response deltas.
+STREAMING_API_TYPES = ["openai", "aoai", "azure_ad"]
+
 
 def get_completion(
-    messages, agent: str = "APP", use_backup_engine: bool = True
+    messages,
+    agent: str = "APP",
+    use_backup_engine: bool = True,
+    field_stream: Optional[JSONFieldStream] = None,
 ) -> Tuple[str, float]:
     """
     Get completion for the given messages.
@@ -21,6 +31,7 @@ def get_completion(
         messages (list): List of messages to be used for completion.
         agent (str, optional): Type of agent. Possible values are 'hostagent', 'appagent' or 'backup'.
         use_backup_engine (bool, optional): Flag indicating whether to use the backup engine or not.
+        field_stream (JSONFieldStream, optional): The consumer of the response deltas, see get_completions.
 
     Returns:
         tuple: A tuple containing the completion response (str) and the cost (float).
@@ -28,13 +39,21 @@ def get_completion(
     """
 
     responses, cost = get_completions(
-        messages, agent=agent, use_backup_engine=use_backup_engine, n=1
+        messages,
+        agent=agent,
+        use_backup_engine=use_backup_engine,
+        n=1,
+        field_stream=field_stream,
     )
     return responses[0], cost
 
 
 def get_completions(
-    messages, agent: str = "APP", use_backup_engine: bool = True, n: int = 1
+    messages,
+    agent: str = "APP",
+    use_backup_engine: bool = True,
+    n: int = 1,
+    field_stream: Optional[JSONFieldStream] = None,
 ) -> Tuple[list, float]:
     """
     Get completions for the given messages.
@@ -44,6 +63,8 @@ def get_completions(
         agent (str, optional): Type of agent. Possible values are 'hostagent', 'appagent' or 'BACKUP'.
         use_backup_engine (bool, optional): Flag indicating whether to use the backup engine or not.
         n (int, optional): Number of completions to generate.
+        field_stream (JSONFieldStream, optional): The consumer of the deltas of the first completion. The services
+            in STREAMING_API_TYPES stream the response, and the other services feed the whole response at the end.
 
     Returns:
         tuple: A tuple containing the completion responses (list of str) and the cost (float).
@@ -61,20 +82,122 @@ def get_completions(
     api_type = configs[agent_type]["API_TYPE"]
     try:
         api_type_lower = api_type.lower()
-        service = BaseService.get_service(api_type_lower)
-        if service:
-            response, cost = service(configs, agent_type=agent_type).chat_completion(
-                messages, n
+        streaming = field_stream is not None and api_type_lower in STREAMING_API_TYPES
+        stream_kwargs = (
+            {"stream": True, "on_delta": field_stream.feed} if streaming else {}
+        )
+
+        # The service is pooled per agent type, so that its HTTP connections are reused across steps.
+        with SessionTimer.track("llm"):
+            response, cost = ServiceRegistry.chat_completion(
+                configs, api_type_lower, agent_type, messages, n, **stream_kwargs
             )
-            return response, cost
-        else:
-            raise ValueError(f"API_TYPE {api_type} not supported")
+
+        if field_stream is not None and not streaming:
+            field_stream.feed(response[0])
+        return response, cost
     except Exception as e:
         if use_backup_engine:
             print_with_color(f"The API request of {agent_type} failed: {e}.", "red")
             print_with_color(f"Switching to use the backup engine...", "yellow")
+            if field_stream is not None:
+                field_stream.reset()
             return get_completions(
-                messages, agent="backup", use_backup_engine=False, n=n
+                messages,
+                agent="backup",
+                use_backup_engine=False,
+                n=n,
+                field_stream=field_stream,
             )
         else:
             raise e
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Check whether the error of an API request is caused by the rate limit of the endpoint.
+
+    Args:
+        error (Exception): The error raised by the service.
+
+    Returns:
+        bool: True if the request was rate limited.
+
+    """
+
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return any(
+        pattern in message
+        for pattern in ["rate limit", "ratelimit", "429", "too many requests"]
+    )
+
+
+def get_completions_with_backoff(
+    messages, agent: str = "APP", use_backup_engine: bool = True, n: int = 1
+) -> Tuple[list, float]:
+    """
+    Get completions for the given messages, retrying the rate-limited requests with exponential backoff and
+    jitter before falling back to the backup engine. It is used by the callers that send many requests at once,
+    e.g. the concurrent summarizers.
+
+    Args:
+        messages (list): List of messages to be used for completion.
+        agent (str, optional): Type of agent. Possible values are 'hostagent', 'appagent' or 'BACKUP'.
+        use_backup_engine (bool, optional): Flag indicating whether to use the backup engine when the request fails.
+        n (int, optional): Number of completions to generate.
+
+    Returns:
+        tuple: A tuple containing the completion responses (list of str) and the cost (float).
+
+    """
+
+    max_retry = configs.get("LLM_RATE_LIMIT_MAX_RETRY", 5)
+    base_delay = configs.get("LLM_RATE_LIMIT_BACKOFF", 2.0)
+
+    for attempt in range(max_retry + 1):
+        try:
+            return get_completions(messages, agent=agent, use_backup_engine=False, n=n)
+        except Exception as e:
+            if is_rate_limit_error(e) and attempt < max_retry:
+                delay = backoff_delay(attempt, base_delay)
+                print_with_color(
+                    f"The API request is rate limited, retrying in {delay:.1f}s...",
+                    "yellow",
+                )
+                time.sleep(delay)
+                continue
+
+            if use_backup_engine and agent.lower() != "backup":
+                print_with_color(f"The API request of {agent} failed: {e}.", "red")
+                print_with_color(f"Switching to use the backup engine...", "yellow")
+                return get_completions_with_backoff(
+                    messages, agent="backup", use_backup_engine=False, n=n
+                )
+            raise e
+
+
+def get_last_call_statistics() -> Dict[str, Any]:
+    """
+    Get the statistics of the last completion request made by the calling thread, to be read alongside its cost.
+
+    Returns:
+        dict: The agent and API type of the service, the latency, the success and the number of retries of the
+            request. For the services that send the n completions as concurrent requests, also the number of
+            completions and failures and the latency of each completion.
+    """
+
+    return ServiceRegistry.get_last_call_statistics()
+
+
+def get_service_statistics() -> Dict[str, Dict[str, Any]]:
+    """
+    Get the call latency and connection statistics of the pooled LLM services.
+
+    Returns:
+        dict: The statistics keyed by "{agent_type}/{api_type}", including the number of calls,
+            the per-call latency and, where available, the pool size and connection reuse count.
+    """
+
+    return ServiceRegistry.get_statistics()
@@ -1,16 +1,9 @@
-import base64
 import copy
-import io
 import json
-import time
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 
-import requests
-from PIL import Image
-
-from ufo.utils import print_with_color
-
-from .base import BaseService
+from .base import BaseService, HTTPSessionPool
+from .image_transcoder import ImageTranscoder
 
 
 class OllamaService(BaseService):
@@ -19,6 +12,12 @@ class OllamaService(BaseService):
         self.config = config
         self.max_retry = self.config["MAX_RETRY"]
         self.timeout = self.config["TIMEOUT"]
+        self.session = HTTPSessionPool.get_session(
+            self.config_llm["API_BASE"], self.config.get("LLM_CONNECTION_POOL_SIZE", 10)
+        )
+        self.transcoder = ImageTranscoder.get_instance(
+            self.config.get("IMAGE_TRANSCODE_CACHE_SIZE", 128)
+        )
 
     def chat_completion(
         self,
@@ -30,7 +29,7 @@ class OllamaService(BaseService):
         **kwargs: Any,
     ):
         """
-        Generates completions for a given list of messages.
+        Generates completions for a given list of messages. The n completions are requested concurrently.
 
         Args:
             messages (List[str]): The list of messages to generate completions for.
@@ -52,28 +51,22 @@ class OllamaService(BaseService):
         max_tokens = max_tokens if max_tokens is not None else self.config["MAX_TOKENS"]
         top_p = top_p if top_p is not None else self.config["TOP_P"]
 
-        responses = []
-
-        for i in range(n):
-            for _ in range(self.max_retry):
-                try:
-                    response = self._chat_completion(
-                        messages=messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        top_p=top_p,
-                        **kwargs,
-                    )
-                    responses.append(response)
-                    break
-                except Exception as e:
-                    print_with_color(f"Error making API request: {e}", "red")
-                    try:
-                        print_with_color(response, "red")
-                    except:
-                        _
-                    time.sleep(3)
-                    continue
+        # The images are resized once for the n requests.
+        processed_messages = self._process_messages(messages)
+
+        responses, _ = self.parallel_completions(
+            lambda: (
+                self._chat_completion(
+                    messages=processed_messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    top_p=top_p,
+                    **kwargs,
+                ),
+                None,
+            ),
+            n,
+        )
         return responses, None
 
     def _chat_completion(
@@ -88,7 +81,7 @@ class OllamaService(BaseService):
         Perform chat completion using the OpenAI API.
 
         Args:
-            messages: A list of message objects containing 'role' and 'content' keys.
+            messages: A list of processed message objects containing 'role' and 'content' keys.
             temperature: The temperature parameter controls the randomness of the output.
             max_tokens: The maximum number of tokens to generate in the response.
             top_p: The cumulative probability of the most likely tokens to include in the response.
@@ -103,7 +96,7 @@ class OllamaService(BaseService):
         api_endpoint = "/api/chat"
         payload = {
             "model": self.config_llm["API_MODEL"],
-            "messages": self._process_messages(messages),
+            "messages": messages,
             "format": "json",
             "options": {
                 "temperature": temperature,
@@ -123,7 +116,7 @@ class OllamaService(BaseService):
 
     def resize_base64_image(self, base64_str):
         """
-        Resize a base64 encoded image.
+        Resize a base64 encoded image. The resized image is cached, so it is only converted once.
 
         Args:
             base64_str (str): The base64 encoded image string.
@@ -131,21 +124,7 @@ class OllamaService(BaseService):
         Returns:
             str: The resized base64 encoded image string.
         """
-        image_data = base64.b64decode(base64_str)
-        image = Image.open(io.BytesIO(image_data))
-
-        orig_width, orig_height = image.size
-        max_size = 1024
-        scale_w = min(max_size / orig_width, 1)
-        scale_h = min(max_size / orig_height, 1)
-        scale = min(scale_w, scale_h)
-        new_width = int(orig_width * scale)
-        new_height = int(orig_height * scale)
-        image_resized = image.resize((new_width, new_height), Image.LANCZOS)
-        buffer = io.BytesIO()
-        image_resized.save(buffer, format="PNG")
-
-        return base64.b64encode(buffer.getvalue()).decode()
+        return self.transcoder.to_base64(base64_str, max_size=1024)
 
     def _process_messages(self, messages):
         """
@@ -188,7 +167,14 @@ class OllamaService(BaseService):
             Response: The response object returned by the API.
         """
         url = f"{self.config_llm['API_BASE']}{api_path}"
-        response = requests.post(
+        response = self.session.post(
             url=url, json=payload, timeout=self.timeout, stream=stream
         )
         return response
+
+    def connection_info(self) -> Dict[str, Any]:
+        """
+        Get the connection statistics of the shared keep-alive session.
+        :return: The connection statistics.
+        """
+        return HTTPSessionPool.connection_info(self.config_llm["API_BASE"])
@@ -5,8 +5,10 @@ import datetime
 import os
 import shutil
 import sys
-from typing import Any, Callable, Literal, Optional
+import threading
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
 
+import httpx
 import openai
 from openai import AzureOpenAI, OpenAI
 import functools
@@ -14,6 +16,63 @@ import functools
 from ufo.llm.base import BaseService
 
 
+class HTTPXConnectionStats:
+    """
+    The connection statistics of an httpx client, counted with its public event hooks. The requests are counted by a
+    response hook, and the connections by the "trace" extension that a request hook sets on each request, which
+    reports a TCP connect only when a new connection is opened.
+    """
+
+    CONNECT_EVENT = "connection.connect_tcp.complete"
+
+    def __init__(self) -> None:
+        """
+        Create a new HTTPXConnectionStats.
+        """
+        self.requests_sent = 0
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+
+    def attach(self, http_client: httpx.Client) -> None:
+        """
+        Count the requests and the connections of the client.
+        :param http_client: The httpx client.
+        """
+
+        def on_request(request: httpx.Request) -> None:
+            previous_trace = request.extensions.get("trace")
+
+            def trace(event_name: str, info: Dict[str, Any]) -> None:
+                if event_name == self.CONNECT_EVENT:
+                    with self._lock:
+                        self.connections_opened += 1
+                if previous_trace is not None:
+                    previous_trace(event_name, info)
+
+            request.extensions["trace"] = trace
+
+        def on_response(response: httpx.Response) -> None:
+            with self._lock:
+                self.requests_sent += 1
+
+        http_client.event_hooks["request"].append(on_request)
+        http_client.event_hooks["response"].append(on_response)
+
+    def to_dict(self) -> Dict[str, int]:
+        """
+        Get the connection statistics.
+        :return: The number of opened connections, requests and reused connections.
+        """
+        with self._lock:
+            return {
+                "connections_opened": self.connections_opened,
+                "requests_sent": self.requests_sent,
+                "connections_reused": max(
+                    self.requests_sent - self.connections_opened, 0
+                ),
+            }
+
+
 class OpenAIService(BaseService):
     """
     The OpenAI service class to interact with the OpenAI API.
@@ -30,6 +89,7 @@ class OpenAIService(BaseService):
         self.api_type = self.config_llm["API_TYPE"].lower()
         self.max_retry = self.config["MAX_RETRY"]
         self.prices = self.config["PRICES"]
+        self.pool_size = self.config.get("LLM_CONNECTION_POOL_SIZE", 10)
         assert self.api_type in ["openai", "aoai", "azure_ad"], "Invalid API type"
 
         self.client: OpenAI = OpenAIService.get_openai_client(
@@ -41,6 +101,7 @@ class OpenAIService(BaseService):
             self.config_llm.get("API_VERSION", ""),
             aad_api_scope_base=self.config_llm.get("AAD_API_SCOPE_BASE", ""),
             aad_tenant_id=self.config_llm.get("AAD_TENANT_ID", ""),
+            pool_size=self.pool_size,
         )
 
     def chat_completion(
@@ -51,6 +112,7 @@ class OpenAIService(BaseService):
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         top_p: Optional[float] = None,
+        on_delta: Optional[Callable[[str], None]] = None,
         **kwargs: Any,
     ):
         """
@@ -70,6 +132,8 @@ class OpenAIService(BaseService):
             top_p (float, optional): The top-p parameter for nucleus sampling.
                 It specifies the cumulative probability threshold for selecting the next token.
                 If not provided, the default value from the configuration will be used.
+            on_delta (Callable[[str], None], optional): The function called with each text delta of the first completion
+                when the response is streamed.
             **kwargs: Additional keyword arguments to pass to the OpenAI API.
 
         Returns:
@@ -87,6 +151,13 @@ class OpenAIService(BaseService):
         max_tokens = max_tokens if max_tokens is not None else self.config["MAX_TOKENS"]
         top_p = top_p if top_p is not None else self.config["TOP_P"]
 
+        if stream and self.api_type == "openai":
+            # Azure OpenAI only accepts the stream options from the 2024-05-01-preview API version. The pinned
+            # openai SDK has no stream_options parameter, so the options are sent in the request body.
+            extra_body = dict(kwargs.get("extra_body") or {})
+            extra_body.setdefault("stream_options", {"include_usage": True})
+            kwargs["extra_body"] = extra_body
+
         try:
             response: Any = self.client.chat.completions.create(
                 model=model,
@@ -99,6 +170,9 @@ class OpenAIService(BaseService):
                 **kwargs,
             )
 
+            if stream:
+                return self._consume_stream(response, model, n, on_delta)
+
             usage = response.usage
             prompt_tokens = usage.prompt_tokens
             completion_tokens = usage.completion_tokens
@@ -131,6 +205,49 @@ class OpenAIService(BaseService):
             # Handle API error, e.g. retry or log
             raise Exception(f"OpenAI API returned an API Error: {e}")
 
+    def _consume_stream(
+        self,
+        response: Any,
+        model: str,
+        n: int,
+        on_delta: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[List[str], float]:
+        """
+        Consume the chunks of a streamed response.
+        :param response: The stream of the chat completion chunks.
+        :param model: The model of the request.
+        :param n: The number of completions.
+        :param on_delta: The function called with each text delta of the first completion.
+        :return: The completions and the estimated cost. The cost is 0 if the stream does not report the usage.
+        """
+        contents = [[] for _ in range(n)]
+        cost = 0.0
+
+        for chunk in response:
+            for choice in chunk.choices:
+                delta = choice.delta.content if choice.delta is not None else None
+                if not delta:
+                    continue
+                contents[choice.index].append(delta)
+                if choice.index == 0 and on_delta is not None:
+                    on_delta(delta)
+
+            # The usage is reported in the last chunk, without choices. The SDK versions whose chunks have no usage
+            # field keep it as a raw dictionary.
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                if isinstance(usage, dict):
+                    prompt_tokens = usage.get("prompt_tokens", 0)
+                    completion_tokens = usage.get("completion_tokens", 0)
+                else:
+                    prompt_tokens = usage.prompt_tokens
+                    completion_tokens = usage.completion_tokens
+                cost = self.get_cost_estimator(
+                    self.api_type, model, self.prices, prompt_tokens, completion_tokens
+                )
+
+        return ["".join(content) for content in contents], cost
+
     @functools.lru_cache()
     @staticmethod
     def get_openai_client(
@@ -142,7 +259,17 @@ class OpenAIService(BaseService):
         api_version: Optional[str] = None,
         aad_api_scope_base: Optional[str] = None,
         aad_tenant_id: Optional[str] = None,
+        pool_size: int = 10,
     ) -> OpenAI:
+        # A long-lived HTTP client with keep-alive connections, shared by all the calls of the client.
+        connection_stats = HTTPXConnectionStats()
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            timeout=timeout,
+        )
+        connection_stats.attach(http_client)
         if api_type == "openai":
             assert api_key, "OpenAI API key must be specified"
             assert api_base, "OpenAI API base URL must be specified"
@@ -151,6 +278,7 @@ class OpenAIService(BaseService):
                 api_key=api_key,
                 max_retries=max_retry,
                 timeout=timeout,
+                http_client=http_client,
             )
         else:
             assert api_version, "Azure OpenAI API version must be specified"
@@ -162,6 +290,7 @@ class OpenAIService(BaseService):
                     api_version=api_version,
                     azure_endpoint=api_base,
                     api_key=api_key,
+                    http_client=http_client,
                 )
             else:
                 assert (
@@ -177,9 +306,22 @@ class OpenAIService(BaseService):
                     api_version=api_version,
                     azure_endpoint=api_base,
                     azure_ad_token_provider=token_provider,
+                    http_client=http_client,
                 )
+
+        client.connection_stats = connection_stats
         return client
 
+    def connection_info(self) -> Dict[str, Any]:
+        """
+        Get the connection information of the long-lived OpenAI client.
+        :return: The pool size, the number of opened connections, requests and reused connections.
+        """
+        connection_stats = getattr(self.client, "connection_stats", None)
+        if connection_stats is None:
+            return {"pool_size": self.pool_size}
+        return {"pool_size": self.pool_size, **connection_stats.to_dict()}
+
     @functools.lru_cache()
     @staticmethod
     def get_aad_token_provider(
@@ -1,18 +1,14 @@
-import base64
-import copy
-import io
+import atexit
 import json
 import os
 import shutil
-import time
 from http import HTTPStatus
-from typing import Any, Optional
+from typing import Any, Optional, Tuple
 
 import dashscope
-from PIL import Image
 
-from ufo.utils import print_with_color
 from ufo.llm.base import BaseService
+from ufo.llm.image_transcoder import ImageTranscoder
 
 
 class QwenService(BaseService):
@@ -23,8 +19,18 @@ class QwenService(BaseService):
         self.timeout = self.config["TIMEOUT"]
         self.api_type = self.config_llm["API_TYPE"].lower()
         self.prices = self.config["PRICES"]
+        self.model = self.config_llm["API_MODEL"]
         dashscope.api_key = self.config_llm["API_KEY"]
-        self.tmp_dir = None
+        self.transcoder = ImageTranscoder.get_instance(
+            self.config.get("IMAGE_TRANSCODE_CACHE_SIZE", 128)
+        )
+        self.image_data_url = self.config.get("QWEN_IMAGE_DATA_URL", False)
+        self.image_folder_size = self.config.get("QWEN_IMAGE_FOLDER_SIZE", 64)
+        self.tmp_dir = os.path.join(os.path.abspath("."), "tmp")
+
+        # The images are reused across the calls, and the folder is removed when the process exits.
+        if not self.image_data_url:
+            atexit.register(shutil.rmtree, self.tmp_dir, ignore_errors=True)
 
     def chat_completion(
         self,
@@ -36,7 +42,7 @@ class QwenService(BaseService):
         **kwargs: Any,
     ):
         """
-        Generates chat completions based on the given messages.
+        Generates chat completions based on the given messages. The n completions are requested concurrently.
         Args:
             messages (List[str]): List of messages in the conversation.
             n (int): Number of completions to generate.
@@ -55,113 +61,85 @@ class QwenService(BaseService):
         )
         max_tokens = max_tokens if max_tokens is not None else self.config["MAX_TOKENS"]
         top_p = top_p if top_p is not None else self.config["TOP_P"] + 1e-06
-        self.model = self.config_llm["API_MODEL"]
-
-        responses = []
-        cost = 0.0
 
-        for i in range(n):
-            for _ in range(self.max_retry):
-                try:
-                    response = dashscope.MultiModalConversation.call(
-                        model=self.model,
-                        messages=self.process_messages(messages),
-                        top_p=top_p,
-                    )
-                    if response.status_code == HTTPStatus.OK:
+        def complete() -> Tuple[str, float]:
+            response = dashscope.MultiModalConversation.call(
+                model=self.model,
+                messages=processed_messages,
+                top_p=top_p,
+            )
+            if response.status_code != HTTPStatus.OK:
+                raise ValueError(response.message)
 
-                        usage = response.usage
-                        _cost = self.get_cost_estimator(
-                            self.api_type,
-                            self.model,
-                            self.prices,
-                            usage["input_tokens"],
-                            (
-                                usage["output_tokens"] + usage["image_tokens"]
-                                if "image_tokens" in usage
-                                else usage["output_tokens"]
-                            ),
-                        )
+            usage = response.usage
+            cost = self.get_cost_estimator(
+                self.api_type,
+                self.model,
+                self.prices,
+                usage["input_tokens"],
+                (
+                    usage["output_tokens"] + usage["image_tokens"]
+                    if "image_tokens" in usage
+                    else usage["output_tokens"]
+                ),
+            )
 
-                        if (
-                            "Observation"
-                            not in response.output.choices[0].message.content[0]["text"]
-                        ):
-                            raise ValueError(
-                                response.output.choices[0].message.content[0]["text"]
-                            )
-                        else:
-                            shutil.rmtree(self.tmp_dir, ignore_errors=True)
-                            responses.append(
-                                response.output.choices[0].message.content[0][
-                                        "text"
-                                    ]
-                            )
-                            cost += _cost
-                            break
-                    else:
-                        raise ValueError(response.message)
-                except Exception as e:
-                    print_with_color(f"Error making API request: {e}", "red")
-                    print_with_color(str(response), "red")
-                    time.sleep(3)
-                    continue
+            text = response.output.choices[0].message.content[0]["text"]
+            if "Observation" not in text:
+                raise ValueError(text)
+            return text, cost
 
-        return responses, cost
+        processed_messages = self.process_messages(messages)
+        return self.parallel_completions(complete, n)
 
     def process_messages(self, messages):
         """
-        Process the given messages and save any images included in the content.
+        Convert the given messages to the DashScope format. The images are resized and saved to the tmp folder, named
+        by the hash of their content, and passed as file:// paths, which DashScope uploads. The folder is kept within
+        QWEN_IMAGE_FOLDER_SIZE MB by deleting the least recently used images. With QWEN_IMAGE_DATA_URL,
+        they are passed as base64 data URLs instead. The resized images are cached, so they are only converted once.
         Args:
             messages (list): A list of messages to process.
         Returns:
-            list: The processed messages with images saved.
-            Path: The path to the saved tmp images.
+            list: The processed messages. The given messages are not modified.
         """
-
-        def save_image_from_base64(base64_str, path, filename):
-            image_data = base64.b64decode(base64_str)
-            image = Image.open(io.BytesIO(image_data))
-            image_path = os.path.join(path, filename).replace(os.sep, "/")
-
-            # resize
-            orig_width, orig_height = image.size
-            max_size = 512
-            scale_w = min(max_size / orig_width, 1)
-            scale_h = min(max_size / orig_height, 1)
-            scale = min(scale_w, scale_h)
-            new_width = int(orig_width * scale)
-            new_height = int(orig_height * scale)
-            image_resized = image.resize((new_width, new_height), Image.LANCZOS)
-
-            image_resized.save(image_path)
-            return f"file://{image_path}"
-
-        # Create a temporary directory to store the images.
-        temp_dir = os.path.join(os.path.abspath("."), "tmp")
-        self.tmp_dir = temp_dir
-        os.makedirs(temp_dir, exist_ok=True)
-        _messages = copy.deepcopy(messages)
-        # Process messages and save images if any.
-        for i, message in enumerate(_messages):
-            message["content"] = (
+        _messages = []
+        for message in messages:
+            contents = (
                 message.get("content", [])
                 if isinstance(message["content"], list)
                 else [message["content"]]
             )
-            for j, content in enumerate(message["content"]):
+            _contents = []
+            for content in contents:
                 if isinstance(content, str):
-                    content = {"text": content}
-                    message["content"][j] = content
-                if content.get("type"):
-                    _ = content.pop("type")
-                if content.get("image_url"):
-                    img_data = content["image_url"]["url"].split(
-                        "data:image/png;base64,"
-                    )[1]
-                    filename = f"{i}_{j}.png"
-                    content["image"] = save_image_from_base64(
-                        img_data, temp_dir, filename
+                    _contents.append({"text": content})
+                elif content.get("image_url"):
+                    _contents.append(
+                        {"image": self.image_url(content["image_url"]["url"])}
+                    )
+                else:
+                    _contents.append(
+                        {key: value for key, value in content.items() if key != "type"}
                     )
-                    _ = content.pop("image_url")
-        return _messages
\ No newline at end of file
+            _messages.append({**message, "content": _contents})
+        return _messages
+
+    def image_url(self, image: str) -> str:
+        """
+        Get the DashScope image URL of a prompt image, resized to 512 pixels at most.
+        Args:
+            image (str): The data URL of the image.
+        Returns:
+            str: The file:// path of the resized image, or its base64 data URL with QWEN_IMAGE_DATA_URL.
+        """
+        if self.image_data_url:
+            return self.transcoder.to_data_url(image, max_size=512)
+
+        image_path = self.transcoder.to_file(
+            image,
+            max_size=512,
+            folder=self.tmp_dir,
+            max_files_mb=self.image_folder_size,
+        )
+        return "file://" + image_path.replace(os.sep, "/")
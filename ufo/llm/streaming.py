@@ -0,0 +1,199 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ufo.utils import print_with_color
+
+
+class IncrementalJSONParser:
+    """
+    The incremental parser of a JSON object streamed in text deltas. The top-level fields of the object are parsed
+    as soon as their value is closed, e.g. the "ControlLabel" of a response is available while the model is still
+    writing its "Plan" and "Comment". Each character is scanned once, and the text before the object, e.g. a
+    ```json fence, is skipped.
+    """
+
+    # The result of a text that is not valid JSON.
+    _INVALID = object()
+
+    def __init__(self) -> None:
+        """
+        Create a new IncrementalJSONParser.
+        """
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Reset the parser for a new object.
+        """
+        self.text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = "start"
+        self._key: Optional[str] = None
+        self._start = 0
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        """
+        Feed a text delta to the parser.
+        :param delta: The text delta.
+        :return: The top-level fields closed by the delta, in a format of [(key, value)].
+        """
+        self.text += delta
+        fields = []
+
+        text = self.text
+        for position in range(self._position, len(text)):
+            char = text[position]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == "key":
+                        self._key = self._loads(text[self._start : position + 1])
+                        self._state = "colon"
+                continue
+
+            if self._state == "start":
+                if char == "{":
+                    self._depth = 1
+                    self._state = "key"
+                continue
+            if self._state == "end":
+                break
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._state == "key":
+                    self._start = position
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._state == "value":
+                        self._close_value(text[self._start : position], fields)
+                    self._state = "end"
+            elif char == ":" and self._depth == 1 and self._state == "colon":
+                self._state = "value"
+                self._start = position + 1
+            elif char == "," and self._depth == 1 and self._state == "value":
+                self._close_value(text[self._start : position], fields)
+                self._state = "key"
+
+        self._position = len(text)
+        return fields
+
+    def _close_value(self, value: str, fields: List[Tuple[str, Any]]) -> None:
+        """
+        Parse the closed value of the current key. Values that are not valid JSON are skipped.
+        :param value: The text of the value.
+        :param fields: The closed fields to append to.
+        """
+        parsed = self._loads(value.strip())
+        if self._key is not None and parsed is not self._INVALID:
+            fields.append((self._key, parsed))
+        self._key = None
+
+    @classmethod
+    def _loads(cls, text: str) -> Any:
+        """
+        Parse a JSON text.
+        :param text: The JSON text.
+        :return: The parsed value, or _INVALID if it is not valid JSON.
+        """
+        try:
+            return json.loads(text)
+        except ValueError:
+            return cls._INVALID
+
+
+class JSONFieldStream:
+    """
+    The consumer of the streamed response of an agent. The deltas are parsed with an IncrementalJSONParser, and the
+    callbacks of a field are called as soon as the field is closed. The time to the first delta and to each field,
+    from the creation of the stream, is recorded for the step log.
+    """
+
+    def __init__(self) -> None:
+        """
+        Create a new JSONFieldStream.
+        """
+        self.parser = IncrementalJSONParser()
+        self._callbacks: Dict[str, List[Callable[[Any], None]]] = {}
+        self._reset_callbacks: List[Callable[[], None]] = []
+        self.start_time = time.time()
+        self.fields: Dict[str, Any] = {}
+        self.field_times: Dict[str, float] = {}
+        self.first_delta_time: Optional[float] = None
+
+    def on(self, key: str, callback: Callable[[Any], None]) -> None:
+        """
+        Register a callback of a field.
+        :param key: The key of the field, e.g. "ControlLabel".
+        :param callback: The function called with the value of the field when it is closed.
+        """
+        self._callbacks.setdefault(key, []).append(callback)
+
+    def on_reset(self, callback: Callable[[], None]) -> None:
+        """
+        Register a callback of the reset of the stream, e.g. to discard the work started from the fields of the
+        failed request.
+        :param callback: The function called when the stream is reset.
+        """
+        self._reset_callbacks.append(callback)
+
+    def feed(self, delta: str) -> None:
+        """
+        Feed a text delta of the response.
+        :param delta: The text delta.
+        """
+        if not delta:
+            return
+
+        if self.first_delta_time is None:
+            self.first_delta_time = time.time() - self.start_time
+
+        for key, value in self.parser.feed(delta):
+            self.fields[key] = value
+            self.field_times.setdefault(key, time.time() - self.start_time)
+
+            for callback in self._callbacks.get(key, []):
+                try:
+                    callback(value)
+                except Exception as e:
+                    print_with_color(f"Error in the callback of {key}: {e}", "yellow")
+
+    def reset(self) -> None:
+        """
+        Reset the stream when the request is retried, e.g. with the backup engine. The timings are kept, since
+        they are measured from the first request.
+        """
+        self.parser.reset()
+        self.fields.clear()
+
+        for callback in self._reset_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print_with_color(f"Error in the reset callback: {e}", "yellow")
+
+    def statistics(self) -> Dict[str, Any]:
+        """
+        Get the timings of the stream.
+        :return: The time to the first delta, to the first field and to each field, in seconds.
+        """
+        return {
+            "TimeToFirstToken": self.first_delta_time,
+            "TimeToFirstField": min(self.field_times.values(), default=None),
+            "FieldTimes": dict(self.field_times),
+        }
@@ -28,11 +28,16 @@ from ufo.agents.agent.app_agent import AppAgent
 from ufo.agents.agent.basic import BasicAgent
 from ufo.agents.agent.evaluation_agent import EvaluationAgent
 from ufo.agents.agent.host_agent import AgentFactory, HostAgent
+from ufo.agents.processors.basic import BaseProcessor
 from ufo.agents.states.basic import AgentState, AgentStatus
 from ufo.automator.ui_control.screenshot import PhotographerFacade
 from ufo.config.config import Config
 from ufo.experience.summarizer import ExperienceSummarizer
+from ufo.llm import llm_call
+from ufo.module.concurrency import DesktopLock
 from ufo.module.context import Context, ContextNames
+from ufo.module.log_writer import AsyncLogWriter, JSONLogFormatter, RequestImageStore
+from ufo.module.profiler import StepProfiler
 
 configs = Config.get_instance().config_data
 
@@ -109,8 +114,14 @@ class BaseRound(ABC):
 
             # If the subtask ends, capture the last snapshot of the application.
             if self.state.is_subtask_end():
-                time.sleep(configs["SLEEP_TIME"])
-                self.capture_last_snapshot(sub_round_id=self.subtask_amount)
+                with DesktopLock.hold():
+                    if configs.get("SETTLE_DETECTION", True):
+                        PhotographerFacade.wait_for_settle(
+                            self.application_window, configs["SLEEP_TIME"]
+                        )
+                    else:
+                        time.sleep(configs["SLEEP_TIME"])
+                    self.capture_last_snapshot(sub_round_id=self.subtask_amount)
                 self.subtask_amount += 1
 
         self.agent.blackboard.add_requests(
@@ -118,7 +129,8 @@ class BaseRound(ABC):
         )
 
         if self.application_window is not None:
-            self.capture_last_snapshot()
+            with DesktopLock.hold():
+                self.capture_last_snapshot()
 
         if self._should_evaluate:
             self.evaluation()
@@ -355,13 +367,53 @@ class BaseSession(ABC):
             round.run()
 
         if self.application_window is not None:
-            self.capture_last_snapshot()
+            with DesktopLock.hold():
+                self.capture_last_snapshot()
+
+        # Make sure all the screenshots and logs are on disk before they are read back by the evaluation and experience saving.
+        PhotographerFacade.flush_screenshots()
+        self.flush_logs()
+
+        profiler: Optional[StepProfiler] = self.context.get(ContextNames.PROFILER)
+        if profiler is not None:
+            profiler.save()
+
+        self.save_service_statistics()
 
         if self._should_evaluate and not self.is_error():
             self.evaluation()
 
+        self.context.get(ContextNames.PHASE_EXECUTOR).shutdown()
+
         self.print_cost()
 
+    def save_service_statistics(self) -> None:
+        """
+        Save the call latency and connection reuse statistics of the LLM services to llm_services.json in the log
+        folder. The services are shared by the sessions of a process, so the statistics are cumulative.
+        """
+        statistics = llm_call.get_service_statistics()
+        if not statistics:
+            return
+
+        with open(
+            os.path.join(self.log_path, "llm_services.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(statistics, f, indent=4)
+
+    def flush_logs(self) -> None:
+        """
+        Wait until the records of the session loggers are written to the log files.
+        """
+        for name in [
+            ContextNames.LOGGER,
+            ContextNames.REQUEST_LOGGER,
+            ContextNames.EVALUATION_LOGGER,
+        ]:
+            logger = self.context.get(name)
+            if logger is not None:
+                AsyncLogWriter.flush(logger)
+
     @abstractmethod
     def create_new_round(self) -> Optional[BaseRound]:
         """
@@ -402,7 +454,16 @@ class BaseSession(ABC):
 
         # Initialize the log path and the logger
         logger = self.initialize_logger(self.log_path, "response.log")
-        request_logger = self.initialize_logger(self.log_path, "request.log")
+        # The prompt images of the request log are stored once in a side folder, and referenced by their paths.
+        request_logger = self.initialize_logger(
+            self.log_path,
+            "request.log",
+            JSONLogFormatter(
+                RequestImageStore(self.log_path)
+                if configs.get("REQUEST_LOG_IMAGE_STORE", True)
+                else None
+            ),
+        )
         eval_logger = self.initialize_logger(self.log_path, "evaluation.log")
 
         self.context.set(ContextNames.LOG_PATH, self.log_path)
@@ -411,6 +472,18 @@ class BaseSession(ABC):
         self.context.set(ContextNames.REQUEST_LOGGER, request_logger)
         self.context.set(ContextNames.EVALUATION_LOGGER, eval_logger)
 
+        # Initialize the step-phase profiler, which saves the profile next to the response log.
+        if configs.get("STEP_PROFILER", True):
+            profiler = StepProfiler(
+                self.log_path, track_memory=configs.get("STEP_PROFILER_MEMORY", False)
+            )
+            self.context.set(ContextNames.PROFILER, profiler)
+
+        # Initialize the thread pool of the session to run the independent phases of the steps in parallel.
+        self.context.set(
+            ContextNames.PHASE_EXECUTOR, BaseProcessor.create_phase_executor()
+        )
+
         # Initialize the session cost and step
         self.context.set(ContextNames.SESSION_COST, 0)
         self.context.set(ContextNames.SESSION_STEP, 0)
@@ -525,9 +598,6 @@ class BaseSession(ABC):
 
         experience_path = configs["EXPERIENCE_SAVED_PATH"]
         utils.create_folder(experience_path)
-        summarizer.create_or_update_yaml(
-            summaries, os.path.join(experience_path, "experience.yaml")
-        )
         summarizer.create_or_update_vector_db(
             summaries, os.path.join(experience_path, "experience_db")
         )
@@ -643,11 +713,16 @@ class BaseSession(ABC):
                     app_agent.Puppeteer.save_to_xml(xml_save_path)
 
     @staticmethod
-    def initialize_logger(log_path: str, log_filename: str) -> logging.Logger:
+    def initialize_logger(
+        log_path: str,
+        log_filename: str,
+        formatter: Optional[logging.Formatter] = None,
+    ) -> logging.Logger:
         """
-        Initialize logging.
+        Initialize logging. With ASYNC_LOGGING, the records are written to the log file in a background thread.
         log_path: The path of the log file.
         log_filename: The name of the log file.
+        formatter: The formatter of the records, the message as is by default.
         return: The logger.
         """
         # Code for initializing logging
@@ -659,9 +734,11 @@ class BaseSession(ABC):
 
         log_file_path = os.path.join(log_path, log_filename)
         file_handler = logging.FileHandler(log_file_path, encoding="utf-8")
-        formatter = logging.Formatter("%(message)s")
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        file_handler.setFormatter(formatter or logging.Formatter("%(message)s"))
+        if configs.get("ASYNC_LOGGING", True):
+            AsyncLogWriter.attach(logger, file_handler)
+        else:
+            logger.addHandler(file_handler)
         logger.setLevel(configs["LOG_LEVEL"])
 
         return logger
@@ -1,10 +1,23 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
 
-from typing import List
-
+from ufo import utils
+from ufo.config.config import Config
+from ufo.llm import llm_call
 from ufo.module.basic import BaseSession
+from ufo.module.concurrency import SessionTimer, initialize_com
+
+configs = Config.get_instance().config_data
+
+MAX_CONCURRENT_SESSIONS = max(1, int(configs.get("MAX_CONCURRENT_SESSIONS", 1)))
 
 
 class UFOClientManager:
@@ -12,20 +25,125 @@ class UFOClientManager:
     The manager for the UFO clients.
     """
 
-    def __init__(self, session_list: List[BaseSession]) -> None:
+    def __init__(
+        self,
+        session_list: List[BaseSession],
+        max_concurrency: int = MAX_CONCURRENT_SESSIONS,
+    ) -> None:
         """
         Initialize a batch UFO client.
+        :param session_list: The sessions to run.
+        :param max_concurrency: The maximum number of sessions running at the same time.
         """
 
         self._session_list = session_list
+        self._max_concurrency = max(1, max_concurrency)
+        self._session_reports: List[Dict[str, Any]] = []
+        self._report_lock = threading.Lock()
 
     def run_all(self) -> None:
         """
-        Run the batch UFO client.
+        Run the batch UFO client. With a concurrency limit above 1, the sessions run in a thread pool: their LLM calls
+        overlap, while their UI phases are serialized by the desktop lock.
+        """
+
+        start_time = time.time()
+        sessions = list(self.session_list)
+
+        if self._max_concurrency == 1 or len(sessions) <= 1:
+            for session in sessions:
+                self._run_session(session, catch_errors=False)
+        else:
+            with ThreadPoolExecutor(
+                max_workers=self._max_concurrency,
+                thread_name_prefix="UFOSession",
+                initializer=initialize_com,
+            ) as executor:
+                list(executor.map(self._run_session, sessions))
+
+        if len(sessions) > 1:
+            self.report_throughput(time.time() - start_time)
+
+    def _run_session(self, session: BaseSession, catch_errors: bool = True) -> None:
+        """
+        Run a session and record its time spent in the LLM and UI phases.
+        :param session: The session to run.
+        :param catch_errors: Whether to catch the error of the session, so that the other sessions keep running.
         """
 
-        for session in self.session_list:
+        SessionTimer.reset()
+        start_time = time.time()
+        error = None
+
+        try:
             session.run()
+        except Exception as e:
+            if not catch_errors:
+                raise
+            error = str(e)
+            utils.print_with_color(
+                f"Session {session.log_path} failed: {e}\n{traceback.format_exc()}",
+                "red",
+            )
+        finally:
+            phases = SessionTimer.snapshot()
+            with self._report_lock:
+                self._session_reports.append(
+                    {
+                        "session": session.log_path,
+                        "wall_time": time.time() - start_time,
+                        "llm_time": phases.get("llm", 0.0),
+                        "ui_time": phases.get("ui", 0.0),
+                        "desktop_wait_time": phases.get("desktop_wait", 0.0),
+                        "error": error,
+                    }
+                )
+
+    def report_throughput(self, wall_time: float) -> Dict[str, Any]:
+        """
+        Print the throughput of the batch and save it to throughput.json in the common log folder of the sessions.
+        :param wall_time: The wall time of the batch.
+        :return: The throughput report.
+        """
+
+        with self._report_lock:
+            sessions = list(self._session_reports)
+
+        report = {
+            "sessions": len(sessions),
+            "failed_sessions": sum(1 for session in sessions if session["error"]),
+            "max_concurrency": self._max_concurrency,
+            "wall_time": wall_time,
+            "sessions_per_hour": len(sessions) / wall_time * 3600 if wall_time else 0.0,
+            "llm_time": sum(session["llm_time"] for session in sessions),
+            "ui_time": sum(session["ui_time"] for session in sessions),
+            "desktop_wait_time": sum(
+                session["desktop_wait_time"] for session in sessions
+            ),
+            "llm_services": llm_call.get_service_statistics(),
+            "session_reports": sessions,
+        }
+
+        utils.print_with_color(
+            "Finished {sessions} sessions in {wall_time:.1f}s ({rate:.1f} sessions/hour), "
+            "LLM wait {llm:.1f}s, UI {ui:.1f}s, desktop lock wait {wait:.1f}s.".format(
+                sessions=report["sessions"],
+                wall_time=wall_time,
+                rate=report["sessions_per_hour"],
+                llm=report["llm_time"],
+                ui=report["ui_time"],
+                wait=report["desktop_wait_time"],
+            ),
+            "yellow",
+        )
+
+        log_paths = [os.path.abspath(session["session"]) for session in sessions]
+        if log_paths:
+            report_path = os.path.join(os.path.commonpath(log_paths), "throughput.json")
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=4)
+
+        return report
 
     @property
     def session_list(self) -> List[BaseSession]:
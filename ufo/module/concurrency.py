@@ -0,0 +1,189 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+This module contains the primitives to run multiple sessions concurrently on a single desktop.
+
+Sessions spend most of their time waiting for LLM responses, which can overlap freely. The phases that read or
+change the desktop (screenshots, control inspection, action execution) are serialized by the DesktopLock, and the
+time spent in each phase is accumulated per session by the SessionTimer. Independent LLM calls of a single
+session, e.g. the summaries of the log partitions, are mapped over a bounded thread pool by iter_ordered. The worker
+threads that use the UI Automation objects initialize COM with initialize_com.
+"""
+
+import collections
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class SessionTimer:
+    """
+    The per-thread accumulator of the time spent by the running session in each phase, e.g. "llm" and "ui".
+    A session runs in a single thread, so the timer of the thread is the timer of the session. The tasks the session
+    runs in a thread pool are bound to the buckets of the session, so that their time is accumulated in them too.
+    """
+
+    _local = threading.local()
+    _lock = threading.Lock()
+
+    @classmethod
+    def _buckets(cls) -> Dict[str, float]:
+        """
+        Get the time buckets of the current thread.
+        :return: The time buckets.
+        """
+        if not hasattr(cls._local, "buckets"):
+            cls._local.buckets = {}
+        return cls._local.buckets
+
+    @classmethod
+    def add(cls, phase: str, seconds: float) -> None:
+        """
+        Add the time spent in a phase.
+        :param phase: The name of the phase.
+        :param seconds: The time spent.
+        """
+        buckets = cls._buckets()
+        with cls._lock:
+            buckets[phase] = buckets.get(phase, 0.0) + seconds
+
+    @classmethod
+    @contextmanager
+    def track(cls, phase: str) -> Iterator[None]:
+        """
+        Track the time spent in the block as a phase.
+        :param phase: The name of the phase.
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            cls.add(phase, time.time() - start_time)
+
+    @classmethod
+    def reset(cls) -> None:
+        """
+        Reset the timer of the current thread.
+        """
+        cls._local.buckets = {}
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, float]:
+        """
+        Get the time spent in each phase by the current thread.
+        :return: The time spent in each phase.
+        """
+        with cls._lock:
+            return dict(cls._buckets())
+
+    @classmethod
+    def current(cls) -> Dict[str, float]:
+        """
+        Get the time buckets of the current thread, to bind a task of the session to them.
+        :return: The time buckets.
+        """
+        return cls._buckets()
+
+    @classmethod
+    @contextmanager
+    def bind(cls, buckets: Dict[str, float]) -> Iterator[None]:
+        """
+        Accumulate the time spent by the current thread in the block into the given buckets, e.g. the buckets of the
+        session that submitted the task to a thread pool.
+        :param buckets: The time buckets.
+        """
+        previous = getattr(cls._local, "buckets", None)
+        cls._local.buckets = buckets
+        try:
+            yield
+        finally:
+            if previous is None:
+                del cls._local.buckets
+            else:
+                cls._local.buckets = previous
+
+
+class DesktopLock:
+    """
+    The process-wide lock of the desktop. Only one session at a time may capture, inspect or operate the UI.
+    The lock is reentrant, so that nested UI phases of the same session do not block each other.
+    """
+
+    _lock = threading.RLock()
+    _local = threading.local()
+
+    @classmethod
+    @contextmanager
+    def hold(cls) -> Iterator[None]:
+        """
+        Hold the desktop lock in the block. The time waiting for the lock is recorded as "desktop_wait"
+        and the time holding it as "ui" in the SessionTimer.
+        """
+        depth = getattr(cls._local, "depth", 0)
+
+        start_time = time.time()
+        cls._lock.acquire()
+        acquired_time = time.time()
+        cls._local.depth = depth + 1
+
+        try:
+            yield
+        finally:
+            cls._local.depth = depth
+            cls._lock.release()
+
+            # Only the outermost hold is recorded, to avoid counting nested phases twice.
+            if depth == 0:
+                SessionTimer.add("desktop_wait", acquired_time - start_time)
+                SessionTimer.add("ui", time.time() - acquired_time)
+
+
+def initialize_com() -> None:
+    """
+    Initialize COM in the current thread, with the threading model pywinauto uses in the main thread, so that the
+    thread can use the UI Automation objects. It is the initializer of the worker threads of the sessions and of their
+    phases. It does nothing where COM is not available.
+    """
+    try:
+        import pythoncom
+    except ImportError:
+        return
+
+    pythoncom.CoInitializeEx(
+        getattr(sys, "coinit_flags", pythoncom.COINIT_MULTITHREADED)
+    )
+
+
+def iter_ordered(
+    func: Callable[[T], R], items: Iterable[T], max_workers: int = 1
+) -> Iterator[R]:
+    """
+    Map the function over the items in a bounded thread pool and yield the results in the order of the items.
+    At most 2 * max_workers items are taken from the iterable ahead of the yielded results, so a streamed
+    iterable is never fully loaded. With max_workers <= 1, the items are mapped serially in the calling thread.
+    :param func: The function to map.
+    :param items: The items.
+    :param max_workers: The max number of concurrent calls.
+    :return: The generator of the results.
+    """
+    if max_workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
@@ -47,6 +47,8 @@ class ContextNames(Enum):
         "CURRENT_ROUND_SUBTASK_AMOUNT"  # The amount of subtasks in the current round
     )
     STRUCTURAL_LOGS = "STRUCTURAL_LOGS"  # The structural logs of the session
+    PROFILER = "PROFILER"  # The step-phase profiler of the session
+    PHASE_EXECUTOR = "PHASE_EXECUTOR"  # The thread pool of the session to run the step phases in parallel
 
     @property
     def default_value(self) -> Any:
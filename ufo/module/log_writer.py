@@ -0,0 +1,252 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+The background writer of the session logs.
+
+The records of a session logger are put in a queue by the step loop, and formatted and written to the log file by a
+listener thread, so that a step does not wait for the log file. The request log stores each prompt image once, by
+the hash of its content, in a side folder, and the JSON of the request references the image by its path.
+"""
+
+import atexit
+import base64
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+REQUEST_IMAGE_FOLDER = "request_images"
+
+_DATA_URL_PATTERN = re.compile(r"^data:image/(?P<format>[\w.+-]+);base64,")
+
+
+def _snapshot(obj: Any) -> Any:
+    """
+    Copy the containers of a JSON object, so that the changes the caller makes after logging it are not logged. The
+    strings, e.g. the images, are immutable, so they are shared rather than copied.
+    :param obj: The JSON object.
+    :return: The copy of the JSON object.
+    """
+    if isinstance(obj, dict):
+        return {key: _snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_snapshot(value) for value in obj]
+    return obj
+
+
+class RequestImageStore:
+    """
+    The side store of the images of the request log. Each image is saved once as a file named by the hash of its
+    content, e.g. request_images/<sha1>.png, so the screenshots repeated across the steps are only stored once.
+    """
+
+    def __init__(self, log_path: str) -> None:
+        """
+        Create a new RequestImageStore.
+        :param log_path: The log folder of the session.
+        """
+        self.log_path = log_path
+        self.folder = os.path.join(log_path, REQUEST_IMAGE_FOLDER)
+        self._saved = set()
+
+    def reference(self, data_url: str) -> str:
+        """
+        Save the image of a data URL if it is not saved yet.
+        :param data_url: The data URL of the image.
+        :return: The path of the image file, relative to the log folder.
+        """
+        match = _DATA_URL_PATTERN.match(data_url)
+        data = data_url[match.end() :]
+        extension = match.group("format").lower().replace("jpeg", "jpg")
+
+        name = "{digest}.{extension}".format(
+            digest=hashlib.sha1(data.encode("ascii")).hexdigest(), extension=extension
+        )
+        path = f"{REQUEST_IMAGE_FOLDER}/{name}"
+
+        if name not in self._saved:
+            file_path = os.path.join(self.folder, name)
+            if not os.path.exists(file_path):
+                os.makedirs(self.folder, exist_ok=True)
+                # Write to a temporary file first, so that a reader never sees a partial image.
+                with open(file_path + ".tmp", "wb") as f:
+                    f.write(base64.b64decode(data))
+                os.replace(file_path + ".tmp", file_path)
+            self._saved.add(name)
+
+        return path
+
+    def dereference(self, obj: Any) -> Any:
+        """
+        Replace the data URLs in a JSON object with the paths of their image files.
+        :param obj: The JSON object.
+        :return: The JSON object with the image paths. The given object is not modified.
+        """
+        if isinstance(obj, str):
+            return self.reference(obj) if _DATA_URL_PATTERN.match(obj) else obj
+        if isinstance(obj, dict):
+            return {key: self.dereference(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [self.dereference(value) for value in obj]
+        return obj
+
+    @staticmethod
+    def restore(obj: Any, log_path: str) -> Any:
+        """
+        Replace the image paths in a JSON object read from the request log with the data URLs of the images.
+        :param obj: The JSON object.
+        :param log_path: The log folder of the session.
+        :return: The JSON object with the data URLs.
+        """
+        if isinstance(obj, str):
+            if not obj.startswith(REQUEST_IMAGE_FOLDER + "/"):
+                return obj
+            file_path = os.path.join(log_path, obj)
+            if not os.path.isfile(file_path):
+                return obj
+
+            extension = os.path.splitext(obj)[1][1:].replace("jpg", "jpeg")
+            with open(file_path, "rb") as f:
+                data = base64.b64encode(f.read()).decode("ascii")
+            return f"data:image/{extension};base64,{data}"
+
+        if isinstance(obj, dict):
+            return {
+                key: RequestImageStore.restore(value, log_path)
+                for key, value in obj.items()
+            }
+        if isinstance(obj, list):
+            return [RequestImageStore.restore(value, log_path) for value in obj]
+        return obj
+
+
+class JSONLogFormatter(logging.Formatter):
+    """
+    The formatter of the logs whose messages are JSON objects. The message is serialized to a JSON line when the record
+    is written, in the writer thread. With an image store, the images of the message are replaced by their paths.
+    """
+
+    def __init__(self, image_store: Optional[RequestImageStore] = None) -> None:
+        """
+        Create a new JSONLogFormatter.
+        :param image_store: The store of the images of the messages. The images are kept inline if None.
+        """
+        super().__init__("%(message)s")
+        self.image_store = image_store
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Format the record as a JSON line. Messages that are not JSON objects are formatted as is.
+        :param record: The log record.
+        :return: The formatted record.
+        """
+        if not isinstance(record.msg, (dict, list)):
+            return super().format(record)
+
+        message = record.msg
+        if self.image_store is not None:
+            message = self.image_store.dereference(message)
+        return json.dumps(message)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    The queue handler that sends the records to the handler of a log file, through the queue of the AsyncLogWriter.
+    The formatting of the records is deferred to the writer thread, and the JSON messages are copied when they are
+    logged, as the callers keep changing them, e.g. the memory of the step.
+    """
+
+    def __init__(self, log_queue: queue.Queue, target: logging.Handler) -> None:
+        """
+        Create a new _DeferredQueueHandler.
+        :param log_queue: The queue of the records.
+        :param target: The handler of the log file.
+        """
+        super().__init__(log_queue)
+        self.target = target
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Route the record to the handler of the log file, and keep it unformatted. The JSON message is copied, so that
+        the message written is the message at the time it is logged.
+        :param record: The log record.
+        :return: The record to enqueue.
+        """
+        record = copy.copy(record)
+        if isinstance(record.msg, (dict, list)):
+            record.msg = _snapshot(record.msg)
+        record.log_handler = self.target
+        return record
+
+
+class _RoutingHandler(logging.Handler):
+    """
+    The handler of the writer thread, which writes each record with the handler of its log file.
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        """
+        Write the record with the handler of its log file.
+        :param record: The log record.
+        :return: Whether the record was handled.
+        """
+        return record.log_handler.handle(record)
+
+
+class AsyncLogWriter:
+    """
+    The background writer of the session loggers. The records of all the loggers are enqueued by QueueHandlers, and
+    written by the handlers of their log files in a single QueueListener thread shared by the sessions.
+    """
+
+    _queue: queue.Queue = queue.Queue()
+    _listener: Optional[QueueListener] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def attach(cls, logger: logging.Logger, handler: logging.Handler) -> None:
+        """
+        Write the records of the logger with the handler in the background thread.
+        :param logger: The logger.
+        :param handler: The handler of the log file.
+        """
+        with cls._lock:
+            if cls._listener is None:
+                cls._listener = QueueListener(cls._queue, _RoutingHandler())
+                cls._listener.start()
+
+        logger.addHandler(_DeferredQueueHandler(cls._queue, handler))
+
+    @classmethod
+    def flush(cls, logger: Optional[logging.Logger] = None) -> None:
+        """
+        Wait until the enqueued records are written, e.g. before a log file is read back.
+        :param logger: The logger whose log files are flushed to disk. All the enqueued records are written anyway.
+        """
+        cls._queue.join()
+
+        if logger is not None:
+            for handler in logger.handlers:
+                if isinstance(handler, _DeferredQueueHandler):
+                    handler.target.flush()
+
+    @classmethod
+    def stop(cls) -> None:
+        """
+        Write the enqueued records and stop the writer thread. It is restarted by the next attached logger.
+        """
+        with cls._lock:
+            if cls._listener is not None:
+                cls._listener.stop()
+                cls._listener = None
+
+
+# Write the remaining records when the process exits.
+atexit.register(AsyncLogWriter.stop)
@@ -0,0 +1,98 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import threading
+from typing import Any, Dict, Hashable, Optional
+
+
+class RetrievalCache:
+    """
+    The memo of the retrieval results of an agent. All the steps of a subtask retrieve with the same query, so the
+    results are retrieved at the first step and reused by the following ones. The cache is scoped: it is invalidated
+    when the scope, e.g. the round and the subtask, changes.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        """
+        Create a new RetrievalCache.
+        :param enabled: Whether to memoize the results. A disabled cache retrieves every time and counts the misses.
+        """
+        self.enabled = enabled
+        self._results: Dict[Hashable, Any] = {}
+        self._scope: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def set_scope(self, scope: Hashable) -> None:
+        """
+        Set the scope of the cache, invalidating the cached results if the scope changes.
+        :param scope: The scope, e.g. (round number, subtask).
+        """
+        with self._lock:
+            if scope != self._scope:
+                self._results.clear()
+                self._scope = scope
+
+    def invalidate(self) -> None:
+        """
+        Drop all the cached results.
+        """
+        with self._lock:
+            self._results.clear()
+
+    def retrieve(
+        self,
+        retriever: Any,
+        query: str,
+        top_k: int,
+        filter_key: Hashable = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Retrieve the documents with the retriever, or get them from the cache.
+        :param retriever: The retriever.
+        :param query: The query.
+        :param top_k: The number of documents to retrieve.
+        :param filter_key: The key of the filter and the other arguments of the retrieval, since the filters are
+        functions that cannot be compared.
+        :param kwargs: The other arguments of the retrieval, e.g. the filter.
+        :return: The retrieved documents.
+        """
+        key = (id(retriever), query, top_k, filter_key)
+
+        with self._lock:
+            if self.enabled and key in self._results:
+                self.hits += 1
+                return self._results[key][1]
+
+        documents = retriever.retrieve(query, top_k, **kwargs)
+
+        with self._lock:
+            self.misses += 1
+            if self.enabled:
+                # Keep the retriever alive with its results, so that its id is not reused by another retriever.
+                self._results[key] = (retriever, documents)
+
+        return documents
+
+    def reset_statistics(self) -> None:
+        """
+        Reset the hit and miss counters, e.g. at the start of a step.
+        """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def get_statistics(self) -> Dict[str, int]:
+        """
+        Get the hit and miss counters since the last reset, and the number of cached results.
+        :return: The statistics.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._results),
+            }
@@ -0,0 +1,62 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import functools
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from ufo.utils import get_hugginface_embedding
+from ufo.utils.embedding_cache import EmbeddingCache
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    The embeddings of the RAG retrievers, backed by the shared EmbeddingCache of the model.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str) -> None:
+        """
+        Create a new CachedEmbeddings.
+        :param embeddings: The underlying embeddings.
+        :param model_name: The name of the embedding model.
+        """
+        self.embeddings = embeddings
+        self.cache = EmbeddingCache(model_name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed the documents. Only the documents that are not cached are embedded.
+        :param texts: The texts of the documents.
+        :return: The embeddings of the documents.
+        """
+        if not texts:
+            return []
+        return self.cache.encode(list(texts), self.embeddings.embed_documents).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed the query.
+        :param text: The query.
+        :return: The embedding of the query.
+        """
+        return self.cache.encode(
+            text, lambda texts: [self.embeddings.embed_query(texts[0])]
+        ).tolist()
+
+
+@functools.lru_cache(maxsize=5)
+def get_retriever_embedding(
+    model_name: str = "sentence-transformers/all-mpnet-base-v2",
+) -> Embeddings:
+    """
+    Get the embeddings for the RAG indexers, wrapped with the embedding cache if it is enabled.
+    :param model_name: The name of the embedding model.
+    :return: The embeddings.
+    """
+    embeddings = get_hugginface_embedding(model_name)
+
+    if not EmbeddingCache.is_enabled():
+        return embeddings
+
+    return CachedEmbeddings(embeddings, model_name)
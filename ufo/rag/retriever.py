@@ -1,13 +1,20 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
 
 from langchain_community.vectorstores import FAISS
 
 from ufo.config.config import get_offline_learner_indexer_config
+from ufo.experience.store import ExperienceStore
 from ufo.rag import web_search
-from ufo.utils import print_with_color, get_hugginface_embedding
+from ufo.rag.embeddings import get_retriever_embedding
+from ufo.utils import print_with_color
+
 
 class RetrieverFactory:
     """
@@ -33,6 +40,165 @@ class RetrieverFactory:
             raise ValueError("Invalid retriever type: {}".format(retriever_type))
 
 
+class IndexRegistry:
+    """
+    The process-wide registry of the FAISS indexes. Each index folder is loaded once per process and shared read-only
+    by the retrievers of all the agents and sessions. An index is reloaded only when its files on disk are modified.
+    The folders of an ExperienceStore are loaded with the summaries appended since its snapshot, and whether the store
+    is partitioned is read when it is loaded.
+    """
+
+    _indexes: Dict[str, Dict[str, Any]] = {}
+    _locks: Dict[str, threading.Lock] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _modified_time(path: str, index_name: str) -> Optional[float]:
+        """
+        Get the last modified time of the index files.
+        :param path: The folder of the index.
+        :param index_name: The name of the index files.
+        :return: The last modified time, or None if the index files do not exist.
+        """
+        if ExperienceStore.exists(path):
+            return ExperienceStore(path).modified_time()
+
+        try:
+            return max(
+                os.path.getmtime(os.path.join(path, f"{index_name}.{extension}"))
+                for extension in ["faiss", "pkl"]
+            )
+        except OSError:
+            return None
+
+    @staticmethod
+    def _memory_footprint(db: FAISS, path: str, index_name: str) -> Dict[str, int]:
+        """
+        Estimate the memory footprint of a loaded index.
+        :param db: The loaded index.
+        :param path: The folder of the index.
+        :param index_name: The name of the index files.
+        :return: The number of vectors, and the estimated bytes of the vectors and of the document store.
+        """
+        index = db.index
+        try:
+            code_size = index.sa_code_size()
+        except Exception:
+            code_size = index.d * 4
+
+        docstore_path = os.path.join(path, f"{index_name}.pkl")
+
+        return {
+            "vectors": index.ntotal,
+            "index_bytes": index.ntotal * code_size,
+            "docstore_bytes": (
+                os.path.getsize(docstore_path) if os.path.exists(docstore_path) else 0
+            ),
+        }
+
+    @classmethod
+    def load(cls, path: str, index_name: str = "index") -> FAISS:
+        """
+        Get the index of the folder, loading it only if it has not been loaded or it has been modified on disk.
+        :param path: The folder of the index.
+        :param index_name: The name of the index files.
+        :return: The loaded index.
+        """
+        key = os.path.abspath(os.path.join(path, index_name))
+
+        with cls._lock:
+            lock = cls._locks.setdefault(key, threading.Lock())
+
+        # Load each index only once even if several agents request it at the same time.
+        with lock:
+            modified_time = cls._modified_time(path, index_name)
+            entry = cls._indexes.get(key)
+
+            if (
+                entry is not None
+                and modified_time is not None
+                and entry["modified_time"] == modified_time
+            ):
+                entry["hits"] += 1
+                return entry["db"]
+
+            start_time = time.time()
+            if ExperienceStore.exists(path):
+                db = ExperienceStore(path).load(get_retriever_embedding())
+            else:
+                # The indexes are saved by the learner, the compaction or an earlier version of UFO, so their
+                # docstores are trusted.
+                db = FAISS.load_local(
+                    path,
+                    get_retriever_embedding(),
+                    index_name=index_name,
+                    allow_dangerous_deserialization=True,
+                )
+            load_time = time.time() - start_time
+
+            footprint = cls._memory_footprint(db, path, index_name)
+            cls._indexes[key] = {
+                "db": db,
+                "modified_time": modified_time,
+                "load_time": load_time,
+                "loads": entry["loads"] + 1 if entry is not None else 1,
+                "hits": entry["hits"] if entry is not None else 0,
+                "partitioned": ExperienceStore(path).is_partitioned(),
+                **footprint,
+            }
+
+            print_with_color(
+                "{action} index {path} in {load_time:.2f}s: {vectors} vectors, {size:.1f} MB.".format(
+                    action="Reloaded" if entry is not None else "Loaded",
+                    path=path,
+                    load_time=load_time,
+                    vectors=footprint["vectors"],
+                    size=(footprint["index_bytes"] + footprint["docstore_bytes"])
+                    / 1024**2,
+                ),
+                "cyan",
+            )
+
+            return db
+
+    @classmethod
+    def is_partitioned(cls, path: str, index_name: str = "index") -> bool:
+        """
+        Check whether the index of the folder is a partitioned ExperienceStore. The flag is cached with the index, so
+        the store metadata is only read again when the store is modified on disk.
+        :param path: The folder of the index.
+        :param index_name: The name of the index files.
+        :return: True if the store is partitioned, False otherwise or if the index cannot be loaded.
+        """
+        try:
+            cls.load(path, index_name)
+        except Exception:
+            return False
+
+        entry = cls._indexes.get(os.path.abspath(os.path.join(path, index_name)))
+        return bool(entry and entry["partitioned"])
+
+    @classmethod
+    def get_statistics(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the load time, memory footprint and reuse counts of the loaded indexes.
+        :return: The statistics, in a format of {index path: statistics}.
+        """
+        return {
+            key: {name: value for name, value in entry.items() if name != "db"}
+            for key, entry in list(cls._indexes.items())
+        }
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Release all the loaded indexes.
+        """
+        with cls._lock:
+            cls._indexes.clear()
+            cls._locks.clear()
+
+
 class Retriever(ABC):
     """
     Class to retrieve documents.
@@ -110,7 +276,7 @@ class OfflineDocRetriever(Retriever):
             return None
 
         try:
-            db = FAISS.load_local(path, get_hugginface_embedding())
+            db = IndexRegistry.load(path)
             return db
         except:
             print_with_color(
@@ -122,18 +288,59 @@ class OfflineDocRetriever(Retriever):
             return None
 
 
-class ExperienceRetriever(Retriever):
+class PartitionedRetriever(Retriever):
     """
-    Class to create experience retrievers.
+    Class to create retrievers of an ExperienceStore, which route the retrieval of an application to its partition.
     """
 
     def __init__(self, db_path) -> None:
         """
-        Create a new ExperienceRetriever.
+        Create a new PartitionedRetriever.
         :param db_path: The path to the database.
         """
+        self.db_path = db_path
         self.indexer = self.get_indexer(db_path)
 
+    def get_partition_indexer(self, app_name: str):
+        """
+        Get the indexer of the partition of an application.
+        :param app_name: The root name of the application.
+        :return: The indexer, or None if the database has no partition for the application.
+        """
+        path = ExperienceStore.partition_path(self.db_path, app_name)
+        if not ExperienceStore.exists(path) and not ExperienceStore(path).has_snapshot():
+            return None
+
+        try:
+            return IndexRegistry.load(path)
+        except:
+            return None
+
+    def retrieve(self, query: str, top_k: int, filter=None, app_name: str = None):
+        """
+        Retrieve the document from the given query. With an application, only the partition of the application is
+        searched, and the filter is not applied. If the database is not partitioned, e.g. it was saved by an earlier
+        version and has not been compacted, so that its partitions miss the old summaries, or if it has no partition
+        for the application, the whole database is searched with the filter.
+        :param query: The query to retrieve the document from.
+        :param top_k: The number of documents to retrieve.
+        :param filter: The filter to apply to the retrieved documents of the whole database.
+        :param app_name: The root name of the application.
+        :return: The document from the given query.
+        """
+        if app_name and IndexRegistry.is_partitioned(self.db_path):
+            partition_indexer = self.get_partition_indexer(app_name)
+            if partition_indexer:
+                return partition_indexer.similarity_search(query, top_k)
+
+        return super().retrieve(query, top_k, filter=filter)
+
+
+class ExperienceRetriever(PartitionedRetriever):
+    """
+    Class to create experience retrievers.
+    """
+
     def get_indexer(self, db_path: str):
         """
         Create an experience indexer.
@@ -141,7 +348,7 @@ class ExperienceRetriever(Retriever):
         """
 
         try:
-            db = FAISS.load_local(db_path, get_hugginface_embedding())
+            db = IndexRegistry.load(db_path)
             return db
         except:
             print_with_color(
@@ -189,18 +396,11 @@ class OnlineDocRetriever(Retriever):
         return indexer
 
 
-class DemonstrationRetriever(Retriever):
+class DemonstrationRetriever(PartitionedRetriever):
     """
     Class to create demonstration retrievers.
     """
 
-    def __init__(self, db_path) -> None:
-        """
-        Create a new DemonstrationRetriever.
-        :db_path: The path to the database.
-        """
-        self.indexer = self.get_indexer(db_path)
-
     def get_indexer(self, db_path: str):
         """
         Create a demonstration indexer.
@@ -208,7 +408,7 @@ class DemonstrationRetriever(Retriever):
         """
 
         try:
-            db = FAISS.load_local(db_path, get_hugginface_embedding())
+            db = IndexRegistry.load(db_path)
             return db
         except:
             print_with_color(
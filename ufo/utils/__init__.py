@@ -1,11 +1,12 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import contextlib
 import importlib
 import functools
 import json
 import os
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Iterator
 
 from colorama import Fore, Style, init
 
@@ -154,4 +155,44 @@ def get_hugginface_embedding(
     model_name: str = "sentence-transformers/all-mpnet-base-v2"
 ):
     from langchain_community.embeddings import HuggingFaceEmbeddings
-    return HuggingFaceEmbeddings(model_name=model_name)
\ No newline at end of file
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+@contextlib.contextmanager
+def file_lock(path: str, max_attempts: int = 6) -> Iterator[None]:
+    """
+    Hold an exclusive lock on the file in the block, across the threads and processes of the machine.
+    :param path: The path of the lock file.
+    :param max_attempts: The max number of attempts to take the lock on Windows, each waiting for about 10 seconds.
+    The lock is waited for without a limit on the other platforms.
+    """
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            for attempt in range(max_attempts):
+                try:
+                    # LK_LOCK retries for 10 seconds before it fails.
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    if attempt == max_attempts - 1:
+                        raise TimeoutError(
+                            "Failed to lock {path} after {attempts} attempts.".format(
+                                path=path, attempts=max_attempts
+                            )
+                        )
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
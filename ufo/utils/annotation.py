@@ -0,0 +1,108 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+The rendering of the control annotations on the screenshots. The labels are opaque, so they are drawn once in the mode
+of the screenshot and blitted at the top-left corner of their controls onto a single copy of the screenshot. The module
+only depends on PIL and NumPy, so that it can be used and benchmarked without a desktop.
+"""
+
+import functools
+from typing import Sequence
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from ufo.utils import print_with_color
+
+
+@functools.lru_cache(maxsize=64, typed=False)
+def get_font(name: str, size: int) -> ImageFont.ImageFont:
+    """
+    Get a font, falling back to the default font of PIL if the font is not installed.
+    :param name: The name of the font file.
+    :param size: The size of the font.
+    :return: The font.
+    """
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        print_with_color(
+            f"Warning: Font {name} is not installed, the annotation labels use the default font.",
+            "yellow",
+        )
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:
+            # The default font is not scalable before Pillow 10.1.
+            return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=2048, typed=False)
+def get_label_image(
+    label_text: str,
+    botton_margin: int = 5,
+    border_width: int = 2,
+    font_size: int = 25,
+    font_color: str = "#000000",
+    border_color: str = "#FF0000",
+    button_color: str = "#FFF68F",
+    mode: str = "RGB",
+) -> Image.Image:
+    """
+    Get the image of a label, a button with the label text. The label is opaque, so it is drawn in the mode of the
+    screenshot, which saves a conversion each time it is pasted.
+    :param label_text: The text of the label.
+    :param botton_margin: The margin of the button.
+    :param border_width: The width of the border.
+    :param font_size: The size of the font.
+    :param font_color: The color of the font.
+    :param border_color: The color of the border.
+    :param button_color: The color of the button.
+    :param mode: The image mode of the label.
+    :return: The image of the label.
+    """
+    font = get_font("arial.ttf", font_size)
+    text_size = font.getbbox(label_text)
+
+    # set button size + margins
+    button_size = (int(text_size[2] + botton_margin), int(text_size[3] + botton_margin))
+    # create image with correct size and black background
+    button_img = Image.new(mode, button_size, button_color)
+    button_draw = ImageDraw.Draw(button_img)
+    button_draw.text(
+        (botton_margin / 2, botton_margin / 2),
+        label_text,
+        font=font,
+        fill=font_color,
+    )
+
+    # draw red rectangle around button
+    button_draw.rectangle(
+        [(0, 0), (button_size[0] - 1, button_size[1] - 1)],
+        outline=border_color,
+        width=border_width,
+    )
+    return button_img
+
+
+def render_labels(
+    image: Image.Image,
+    positions: np.ndarray,
+    label_images: Sequence[Image.Image],
+) -> Image.Image:
+    """
+    Render the labels onto a single copy of the image, which is the only operation on the whole image. The labels are
+    opaque, so each of them is blitted as a block, which is cheaper than compositing a full-size overlay layer. The
+    given image is not modified.
+    :param image: The image.
+    :param positions: The positions of the labels, an array of (x, y) in shape (n, 2).
+    :param label_images: The images of the labels.
+    :return: The annotated image.
+    """
+    annotated = image.copy()
+
+    for (x, y), label_image in zip(positions.tolist(), label_images):
+        annotated.paste(label_image, (x, y))
+
+    return annotated
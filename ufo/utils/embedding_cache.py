@@ -0,0 +1,363 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from ufo.config.config import Config
+from ufo.utils import file_lock
+
+configs = Config.get_instance().config_data
+
+EMBEDDING_CACHE = configs.get("EMBEDDING_CACHE", True)
+EMBEDDING_CACHE_SIZE = int(configs.get("EMBEDDING_CACHE_SIZE", 4096))
+EMBEDDING_CACHE_DIR = configs.get("EMBEDDING_CACHE_DIR", "")
+
+
+def content_hash(content: Any) -> str:
+    """
+    Get the content-addressed key of the content to embed. Texts are hashed by their UTF-8 bytes,
+    and images (e.g. the cropped control icons) by their mode, size and pixel data.
+    :param content: The content to hash.
+    :return: The hex digest of the content.
+    """
+    hasher = hashlib.sha1()
+
+    if isinstance(content, str):
+        hasher.update(b"text:")
+        hasher.update(content.encode("utf-8"))
+    elif isinstance(content, (bytes, bytearray)):
+        hasher.update(b"bytes:")
+        hasher.update(content)
+    elif isinstance(content, np.ndarray):
+        hasher.update(f"array:{content.dtype}:{content.shape}:".encode("utf-8"))
+        hasher.update(np.ascontiguousarray(content).tobytes())
+    elif hasattr(content, "tobytes") and hasattr(content, "size"):
+        # PIL images.
+        hasher.update(f"image:{content.mode}:{content.size}:".encode("utf-8"))
+        hasher.update(content.tobytes())
+    else:
+        hasher.update(f"repr:{content!r}".encode("utf-8"))
+
+    return hasher.hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    The append-only on-disk store of the embeddings of one model. The vectors are appended to a raw float32 file
+    that is read back through a NumPy memory map, and the content keys are appended line by line to a key file,
+    in which the n-th line is the key of the n-th vector. The writers append under a file lock, so the folder can be
+    shared by several processes, and each writer reads the keys appended by the others before it appends.
+    """
+
+    LOCK_FILE = "store.lock"
+
+    def __init__(self, root: str, model_name: str) -> None:
+        """
+        Create a new DiskEmbeddingStore.
+        :param root: The root folder of the embedding stores.
+        :param model_name: The name of the embedding model.
+        """
+        self.folder = os.path.join(root, re.sub(r"[^\w.-]", "_", model_name))
+        os.makedirs(self.folder, exist_ok=True)
+
+        self.vector_path = os.path.join(self.folder, "vectors.f32")
+        self.key_path = os.path.join(self.folder, "keys.txt")
+        self.meta_path = os.path.join(self.folder, "meta.json")
+        self.lock_path = os.path.join(self.folder, self.LOCK_FILE)
+
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._num_keys = 0
+        self._key_offset = 0
+        self._memmap: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+        self._load()
+
+    def _load(self) -> None:
+        """
+        Load the key index of the store, and drop the rows left incomplete by an interrupted writer.
+        """
+        with self._lock, file_lock(self.lock_path):
+            self._sync()
+
+    def _sync(self) -> None:
+        """
+        Read the keys appended since the last sync, e.g. by another process. Must be called under the file lock.
+        A writer appends the vectors before the keys, so an interrupted writer may leave vectors without keys, or
+        a partial key line. They are truncated, so that the n-th key stays the key of the n-th vector. A key that is
+        appended again keeps its first row.
+        """
+        if self.dim is None:
+            if not os.path.exists(self.meta_path):
+                return
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+
+        row_size = 4 * self.dim
+        num_vectors = (
+            os.path.getsize(self.vector_path) // row_size
+            if os.path.exists(self.vector_path)
+            else 0
+        )
+
+        if os.path.exists(self.key_path):
+            with open(self.key_path, "rb") as f:
+                f.seek(self._key_offset)
+                data = f.read()
+
+            for line in data.splitlines(keepends=True):
+                if not line.endswith(b"\n") or self._num_keys >= num_vectors:
+                    break
+                self._rows.setdefault(line.decode("utf-8").strip(), self._num_keys)
+                self._num_keys += 1
+                self._key_offset += len(line)
+
+            if os.path.getsize(self.key_path) > self._key_offset:
+                with open(self.key_path, "r+b") as f:
+                    f.truncate(self._key_offset)
+
+        if os.path.exists(self.vector_path) and (
+            os.path.getsize(self.vector_path) > self._num_keys * row_size
+        ):
+            # Release the memory map before its file is truncated.
+            self._memmap = None
+            with open(self.vector_path, "r+b") as f:
+                f.truncate(self._num_keys * row_size)
+
+    def _vectors(self) -> np.memmap:
+        """
+        Get the memory map of the vectors, remapping it when the file has grown.
+        :return: The memory map, in a shape of (rows, dim).
+        """
+        num_vectors = os.path.getsize(self.vector_path) // (4 * self.dim)
+        if self._memmap is None or self._memmap.shape[0] < num_vectors:
+            self._memmap = np.memmap(
+                self.vector_path, dtype=np.float32, mode="r", shape=(num_vectors, self.dim)
+            )
+        return self._memmap
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Get the embedding of the key.
+        :param key: The content key.
+        :return: The embedding, or None if it is not stored.
+        """
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._vectors()[row])
+
+    def put(self, items: Dict[str, np.ndarray]) -> None:
+        """
+        Append the embeddings to the store.
+        :param items: The embeddings to store, in a format of {key: embedding}.
+        """
+        with self._lock:
+            if all(key in self._rows for key in items):
+                return
+
+            with file_lock(self.lock_path):
+                self._sync()
+                self._append(items)
+
+    def _append(self, items: Dict[str, np.ndarray]) -> None:
+        """
+        Append the embeddings that are not stored yet. Must be called under the file lock, after a sync.
+        :param items: The embeddings to store, in a format of {key: embedding}.
+        """
+        items = {key: value for key, value in items.items() if key not in self._rows}
+        if not items:
+            return
+
+        if self.dim is None:
+            self.dim = int(np.asarray(next(iter(items.values()))).size)
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+
+        # The synced keys and vectors have the same number of rows, so the new rows start after both.
+        start = self._num_keys
+        vectors = np.stack(
+            [np.asarray(value, dtype=np.float32).reshape(-1) for value in items.values()]
+        )
+        keys = "".join(key + "\n" for key in items).encode("utf-8")
+
+        # Write the vectors before the keys, so that a key is never indexed without its vector.
+        with open(self.vector_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.key_path, "ab") as f:
+            f.write(keys)
+
+        for offset, key in enumerate(items):
+            self._rows[key] = start + offset
+        self._num_keys += len(items)
+        self._key_offset += len(keys)
+
+    def __len__(self) -> int:
+        """
+        Get the number of stored embeddings.
+        :return: The number of stored embeddings.
+        """
+        return len(self._rows)
+
+
+class EmbeddingCache:
+    """
+    The content-addressed embedding cache of one embedding model, shared by the control filters and the RAG retrievers.
+    Embeddings are kept in an in-memory LRU and, if EMBEDDING_CACHE_DIR is set, persisted to a DiskEmbeddingStore across runs.
+    """
+
+    _instances: Dict[str, "EmbeddingCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __new__(cls, model_name: str):
+        """
+        Get the cache of the model. Only one cache is created for each model.
+        :param model_name: The name of the embedding model.
+        :return: The EmbeddingCache instance.
+        """
+        with cls._instances_lock:
+            if model_name not in cls._instances:
+                instance = super(EmbeddingCache, cls).__new__(cls)
+                instance._init_cache(model_name, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_DIR)
+                cls._instances[model_name] = instance
+            return cls._instances[model_name]
+
+    def _init_cache(self, model_name: str, max_size: int, cache_dir: str) -> None:
+        """
+        Initialize the cache.
+        :param model_name: The name of the embedding model.
+        :param max_size: The maximum number of embeddings kept in memory.
+        :param cache_dir: The folder of the on-disk store. The store is disabled if empty.
+        """
+        self.model_name = model_name
+        self.max_size = max_size
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = DiskEmbeddingStore(cache_dir, model_name) if cache_dir else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Look up the embedding of the key in memory, then on disk.
+        :param key: The content key.
+        :return: The embedding, or None if it is not cached.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        if self._disk is not None:
+            embedding = self._disk.get(key)
+            if embedding is not None:
+                self._put_memory(key, embedding)
+                with self._lock:
+                    self.disk_hits += 1
+                return embedding
+
+        return None
+
+    def _put_memory(self, key: str, embedding: np.ndarray) -> None:
+        """
+        Put the embedding in the in-memory LRU.
+        :param key: The content key.
+        :param embedding: The embedding.
+        """
+        with self._lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def encode(self, content: Any, encoder: Callable[[List[Any]], Any]) -> np.ndarray:
+        """
+        Get the embeddings of the content, encoding only the items that are not cached, in a single batch.
+        :param content: A single item or a list of items to embed.
+        :param encoder: The function to encode a list of items into a sequence of embeddings.
+        :return: The embedding of the item, or the stacked embeddings of the list of items.
+        """
+        single = not isinstance(content, (list, tuple))
+        items = [content] if single else list(content)
+
+        keys = [content_hash(item) for item in items]
+        embeddings: List[Optional[np.ndarray]] = [self._get(key) for key in keys]
+
+        # Encode each missing content only once, even if it appears several times.
+        missing: Dict[str, Any] = {}
+        for key, item, embedding in zip(keys, items, embeddings):
+            if embedding is None and key not in missing:
+                missing[key] = item
+
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+
+            encoded = {
+                key: np.asarray(embedding, dtype=np.float32)
+                for key, embedding in zip(missing, encoder(list(missing.values())))
+            }
+            for key, embedding in encoded.items():
+                self._put_memory(key, embedding)
+            if self._disk is not None:
+                self._disk.put(encoded)
+
+            embeddings = [
+                encoded[key] if embedding is None else embedding
+                for key, embedding in zip(keys, embeddings)
+            ]
+
+        if single:
+            return embeddings[0]
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(embeddings)
+
+    def statistics(self) -> Dict[str, Any]:
+        """
+        Get the hit-rate statistics of the cache.
+        :return: The statistics.
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (
+                    round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+                ),
+                "memory_size": len(self._memory),
+                "disk_size": len(self._disk) if self._disk is not None else 0,
+            }
+
+    @classmethod
+    def get_statistics(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the hit-rate statistics of the caches of all the models.
+        :return: The statistics, in a format of {model_name: statistics}.
+        """
+        with cls._instances_lock:
+            instances = dict(cls._instances)
+        return {name: cache.statistics() for name, cache in instances.items()}
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        """
+        Check whether the embedding cache is enabled.
+        :return: True if the embedding cache is enabled, False otherwise.
+        """
+        return bool(EMBEDDING_CACHE)
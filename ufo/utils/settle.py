@@ -0,0 +1,97 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import time
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+class SettleDetector:
+    """
+    The detector of the end of the UI changes after an action. It polls low-resolution grayscale fingerprints of the
+    frames and returns as soon as the frames have been stable for the stable time, or when the timeout is reached.
+    Two frames are stable if the mean absolute difference of their fingerprints is within the threshold, so that
+    a blinking caret does not count as a change. Until a change is observed, the frames must be stable for the min
+    wait as well, so that the wait does not end before a UI that is slow to react to the action starts changing.
+    """
+
+    def __init__(
+        self,
+        stable_time: float = 0.5,
+        poll_interval: float = 0.1,
+        threshold: float = 1.0,
+        size: Tuple[int, int] = (64, 64),
+        min_wait: float = 1.0,
+    ) -> None:
+        """
+        Initialize the detector.
+        :param stable_time: The time (s) the frames must be stable.
+        :param poll_interval: The interval (s) between the frame polls.
+        :param threshold: The max mean absolute difference (0-255) of the fingerprints of two stable frames.
+        :param size: The size of the fingerprints.
+        :param min_wait: The min time (s) to wait if no change is observed.
+        """
+        self.stable_time = stable_time
+        self.poll_interval = poll_interval
+        self.threshold = threshold
+        self.size = size
+        self.min_wait = min_wait
+
+    @classmethod
+    def from_config(cls, configs: Dict[str, Any]) -> "SettleDetector":
+        """
+        Create the detector of the configured settle detection.
+        :param configs: The configurations.
+        :return: The detector.
+        """
+        return cls(
+            stable_time=configs.get("SETTLE_STABLE_TIME", 0.5),
+            poll_interval=configs.get("SETTLE_POLL_INTERVAL", 0.1),
+            threshold=configs.get("SETTLE_THRESHOLD", 1.0),
+            min_wait=configs.get("SETTLE_MIN_WAIT", 1.0),
+        )
+
+    def fingerprint(self, image: Image.Image) -> np.ndarray:
+        """
+        Get the fingerprint of a frame, a low-resolution grayscale copy of the frame.
+        :param image: The frame.
+        :return: The fingerprint.
+        """
+        return np.asarray(
+            image.resize(self.size, Image.BOX).convert("L"), dtype=np.int16
+        )
+
+    def wait(self, grab: Callable[[], Image.Image], timeout: float) -> float:
+        """
+        Wait until the frames are stable.
+        :param grab: The function to grab a frame.
+        :param timeout: The max time (s) to wait.
+        :return: The time (s) waited.
+        """
+        start_time = time.time()
+        previous = None
+        stable_since = start_time
+        changed = False
+
+        while True:
+            fingerprint = self.fingerprint(grab())
+            now = time.time()
+
+            if previous is None:
+                stable_since = now
+            elif np.abs(fingerprint - previous).mean() > self.threshold:
+                stable_since = now
+                changed = True
+            previous = fingerprint
+
+            settled = now - stable_since >= self.stable_time and (
+                changed or now - start_time >= self.min_wait
+            )
+            if settled or now - start_time >= timeout:
+                return now - start_time
+
+            time.sleep(
+                max(min(self.poll_interval, timeout - (time.time() - start_time)), 0)
+            )